@@ -0,0 +1,305 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from vector_store import OUTPUT_DIR, load_manifest, load_vectors, iter_metadata, write_generation
+
+# IVF-flat approximate nearest-neighbour index over journals.vectors.bin
+# Spherical k-means (NumPy) splits the normalized journal vectors into `nlist` clusters. A query
+# only scores the rows of its `nprobe` closest clusters instead of every journal: nprobe is the
+# recall/speed knob (nprobe = nlist is exact search again). Files next to the vector store:
+#   journals.ivf.json            - nlist, default nprobe, dim, and the vectors_sha256 it was built from
+#   journals.ivf.centroids.bin   - float32 (nlist x dim), unit length
+#   journals.ivf.lists.bin       - int32 offsets (nlist + 1), then int32 store row numbers grouped by list
+# Only rows with an embedding are indexed.
+#
+# Usage:
+#   python scripts/ann_index.py build [--nlist N] [--nprobe 8]
+#   python scripts/ann_index.py report [--k 10] [--nprobe 1,2,4,8,16,32] [--queries queries.jsonl]
+
+INDEX_FILE = "journals.ivf.json"
+CENTROIDS_FILE = "journals.ivf.centroids.bin"
+LISTS_FILE = "journals.ivf.lists.bin"
+INDEX_VERSION = 1
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 10
+TRAIN_PER_LIST = 32 # k-means trains on a sample of nlist * TRAIN_PER_LIST rows
+BLOCK_ROWS = 8192 # Rows per matmul when assigning (bounds memory on a memmapped store)
+
+
+def default_nlist(rows):
+    # ~4 * sqrt(N) clusters is the usual starting point for IVF
+    return max(1, min(rows, int(round(4 * np.sqrt(rows)))))
+
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _assign(vectors, centroids):
+    """Nearest centroid (max cosine) for each row, in blocks."""
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), BLOCK_ROWS):
+        block = _normalize(vectors[start:start + BLOCK_ROWS])
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def train_centroids(vectors, nlist, iterations=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means on a sample of the (normalized) rows."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * TRAIN_PER_LIST)
+    sample = _normalize(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        counts = np.bincount(labels, minlength=nlist)
+        # Per-cluster sums via one sort + reduceat (np.add.at is far slower on 2-D rows)
+        order = np.argsort(labels, kind="stable")
+        present = np.flatnonzero(counts)
+        starts = np.r_[0, np.cumsum(counts[present])[:-1]]
+        sums = np.zeros_like(centroids)
+        sums[present] = np.add.reduceat(sample[order], starts, axis=0)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters with random sample rows
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, centroids, offsets, ids, nprobe=DEFAULT_NPROBE, info=None):
+        self.centroids = centroids # (nlist, dim) float32, unit length
+        self.offsets = offsets # (nlist + 1,) int64, list i is ids[offsets[i]:offsets[i + 1]]
+        self.ids = ids # row numbers, grouped by list
+        self.nprobe = nprobe
+        self.info = info or {}
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def remap(self, position_of_row):
+        """
+        Index over a subset of the store: position_of_row[store_row] is the row's position in the
+        caller's matrix, or -1 to drop it (excluded journals).
+        """
+        mapped = position_of_row[self.ids]
+        keep = mapped >= 0
+        list_of = np.repeat(np.arange(self.nlist), np.diff(self.offsets))
+        counts = np.bincount(list_of[keep], minlength=self.nlist)
+        offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return IVFIndex(self.centroids, offsets, mapped[keep], self.nprobe, self.info)
+
+    def candidates(self, query, nprobe=None):
+        """Row numbers in the `nprobe` lists closest to a normalized query."""
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        centroid_scores = self.centroids @ query
+        if nprobe < self.nlist:
+            probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probes = np.arange(self.nlist)
+        return np.concatenate([self.ids[self.offsets[p]:self.offsets[p + 1]] for p in probes])
+
+    def search(self, vectors, queries, k, nprobe=None):
+        """
+        vectors: normalized rows the ids point into, queries: normalized (n, dim).
+        Returns a list of (row numbers, scores) per query, best first.
+        """
+        results = []
+        for query in queries:
+            rows = self.candidates(query, nprobe)
+            if len(rows) == 0:
+                results.append((rows, np.empty(0, dtype=np.float32)))
+                continue
+            scores = vectors[rows] @ query
+            top = min(k, len(rows))
+            part = np.argpartition(-scores, top - 1)[:top]
+            order = part[np.argsort(-scores[part], kind="stable")]
+            results.append((rows[order], scores[order]))
+        return results
+
+
+def build_index(data_dir=OUTPUT_DIR, nlist=None, nprobe=DEFAULT_NPROBE, iterations=KMEANS_ITERATIONS, seed=0):
+    """Trains the IVF index on the current vector store and writes it next to it."""
+    start = time.time()
+    manifest, matrix = load_vectors(data_dir)
+    embedded_rows = np.asarray(
+        [row for row, meta in enumerate(iter_metadata(data_dir, manifest)) if meta.get("hasEmbedding")],
+        dtype=np.int64,
+    )
+    if len(embedded_rows) == 0:
+        print("No embedded rows, skipping ANN index.", flush=True)
+        return None
+    vectors = matrix[embedded_rows]
+    nlist = min(nlist or default_nlist(len(embedded_rows)), len(embedded_rows))
+    print(f"Training IVF index: {len(embedded_rows)} vectors, {nlist} lists...", flush=True)
+
+    centroids = train_centroids(vectors, nlist, iterations, seed)
+    labels = _assign(vectors, centroids)
+    order = np.argsort(labels, kind="stable")
+    ids = embedded_rows[order].astype(np.int32)
+    offsets = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(labels, minlength=nlist), out=offsets[1:])
+
+    centroids_bytes = centroids.astype(np.float32).tobytes()
+    lists_bytes = offsets.astype(np.int32).tobytes() + ids.tobytes()
+    sizes = np.diff(offsets)
+    info = {
+        "version": INDEX_VERSION,
+        "kind": "ivf-flat",
+        "metric": "cosine",
+        "dim": manifest["dim"],
+        "nlist": nlist,
+        "nprobe": min(nprobe, nlist),
+        "rows": int(len(ids)),
+        "centroids_file": CENTROIDS_FILE,
+        "lists_file": LISTS_FILE,
+        "centroids_sha256": hashlib.sha256(centroids_bytes).hexdigest(),
+        "lists_sha256": hashlib.sha256(lists_bytes).hexdigest(),
+        "store_vectors_sha256": manifest["vectors_sha256"],
+        "largest_list": int(sizes.max()),
+        "iterations": iterations,
+        "build_seconds": round(time.time() - start, 2),
+        "created": time.time(),
+    }
+
+    # Data files first, index manifest last (same order as the vector store)
+    for name, payload in ((CENTROIDS_FILE, centroids_bytes), (LISTS_FILE, lists_bytes)):
+        path = os.path.join(data_dir, name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(payload)
+        os.replace(path + ".tmp", path)
+    index_path = os.path.join(data_dir, INDEX_FILE)
+    with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+    os.replace(index_path + ".tmp", index_path)
+
+    print(f"IVF index written: {nlist} lists (largest {info['largest_list']} rows) "
+          f"in {info['build_seconds']:.1f}s", flush=True)
+    return info
+
+
+def load_index(data_dir=OUTPUT_DIR, manifest=None):
+    """The IVF index if it exists and was built from the current vector store, else None."""
+    path = os.path.join(data_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        info = json.load(f)
+    if manifest is None:
+        manifest = load_manifest(data_dir)
+    if manifest is None or info.get("store_vectors_sha256") != manifest.get("vectors_sha256"):
+        print("ANN index is stale (vector store rebuilt since). Using exact search.", flush=True)
+        return None
+    centroids = np.fromfile(os.path.join(data_dir, info["centroids_file"]), dtype=np.float32)
+    centroids = centroids.reshape(info["nlist"], info["dim"])
+    lists = np.fromfile(os.path.join(data_dir, info["lists_file"]), dtype=np.int32)
+    offsets = lists[:info["nlist"] + 1].astype(np.int64)
+    ids = lists[info["nlist"] + 1:].astype(np.int64)
+    return IVFIndex(centroids, offsets, ids, info.get("nprobe", DEFAULT_NPROBE), info)
+
+
+def _read_query_embeddings(path):
+    with open(path, "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return np.asarray([r["embedding"] for r in rows if r.get("embedding")], dtype=np.float32)
+
+
+def report(data_dir=OUTPUT_DIR, k=10, nprobes=(1, 2, 4, 8, 16, 32), n_queries=200, queries_path=None,
+           noise=0.05, seed=0):
+    """recall@k and per-query latency of the IVF index against exact search."""
+    from query_engine import JournalIndex
+
+    journal_index = JournalIndex.load(data_dir, ann=True)
+    ivf = journal_index.ann
+    if ivf is None:
+        raise SystemExit("No fresh ANN index. Run: python scripts/ann_index.py build")
+    vectors = journal_index.vectors
+
+    if queries_path:
+        queries = _read_query_embeddings(queries_path)
+    else:
+        # Stored journal vectors plus noise: realistic neighbourhoods without needing API calls
+        rng = np.random.default_rng(seed)
+        picked = rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)
+        queries = vectors[picked] + rng.normal(0, noise, (len(picked), vectors.shape[1])).astype(np.float32)
+    queries = _normalize(queries)
+    print(f"{len(queries)} queries, {len(vectors)} journals, nlist {ivf.nlist}, k {k}", flush=True)
+
+    # Exact search, one query at a time (what a single /api/analyze request costs)
+    exact = []
+    start = time.perf_counter()
+    for q in queries:
+        scores = vectors @ q
+        top = min(k, len(scores))
+        part = np.argpartition(-scores, top - 1)[:top]
+        exact.append(set(part.tolist()))
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    print(f"{'method':<14} {'nprobe':>6} {'recall@' + str(k):>10} {'ms/query':>10} {'scanned':>9} {'speedup':>8}")
+    print(f"{'exact':<14} {'-':>6} {1.0:>10.3f} {exact_ms:>10.2f} {len(vectors):>9} {1.0:>7.1f}x")
+    rows = []
+    for nprobe in nprobes:
+        if nprobe > ivf.nlist:
+            continue
+        latencies = []
+        hits = 0
+        scanned = 0
+        for q, truth in zip(queries, exact):
+            t0 = time.perf_counter()
+            ids, _ = ivf.search(vectors, q[None, :], k, nprobe)[0]
+            latencies.append((time.perf_counter() - t0) * 1000)
+            hits += len(truth & set(ids.tolist()))
+            scanned += len(ivf.candidates(q, nprobe))
+        recall = hits / sum(len(t) for t in exact)
+        ms = float(np.mean(latencies))
+        p95 = float(np.percentile(latencies, 95))
+        rows.append({"nprobe": nprobe, "recall": recall, "ms": ms, "p95_ms": p95, "scanned": scanned / len(queries)})
+        print(f"{'ivf-flat':<14} {nprobe:>6} {recall:>10.3f} {ms:>10.2f} {scanned / len(queries):>9.0f} "
+              f"{exact_ms / ms:>7.1f}x", flush=True)
+    return {"k": k, "exact_ms": exact_ms, "nlist": ivf.nlist, "results": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and evaluate the IVF-flat ANN index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Train and write the index from the vector store")
+    build.add_argument("--nlist", type=int, default=int(os.getenv("ANN_NLIST", "0")) or None)
+    build.add_argument("--nprobe", type=int, default=int(os.getenv("ANN_NPROBE", str(DEFAULT_NPROBE))),
+                       help="Default lists probed per query (stored in the index, overridable at query time)")
+    build.add_argument("--iterations", type=int, default=KMEANS_ITERATIONS)
+    build.add_argument("--seed", type=int, default=0)
+    rep = sub.add_parser("report", help="recall@k / latency against exact search")
+    rep.add_argument("--k", type=int, default=10)
+    rep.add_argument("--nprobe", default="1,2,4,8,16,32", help="Comma-separated nprobe values to try")
+    rep.add_argument("--queries", help="JSONL with an `embedding` per line (default: noisy journal vectors)")
+    rep.add_argument("--n-queries", type=int, default=200)
+    rep.add_argument("--output", help="Also write the report as JSON")
+    for p in (build, rep):
+        p.add_argument("--data-dir", default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_index(args.data_dir, args.nlist, args.nprobe, args.iterations, args.seed)
+        write_generation(args.data_dir) # Running servers pick up the rebuilt index
+    else:
+        result = report(args.data_dir, args.k, [int(n) for n in args.nprobe.split(",") if n],
+                        args.n_queries, args.queries)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from bench_transform import make_asjc_map, make_sheet
+from journal_transform import TARGET_COLS, load_asjc_map
+
+# Benchmark: ingest_data.ingest() end to end, fully offline.
+# Usage: python scripts/bench_ingest.py [--rows 20000] [--seed 42] [--latency-ms 50] [--error-rate 0.01] [--warm]
+# Writes a synthetic "List Scopus Outlet.xlsx" (workbook headers, ASJC codes from resources/ASJC1.xlsx)
+# into a scratch directory and ingests it with FakeEmbeddingsClient (fake_embeddings.py) in place of
+# OpenAI (--backend local benchmarks the CPU-only local model instead). Each run happens in a fresh
+# child process so peak RSS belongs to ingestion alone.
+# Reports per-stage time (read, transform, embed, write, ...), rows/sec, peak RSS and API calls.
+
+REAL_ASJC = os.path.join("resources", "ASJC1.xlsx")
+REAL_SDGS = os.path.join("resources", "SDGs Keyword.xlsx")
+OUTLET_HEADERS = {field: header for header, field in TARGET_COLS.items()}
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def make_workdir(workdir, rows, n_combos):
+    resources_dir = os.path.join(workdir, "resources")
+    os.makedirs(resources_dir, exist_ok=True)
+
+    asjc_map = load_asjc_map(REAL_ASJC) or make_asjc_map()
+    # The map the sheet was drawn from is the one ingestion decodes with
+    pd.DataFrame({"Code": list(asjc_map.keys()), "Description": list(asjc_map.values())}) \
+        .to_excel(os.path.join(resources_dir, "ASJC1.xlsx"), index=False)
+    if os.path.exists(REAL_SDGS):
+        shutil.copy(REAL_SDGS, os.path.join(resources_dir, "SDGs Keyword.xlsx"))
+
+    df = make_sheet(rows, asjc_map, n_combos).rename(columns=OUTLET_HEADERS)
+    path = os.path.join(resources_dir, "List Scopus Outlet.xlsx")
+    df.to_excel(path, index=False)
+    return path
+
+
+def run_ingest(workdir, args, upsert, queue):
+    """Child process: one ingest() over `workdir` with the fake client, results go to `queue`."""
+    # Never pick up a real key from .env (load_dotenv does not override variables that are set)
+    os.environ["OPENAI_API_KEY"] = ""
+    import ingest_data
+    from fake_embeddings import FakeEmbeddingsClient
+    from metrics import metrics
+
+    ingest_data.RESOURCES_DIR = os.path.join(workdir, "resources")
+    ingest_data.OUTPUT_DIR = os.path.join(workdir, "data")
+    ingest_data.EMBED_CACHE_FILE = os.path.join(ingest_data.OUTPUT_DIR, "embeddings_cache.sqlite")
+    ingest_data.EMBED_BATCH_SIZE = args.batch_size
+    ingest_data.EMBED_CONCURRENCY = args.concurrency
+    ingest_data.EMBED_RPM = args.rpm
+    ingest_data.EMBED_TPM = args.tpm
+
+    client = FakeEmbeddingsClient(dim=args.dim, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                  per_item_ms=args.per_item_ms, error_rate=args.error_rate,
+                                  error_status=args.error_status, seed=args.seed)
+    out = open(os.devnull, "w") if args.quiet else sys.stdout
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(out):
+        phases = ingest_data.ingest(embed_client=client, upsert=upsert, backend=args.backend)
+    seconds = time.perf_counter() - start
+    queue.put({"seconds": seconds, "phases": phases or [], "peak_rss_mb": peak_rss_mb(), "api": client.stats(),
+               "metrics": metrics.summary()})
+
+
+def run_once(workdir, args, upsert=False):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=run_ingest, args=(workdir, args, upsert, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    if proc.exitcode:
+        raise SystemExit(f"Ingest process exited with code {proc.exitcode}")
+    return result
+
+
+def report(label, rows, result):
+    print(f"--- {label} ---")
+    for p in result["phases"]:
+        rate = p["rows"] / p["seconds"] if p["seconds"] > 0 else 0
+        print(f"{p['name']:<12} {p['seconds']:>9.2f}s {p['rows']:>9} rows {rate:>12.0f} rows/s")
+    api = result["api"]
+    print(f"{'total':<12} {result['seconds']:>9.2f}s {rows:>9} rows {rows / result['seconds']:>12.0f} rows/s")
+    print(f"Peak RSS: {result['peak_rss_mb']:.0f} MB")
+    print(f"API calls: {api['calls']} ({api['errors']} injected errors, {api['items']} texts embedded)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingest_data.py offline with a fake embeddings backend")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--asjc-combos", type=int, default=5000, help="Distinct ASJC code lists in the sheet")
+    parser.add_argument("--backend", choices=["openai", "local"], default="openai",
+                        help="openai: the fake client stands in for the API; local: the local model (no fake client)")
+    parser.add_argument("--dim", type=int, default=1536, help="Fake client vector size")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fixed latency per embeddings request")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Random extra latency per request")
+    parser.add_argument("--per-item-ms", type=float, default=0.0, help="Extra latency per text in the batch")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=429, help="Status code of injected failures")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=int, default=0, help="Requests/minute budget (0: unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="Tokens/minute budget (0: unlimited)")
+    parser.add_argument("--warm", action="store_true", help="Run a second ingest over the same store (resume path)")
+    parser.add_argument("--upsert", action="store_true", help="Run the second ingest with --upsert (implies --warm)")
+    parser.add_argument("--workdir", help="Scratch directory to use and keep (default: a temp dir, removed)")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--quiet", action="store_true", help="Hide ingest_data.py's own output")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_ingest_")
+    try:
+        print(f"Generating synthetic outlet workbook ({args.rows} rows) in {workdir}...", flush=True)
+        start = time.perf_counter()
+        make_workdir(workdir, args.rows, args.asjc_combos)
+        print(f"Workbook written in {time.perf_counter() - start:.1f}s", flush=True)
+
+        results = {"config": vars(args), "cold": run_once(workdir, args)}
+        if args.warm or args.upsert:
+            results["warm"] = run_once(workdir, args, upsert=args.upsert)
+
+        report("cold", args.rows, results["cold"])
+        if "warm" in results:
+            report("warm (upsert)" if args.upsert else "warm", args.rows, results["warm"])
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
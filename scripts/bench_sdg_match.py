@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import random
+import time
+
+import pandas as pd
+
+from sdg_matcher import SDGMatcher, regex_keywords_found
+
+# Benchmark: Aho-Corasick SDG matcher vs one `\b...\b` regex per keyword (the old path).
+# Usage: python scripts/bench_sdg_match.py [--abstracts 50] [--words 250] [--seed 42] [--sdgs web/data/sdgs.json]
+# Keywords come from sdgs.json when it exists, otherwise straight from resources/SDGs Keyword.xlsx.
+# Checks that both give identical keywordsFound for every abstract, then prints abstracts/sec.
+
+SDGS_XLSX = os.path.join("resources", "SDGs Keyword.xlsx")
+FILLER = ("the aim of this work is to design an application with results that support users and "
+          "evaluate data from the study across several phases of research").split()
+
+
+def load_sdgs(sdgs_path):
+    if sdgs_path and os.path.exists(sdgs_path):
+        with open(sdgs_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    # Same parsing as the SDG pass of ingest_data.py
+    df = pd.read_excel(SDGS_XLSX)
+    sdgs = []
+    for _, row in df.iterrows():
+        query = str(row['Query']) if pd.notna(row['Query']) else ""
+        sdgs.append({"id": int(row['SDG']), "keywords": [k.strip().lower() for k in query.split(';') if k.strip()]})
+    return sdgs
+
+
+def make_abstracts(sdgs, n, words):
+    keywords = [kw for s in sdgs for kw in s["keywords"]]
+    abstracts = []
+    for _ in range(n):
+        tokens = []
+        while len(tokens) < words:
+            if random.random() < 0.1:
+                kw = random.choice(keywords)
+                # Case changes, punctuation and glued suffixes exercise the word-boundary rules
+                kw = random.choice([kw, kw.upper(), kw.title(), kw + "s", "(" + kw + ")", kw + ",", "x" + kw])
+                tokens.append(kw)
+            else:
+                tokens.append(random.choice(FILLER))
+        abstracts.append(" ".join(tokens))
+    return abstracts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SDG keyword matching")
+    parser.add_argument("--abstracts", type=int, default=50)
+    parser.add_argument("--words", type=int, default=250)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sdgs", default=os.path.join("web", "data", "sdgs.json"))
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    sdgs = load_sdgs(args.sdgs)
+    total_keywords = sum(len(s["keywords"]) for s in sdgs)
+    abstracts = make_abstracts(sdgs, args.abstracts, args.words)
+
+    start = time.perf_counter()
+    matcher = SDGMatcher.build(sdgs)
+    build_s = time.perf_counter() - start
+    print(f"{len(sdgs)} SDGs, {total_keywords} keywords -> {len(matcher.goto)} automaton states "
+          f"(built in {build_s * 1000:.0f}ms)")
+
+    start = time.perf_counter()
+    expected = [regex_keywords_found(sdgs, a) for a in abstracts]
+    regex_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [matcher.keywords_found(a) for a in abstracts]
+    matcher_s = time.perf_counter() - start
+
+    for i, (e, a) in enumerate(zip(expected, actual)):
+        if e != a:
+            raise SystemExit(f"Results differ for abstract {i}")
+    hits = sum(len(v) for r in actual for v in r.values())
+    print(f"Results identical: {len(abstracts)} abstracts, {hits} keyword hits")
+    print(f"{'per-keyword regex':<20} {regex_s:>8.3f}s {len(abstracts) / regex_s:>10.0f} abstracts/s")
+    print(f"{'automaton':<20} {matcher_s:>8.3f}s {len(abstracts) / matcher_s:>10.0f} abstracts/s")
+    print(f"Speedup: {regex_s / matcher_s:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
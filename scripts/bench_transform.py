@@ -0,0 +1,146 @@
+import argparse
+import random
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from journal_transform import stable_id, transform_frame
+
+# Benchmark: vectorized transform_frame vs the per-row loop ingest() used to run.
+# Usage: python scripts/bench_transform.py [--rows 100000] [--seed 42] [--repeat 3] [--asjc-combos 5000]
+# Builds a synthetic outlet sheet, runs both, checks the records match and prints rows/sec.
+
+
+def make_asjc_map(n_codes=330):
+    codes = sorted(random.sample(range(1000, 3700), n_codes))
+    return {str(c): f"Subject area {c}" for c in codes}
+
+
+def make_sheet(rows, asjc_map, n_combos=5000):
+    codes = list(asjc_map.keys())
+    # Outlets in the same field share code lists, so draw from a pool of recurring combinations
+    combos = [random.sample(codes, random.randint(0, 4)) for _ in range(n_combos)]
+    words = ["energy", "health", "water", "climate", "education", "finance", "materials", "policy", "systems"]
+    data = {
+        "Source_Title": [],
+        "scope": [],
+        "All_Science_Journal_Classification_Codes_ASJC": [],
+        "Publisher": [],
+        "Sourcerecord_ID": [],
+        "Active_or_Inactive": [],
+        "Coverage": [],
+    }
+    for i in range(rows):
+        n_words = random.choice([0, 20, 80, 400, 900])
+        data["Source_Title"].append(f"Journal of {random.choice(words).title()} {i}")
+        data["scope"].append(" ".join(random.choices(words, k=n_words)) if n_words else np.nan)
+        picked = list(random.choice(combos))
+        if random.random() < 0.05:
+            picked.append("9999")  # unknown code, kept as-is
+        data["All_Science_Journal_Classification_Codes_ASJC"].append(
+            random.choice(["; ", ";", ",", " ; "]).join(picked) if picked else np.nan
+        )
+        data["Publisher"].append(random.choice(["Elsevier", "Springer", "Wiley", np.nan]))
+        data["Sourcerecord_ID"].append(str(10000000 + i) if random.random() > 0.02 else np.nan)
+        data["Active_or_Inactive"].append(random.choice(["Active", "Inactive", np.nan]))
+        data["Coverage"].append(random.choice(["1990-ongoing", "2001-2015", np.nan]))
+    return pd.DataFrame(data)
+
+
+def legacy_transform(df, asjc_map):
+    """The per-row loop from ingest() before the columnar stage, as it was (random ids, no code lists)."""
+    records = []
+    for row in df.itertuples(index=False):
+        title = getattr(row, "Source_Title", "")
+        if title is None: continue
+
+        scope = str(getattr(row, "scope", ""))
+        if scope == "nan": scope = ""
+
+        raw_asjc = str(getattr(row, "All_Science_Journal_Classification_Codes_ASJC", ""))
+        if raw_asjc == "nan": raw_asjc = ""
+
+        asjc_final = ""
+        if raw_asjc:
+            parts = raw_asjc.replace(',', ';').split(';')
+            decoded_parts = (asjc_map.get(p.strip(), p.strip()) for p in parts if p.strip())
+            asjc_final = "; ".join(decoded_parts)
+
+        publisher = str(getattr(row, "Publisher", "Unknown Publisher"))
+        if publisher == "nan": publisher = "Unknown Publisher"
+
+        source_id = str(getattr(row, "Sourcerecord_ID", ""))
+        if source_id == "nan": source_id = ""
+
+        active_status = str(getattr(row, "Active_or_Inactive", "Unknown"))
+        if active_status == "nan": active_status = "Unknown"
+
+        years = str(getattr(row, "Coverage", ""))
+        if years == "nan": years = ""
+
+        coverage = f"{active_status} ({years})" if years else active_status
+        link = f"https://www.scopus.com/sourceid/{source_id}" if source_id else ""
+
+        if len(scope) > 4000:
+            scope = scope[:4000] + "..."
+
+        content = f"{title}. {scope}. matches ASJC codes: {asjc_final}".strip()
+
+        records.append({
+            "id": str(uuid.uuid4()),
+            "name": title,
+            "scope": scope,
+            "content": content,
+            "publisher": publisher,
+            "link": link,
+            "coverage": coverage,
+            "asjc": asjc_final
+        })
+    return records
+
+
+def timed(fn, *args, repeat=1):
+    # Best of `repeat` runs, the machine is rarely quiet enough for a single run
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ingest row-transform stage")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--asjc-combos", type=int, default=5000, help="Distinct ASJC code lists in the sheet")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    asjc_map = make_asjc_map()
+    print(f"Generating synthetic outlet sheet ({args.rows} rows)...", flush=True)
+    df = make_sheet(args.rows, asjc_map, args.asjc_combos)
+
+    legacy, legacy_s = timed(legacy_transform, df, asjc_map, repeat=args.repeat)
+    vectorized, vectorized_s = timed(transform_frame, df, asjc_map, repeat=args.repeat)
+
+    # The loop drew random ids and had no code lists: compare the rest, and the ids with stable_id()
+    if len(legacy) != len(vectorized):
+        raise SystemExit(f"Records differ in number: {len(legacy)} vs {len(vectorized)}")
+    shared = [k for k in legacy[0] if k != "id"] if legacy else []
+    for i, (a, b) in enumerate(zip(legacy, vectorized)):
+        if any(a[k] != b[k] for k in shared) or b["id"] != stable_id(b["link"], b["name"]):
+            raise SystemExit(f"Records differ (first mismatch: {i})")
+
+    print(f"Records match: {len(legacy)}")
+    print(f"{'per-row loop':<16} {legacy_s:>8.2f}s {args.rows / legacy_s:>12.0f} rows/s")
+    print(f"{'columnar':<16} {vectorized_s:>8.2f}s {args.rows / vectorized_s:>12.0f} rows/s")
+    print(f"Speedup: {legacy_s / vectorized_s:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import math
+import multiprocessing
+import os
+import re
+import threading
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+# Embedding backends for ingestion and offline querying
+#   openai - text-embedding-3-small through the OpenAI API (1536-d), the default
+#   local  - CPU-only hashed n-gram model: no API, no key, no fitted state
+# Both expose an OpenAI-shaped client (client.embeddings.create(input=[...], model=...)), so the
+# embedding engine, checkpoint writer and cache work unchanged. The local model hashes word
+# unigrams, word bigrams and character trigrams (crc32, signed) into `dim` buckets with sublinear
+# term weights and L2-normalizes the result. Texts are embedded in a process pool, one batch per
+# task. web/lib/localEmbedding.ts implements the same function for query-time embedding, so the
+# two must change together (bump LOCAL_MODEL_VERSION when they do).
+
+OPENAI_MODEL = "text-embedding-3-small"
+OPENAI_DIM = 1536
+LOCAL_MODEL_VERSION = 1
+LOCAL_DIM = 512
+BACKENDS = ("openai", "local")
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+MIN_WORD_LEN = 3
+FEATURE_WEIGHTS = {"w": 1.0, "b": 0.7, "c": 0.3}
+
+
+def local_model_name(dim):
+    return f"local-hash-v{LOCAL_MODEL_VERSION}-{dim}"
+
+
+def hashed_features(text):
+    """Counter of "w:word", "b:word word" and "c:tri" features (lowercase ASCII words of 3+ chars)."""
+    words = [w for w in TOKEN_RE.findall(str(text).lower()) if len(w) >= MIN_WORD_LEN]
+    features = Counter("w:" + w for w in words)
+    features.update(f"b:{a} {b}" for a, b in zip(words, words[1:]))
+    for w in words:
+        padded = f"<{w}>"
+        features.update("c:" + padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+def local_embed(text, dim=LOCAL_DIM):
+    vec = np.zeros(dim, dtype=np.float64)
+    for feature, tf in hashed_features(text).items():
+        h = zlib.crc32(feature.encode("utf-8"))
+        weight = (1.0 + math.log(tf)) * FEATURE_WEIGHTS[feature[0]]
+        # Top bit picks the sign so colliding features cancel out on average instead of piling up
+        vec[h % dim] += -weight if h >> 31 else weight
+    norm = np.linalg.norm(vec)
+    if norm > 0:
+        vec /= norm
+    return vec.astype(np.float32)
+
+
+def local_embed_batch(texts, dim=LOCAL_DIM):
+    return [local_embed(t, dim).tolist() for t in texts]
+
+
+class LocalEmbeddingsClient:
+    """OpenAI-shaped client over local_embed; each create() call is one task in the process pool."""
+
+    def __init__(self, dim=LOCAL_DIM, workers=None):
+        self.dim = dim
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+        self._pool_lock = threading.Lock() # create() runs on every engine thread at once
+        self.embeddings = self # client.embeddings.create(...)
+
+    def create(self, input, model=None, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        if self.workers > 1:
+            with self._pool_lock:
+                if self._pool is None:
+                    # spawn: this process already runs threads (engine, metrics sampler), forking it is unsafe
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+                pool = self._pool
+            vectors = pool.submit(local_embed_batch, texts, self.dim).result()
+        else:
+            vectors = local_embed_batch(texts, self.dim)
+        return SimpleNamespace(data=[SimpleNamespace(embedding=v, index=i) for i, v in enumerate(vectors)])
+
+    def close(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+
+class EmbeddingBackend:
+    """
+    name/model/dim identify the vectors (stored per record and in the vector store manifest);
+    engine_options override the scheduler settings (the local model has no rate limits).
+    """
+
+    def __init__(self, name, model, dim, client, engine_options=None):
+        self.name = name
+        self.model = model
+        self.dim = dim
+        self.client = client
+        self.engine_options = engine_options or {}
+
+    @property
+    def available(self):
+        return self.client is not None
+
+    def describe(self):
+        return {"backend": self.name, "model": self.model, "dim": self.dim}
+
+    def close(self):
+        if isinstance(self.client, LocalEmbeddingsClient):
+            self.client.close()
+
+
+def make_backend(name="openai", client=None, dim=None, workers=None):
+    """
+    openai: `client` is the OpenAI client (or a stand-in); None means no key, nothing is embedded.
+    local: `dim` buckets (default LOCAL_DIM), `workers` processes (default: every core).
+    """
+    if name == "openai":
+        return EmbeddingBackend("openai", OPENAI_MODEL, OPENAI_DIM, client)
+    if name == "local":
+        dim = dim or LOCAL_DIM
+        local = LocalEmbeddingsClient(dim, workers)
+        return EmbeddingBackend("local", local_model_name(dim), dim, local,
+                                {"max_in_flight": local.workers, "rpm": 0, "tpm": 0})
+    raise ValueError(f"Unknown embedding backend '{name}' (expected one of {', '.join(BACKENDS)})")
+
+
+def backend_for_manifest(manifest, client=None, workers=None):
+    """The backend that produced a vector store (manifests from before backends existed are openai)."""
+    info = (manifest or {}).get("embedding") or {"backend": "openai"}
+    if info["backend"] == "local":
+        return make_backend("local", dim=info.get("dim"), workers=workers)
+    return make_backend(info["backend"], client)
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import sqlite3
+import time
+from array import array
+
+# Persistent embedding cache
+# Keyed by sha256(model + normalized content), so an edited scope/ASJC list gets a new key
+# (and a fresh embedding) while unchanged text is never paid for twice, whatever the record's
+# name or id. Vectors are stored as float32 blobs in a single SQLite file.
+
+CACHE_FILE = "web/data/embeddings_cache.sqlite"
+COMMIT_EVERY = 1000
+
+
+def normalize_content(text):
+    # Same text the API sees (newlines are replaced before embedding), whitespace collapsed
+    return " ".join(str(text).split())
+
+
+def cache_key(model, content):
+    return hashlib.sha256(f"{model}\0{normalize_content(content)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path=CACHE_FILE, model=""):
+        self.path = path
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+        self.puts = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self.conn.commit()
+
+    def key(self, content):
+        return cache_key(self.model, content)
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, contents, count=True):
+        """Returns { index: embedding } for the contents found in the cache (count=False: not in hit/miss stats)."""
+        found = {}
+        keys = [self.key(c) for c in contents]
+        now = time.time()
+        # SQLite limits bound parameters, so look up in chunks
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            by_key = {}
+            for k, blob in rows:
+                vec = array("f")
+                vec.frombytes(blob)
+                by_key[k] = vec.tolist()
+            for offset, k in enumerate(chunk):
+                if k in by_key:
+                    found[start + offset] = by_key[k]
+            if by_key:
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in by_key]
+                )
+        self.conn.commit()
+        if count:
+            self.hits += len(found)
+            self.misses += len(contents) - len(found)
+        return found
+
+    def put_many(self, contents, embeddings):
+        now = time.time()
+        rows = []
+        for content, emb in zip(contents, embeddings):
+            if not emb:
+                continue
+            rows.append((self.key(content), self.model, len(emb), array("f", emb).tobytes(), now))
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)", rows
+        )
+        self.conn.commit()
+        self.puts += len(rows)
+
+    def seed(self, records, text_key="content"):
+        """Bulk-load (content, embedding) pairs from already embedded records without counting hits."""
+        batch_contents, batch_embeddings = [], []
+        for record in records:
+            if record.get(text_key) and record.get("embedding"):
+                batch_contents.append(record[text_key])
+                batch_embeddings.append(record["embedding"])
+            if len(batch_contents) >= COMMIT_EVERY:
+                self.put_many(batch_contents, batch_embeddings)
+                batch_contents, batch_embeddings = [], []
+        if batch_contents:
+            self.put_many(batch_contents, batch_embeddings)
+
+    def evict(self, live_keys, max_entries):
+        """
+        Keeps the cache at most `max_entries` big by deleting entries no current record uses,
+        least recently used first. Entries in `live_keys` are never evicted.
+        """
+        total = len(self)
+        excess = total - max_entries
+        if excess <= 0:
+            return 0
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS live_keys (key TEXT PRIMARY KEY)")
+        self.conn.execute("DELETE FROM live_keys")
+        self.conn.executemany("INSERT OR IGNORE INTO live_keys (key) VALUES (?)", [(k,) for k in live_keys])
+        cursor = self.conn.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            " SELECT key FROM embeddings WHERE key NOT IN (SELECT key FROM live_keys)"
+            " ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        removed = cursor.rowcount
+        self.conn.execute("DELETE FROM live_keys")
+        self.conn.commit()
+        return removed
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "puts": self.puts,
+            "entries": len(self),
+        }
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,248 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from metrics import metrics
+
+# Concurrent, rate-limit-aware embedding scheduler
+# - up to `max_in_flight` embedding requests run at once (thread pool, the OpenAI client is sync)
+# - requests/minute and tokens/minute budgets are enforced with token buckets
+# - failed batches are retried with exponential backoff + jitter, up to `max_retries` attempts
+# - finished batches are handed to an OrderedCheckpointWriter so journals.jsonl is appended
+#   in input order and stays resumable
+# The client only needs `client.embeddings.create(input=[...], model=...)` returning an object
+# with `.data[i].embedding`, so a stub client or a local fake server (OPENAI_BASE_URL) works too.
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_IN_FLIGHT = 4
+DEFAULT_RPM = 3000
+DEFAULT_TPM = 1000000
+DEFAULT_MAX_RETRIES = 5
+
+# Errors that will not succeed on retry (bad input / auth)
+NON_RETRYABLE_STATUS = {400, 401, 403, 404, 422}
+
+
+def attach_embedding(record, embedding, model):
+    """Sets record["embedding"] along with the model and dimension that produced it."""
+    # The vector goes last: journal_store.parse_keys cuts lines at the "embedding" key
+    record.pop("embedding", None)
+    record["embedding_model"] = model
+    record["embedding_dim"] = len(embedding)
+    record["embedding"] = embedding
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English text; only used for budgeting
+    return len(text) // 4 + 1
+
+
+class RateLimiter:
+    """Token buckets for requests-per-minute and tokens-per-minute."""
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM):
+        self.rpm = float(rpm) if rpm else 0.0
+        self.tpm = float(tpm) if tpm else 0.0
+        self._requests = self.rpm
+        self._tokens = self.tpm
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last
+        self._last = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def acquire(self, tokens):
+        if self.tpm:
+            # A single request larger than the whole budget would wait forever
+            tokens = min(tokens, self.tpm)
+        while True:
+            with self._lock:
+                self._refill()
+                need_requests = 1 - self._requests if self.rpm else 0
+                need_tokens = tokens - self._tokens if self.tpm else 0
+                if need_requests <= 0 and need_tokens <= 0:
+                    if self.rpm:
+                        self._requests -= 1
+                    if self.tpm:
+                        self._tokens -= tokens
+                    return
+                wait = 0.0
+                if need_requests > 0:
+                    wait = max(wait, need_requests * 60.0 / self.rpm)
+                if need_tokens > 0:
+                    wait = max(wait, need_tokens * 60.0 / self.tpm)
+            time.sleep(min(wait, 5.0))
+
+
+class OrderedCheckpointWriter:
+    """
+    Appends finished batches to a JSONL file in submission order.
+    Batches can complete out of order; they are held back until every earlier batch is written.
+    Failed batches are submitted as empty lists so they don't block the ones after them.
+    With a JournalStore (journal_store.py) the resume index is updated with every batch.
+    """
+
+    def __init__(self, path, store=None):
+        self.path = path
+        self.store = store
+        self.next_seq = 0
+        self.written = 0
+        self.seconds = 0.0 # Time spent writing, for per-stage timing
+        self._pending = {}
+
+    def submit(self, seq, records):
+        self._pending[seq] = records
+        ready = []
+        while self.next_seq in self._pending:
+            ready.extend(self._pending.pop(self.next_seq))
+            self.next_seq += 1
+        if ready:
+            start = time.time()
+            if self.store is not None:
+                self.store.append_records(ready)
+            else:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    for item in ready:
+                        f.write(json.dumps(item) + "\n")
+            self.written += len(ready)
+            elapsed = time.time() - start
+            self.seconds += elapsed
+            metrics.observe("checkpoint.write", elapsed, rows=len(ready))
+        return ready
+
+
+class EmbeddingEngine:
+    def __init__(self, client, model, batch_size=DEFAULT_BATCH_SIZE, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_base=1.0, backoff_max=60.0, on_progress=None):
+        self.client = client
+        self.model = model
+        self.batch_size = max(1, int(batch_size))
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_retries = max(1, int(max_retries))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limiter = RateLimiter(rpm, tpm)
+        self.on_progress = on_progress # on_progress(done, total, api_calls) after every batch
+        self.stats = {"api_calls": 0, "retries": 0, "failed_batches": 0, "embedded": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+        metrics.count(f"embed.{key}", n)
+
+    def embed_batch(self, texts):
+        """Embeds one batch with retries. Raises the last error once attempts are exhausted."""
+        texts = [t.replace("\n", " ") for t in texts]
+        tokens = sum(estimate_tokens(t) for t in texts)
+        for attempt in range(1, self.max_retries + 1):
+            self.limiter.acquire(tokens)
+            self._count("api_calls")
+            request_start = time.perf_counter()
+            try:
+                try:
+                    response = self.client.embeddings.create(input=texts, model=self.model)
+                finally:
+                    metrics.observe("embed.request", time.perf_counter() - request_start, texts=len(texts))
+                embeddings = [d.embedding for d in response.data]
+                if len(embeddings) != len(texts):
+                    raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+                self._count("embedded", len(embeddings))
+                return embeddings
+            except Exception as e:
+                status = getattr(e, "status_code", None)
+                if status in NON_RETRYABLE_STATUS or attempt == self.max_retries:
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+                delay *= 0.5 + random.random() / 2  # jitter so parallel workers don't retry in lockstep
+                self._count("retries")
+                print(f"Embedding request failed ({e}). Retry {attempt}/{self.max_retries - 1} in {delay:.1f}s", flush=True)
+                time.sleep(delay)
+
+    def run(self, texts, on_batch):
+        """
+        Embeds `texts` in batches, `max_in_flight` at a time.
+        on_batch(seq, start, embeddings) is called from the calling thread for every batch;
+        embeddings is None if the batch failed after all retries.
+        An exception from on_batch/on_progress cancels the batches not yet started and propagates.
+        """
+        total = len(texts)
+        if total == 0:
+            return
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            futures = {}
+            for seq, start in enumerate(range(0, total, self.batch_size)):
+                future = pool.submit(self.embed_batch, texts[start:start + self.batch_size])
+                futures[future] = (seq, start)
+
+            try:
+                for future in as_completed(futures):
+                    seq, start = futures[future]
+                    size = min(self.batch_size, total - start)
+                    try:
+                        embeddings = future.result()
+                    except Exception as e:
+                        print(f"Batch {start}-{start + size} failed after retries: {e}", flush=True)
+                        self._count("failed_batches")
+                        embeddings = None
+                    done += size
+                    on_batch(seq, start, embeddings)
+                    print(f"Processed {done}/{total}", flush=True)
+                    if self.on_progress:
+                        self.on_progress(done, total, self.stats["api_calls"])
+            except BaseException:
+                # Only the requests already in flight are waited for on the way out
+                for future in futures:
+                    future.cancel()
+                raise
+
+    def embed_texts(self, texts):
+        """Returns { index: embedding } for every text that was embedded successfully."""
+        results = {}
+
+        def on_batch(seq, start, embeddings):
+            if embeddings is None:
+                return
+            for j, emb in enumerate(embeddings):
+                results[start + j] = emb
+
+        self.run(texts, on_batch)
+        return results
+
+    def embed_records(self, records, writer, text_key="content", on_embedded=None):
+        """
+        Embeds records[i][text_key] and checkpoints them through `writer` in order
+        (writer=None: nothing is written, on_embedded is the only consumer).
+        on_embedded(batch), if given, sees every successful batch before it is written.
+        Returns the records that could not be embedded (they are not written, so the next run retries them).
+        """
+        failed = []
+
+        def on_batch(seq, start, embeddings):
+            batch = records[start:start + self.batch_size]
+            if embeddings is None:
+                failed.extend(batch)
+                if writer:
+                    writer.submit(seq, [])
+                return
+            for item, emb in zip(batch, embeddings):
+                attach_embedding(item, emb, self.model)
+            if on_embedded:
+                on_embedded(batch)
+            # RAM OPTIMIZATION: once written, the vectors are on disk; don't keep them in memory.
+            # Batches held back by the writer keep theirs until their turn comes.
+            for item in (writer.submit(seq, batch) if writer else batch):
+                item.pop("embedding", None)
+
+        self.run([r[text_key] for r in records], on_batch)
+        return failed
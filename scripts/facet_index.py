@@ -0,0 +1,315 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from vector_store import OUTPUT_DIR, index_info, iter_metadata, load_manifest, load_vectors, write_generation
+
+# SDG x journal affinity and ASJC facets
+# Precomputed at ingest so "journals for SDG 7" or "top-k within ASJC 2100 aligned to SDG 13" can
+# prune the scan to a candidate set instead of scoring the whole catalog. Rows are the rows of the
+# binary vector store. Files next to it:
+#   journals.facets.json - sdg ids, ASJC areas, section sizes, and the store/sdgs.json hashes it was built from
+#   journals.facets.bin  - uint32 bitmaps, one per SDG then one per ASJC area (bit r = row r, words little-endian)
+#                          int32 ASJC code offsets (rows + 1)
+#                          float16 affinity (rows x sdgs): cosine of each journal to each SDG embedding
+#                          uint16 ASJC codes of every row (CSR with the offsets)
+# A journal is aligned to an SDG when that SDG is among its `sdg_top` closest (positive affinity).
+# Ranks rather than a cosine threshold: absolute cosine levels differ between embedding backends.
+# ASJC areas are the first two digits of a code (2100 "Energy (all)" and 2105 are both area 21).
+#
+# Usage:
+#   python scripts/facet_index.py build [--sdg-top 3]
+#   python scripts/facet_index.py stats
+#   python scripts/facet_index.py filter [--sdg 13] [--asjc 2100] [--k 10]
+
+FACETS_FILE = "journals.facets.json"
+FACETS_BIN = "journals.facets.bin"
+FACETS_VERSION = 1
+SDG_TOP = 3
+SDGS_FILE = "sdgs.json"
+META_FIELDS = ("id", "name", "publisher", "asjc")
+
+
+def asjc_area(code):
+    """2105 -> 21; two-digit codes are areas already."""
+    return code // 100 if code >= 100 else code
+
+
+def _file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _reverse_asjc(asjc_map):
+    # Rows written before records carried asjc_codes: map descriptions back to every code they name
+    reverse = {}
+    for code, desc in (asjc_map or {}).items():
+        if str(code).isdigit():
+            reverse.setdefault(desc, []).append(int(code))
+    return reverse
+
+
+def _row_codes(meta, reverse):
+    codes = meta.get("asjc_codes")
+    if codes is not None:
+        return codes
+    found = []
+    for part in (meta.get("asjc") or "").split(";"):
+        part = part.strip()
+        if part.isdigit():
+            found.append(int(part))
+        else:
+            found.extend(reverse.get(part, ()))
+    return found
+
+
+def _bitmaps(mask, words):
+    """bool (n, rows) -> uint32 (n, words)."""
+    padded = np.zeros((mask.shape[0], words * 32), dtype=bool)
+    padded[:, :mask.shape[1]] = mask
+    return np.packbits(padded, axis=1, bitorder="little").view("<u4")
+
+
+def build(data_dir=OUTPUT_DIR, asjc_map=None, sdg_top=SDG_TOP, chunk_rows=8192):
+    manifest = load_manifest(data_dir)
+    sdgs_path = os.path.join(data_dir, SDGS_FILE)
+    if manifest is None or not os.path.exists(sdgs_path):
+        print("No vector store or sdgs.json; skipping facet index.", flush=True)
+        return None
+    start = time.time()
+    with open(sdgs_path, "r", encoding="utf-8") as f:
+        sdgs = json.load(f)
+    rows, dim = manifest["rows"], manifest["dim"]
+    sdg_ids = [int(s["id"]) for s in sdgs]
+
+    # SDG vectors of the store's own model only (another model's cosines are meaningless)
+    sdg_matrix = np.zeros((len(sdgs), dim), dtype=np.float32)
+    model = (manifest.get("embedding") or {}).get("model")
+    usable = 0
+    for i, s in enumerate(sdgs):
+        emb = s.get("embedding")
+        if emb and len(emb) == dim and (model is None or s.get("embedding_model", model) == model):
+            v = np.asarray(emb, dtype=np.float32)
+            sdg_matrix[i] = v / (np.linalg.norm(v) or 1.0)
+            usable += 1
+    if usable == 0:
+        print("WARNING: sdgs.json has no embeddings for the store's model; SDG affinity is all zero.", flush=True)
+
+    # Affinity, chunked so only one block of float32 rows is materialized at a time
+    _, matrix = load_vectors(data_dir)
+    affinity = np.zeros((rows, len(sdgs)), dtype=np.float16)
+    for lo in range(0, rows, chunk_rows):
+        block = np.asarray(matrix[lo:lo + chunk_rows], dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0 # Rows without embeddings are zero vectors: affinity 0
+        affinity[lo:lo + chunk_rows] = (block / norms) @ sdg_matrix.T
+    del matrix
+
+    # SDG bitmaps: each row's `sdg_top` best SDGs with a positive affinity
+    top = min(sdg_top, len(sdgs))
+    aligned = np.zeros((len(sdgs), rows), dtype=bool)
+    if rows and top:
+        scores = affinity.astype(np.float32)
+        best = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+        row_idx = np.repeat(np.arange(rows), top)
+        cols = best.ravel()
+        positive = scores[row_idx, cols] > 0
+        aligned[cols[positive], row_idx[positive]] = True
+
+    # ASJC codes (CSR) and area bitmaps
+    reverse = _reverse_asjc(asjc_map)
+    offsets = np.zeros(rows + 1, dtype=np.int32)
+    codes = []
+    for r, meta in enumerate(iter_metadata(data_dir, manifest)):
+        if r >= rows:
+            break
+        row_codes = _row_codes(meta, reverse)
+        codes.extend(row_codes)
+        offsets[r + 1] = len(codes)
+    codes = np.asarray(codes, dtype=np.uint16)
+    areas = sorted({asjc_area(int(c)) for c in codes.tolist()})
+    area_pos = {a: i for i, a in enumerate(areas)}
+    in_area = np.zeros((len(areas), rows), dtype=bool)
+    if len(codes):
+        code_rows = np.repeat(np.arange(rows), np.diff(offsets))
+        code_areas = np.where(codes >= 100, codes // 100, codes)
+        in_area[[area_pos[int(a)] for a in code_areas.tolist()], code_rows] = True
+
+    words = (rows + 31) // 32
+    payload = (_bitmaps(aligned, words).tobytes() + _bitmaps(in_area, words).tobytes()
+               + offsets.tobytes() + affinity.tobytes() + codes.tobytes())
+    info = {
+        "version": FACETS_VERSION,
+        "rows": rows,
+        "words": words,
+        "sdg_ids": sdg_ids,
+        "sdg_top": top,
+        "areas": areas,
+        "codes": int(len(codes)),
+        "bin_file": FACETS_BIN,
+        "store_vectors_sha256": manifest["vectors_sha256"],
+        "store_meta_sha256": manifest["meta_sha256"],
+        "sdgs_sha256": _file_sha256(sdgs_path),
+        "build_seconds": round(time.time() - start, 2),
+        "created": time.time(),
+    }
+
+    path = os.path.join(data_dir, FACETS_BIN)
+    with open(path + ".tmp", "wb") as f:
+        f.write(payload)
+    os.replace(path + ".tmp", path)
+    index_path = os.path.join(data_dir, FACETS_FILE)
+    with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+    os.replace(index_path + ".tmp", index_path)
+
+    print(f"Facet index written: {len(sdgs)} SDGs x {rows} journals, {len(areas)} ASJC areas, "
+          f"{len(codes)} codes ({len(payload) / 1e6:.1f}MB) in {info['build_seconds']:.1f}s", flush=True)
+    return info
+
+
+class FacetIndex:
+    def __init__(self, info, sdg_bits, area_bits, offsets, affinity, codes, metadata=None):
+        self.info = info
+        self.rows = info["rows"]
+        self.sdg_pos = {s: i for i, s in enumerate(info["sdg_ids"])}
+        self.area_pos = {a: i for i, a in enumerate(info["areas"])}
+        self.sdg_bits = sdg_bits
+        self.area_bits = area_bits
+        self.offsets = offsets
+        self.affinity = affinity
+        self.codes = codes
+        self.metadata = metadata
+
+    def mask(self, sdgs=(), asjc=()):
+        """
+        uint32 bitmap of the rows aligned to every SDG in `sdgs` and classified under every ASJC
+        filter in `asjc` (areas match all their codes, other codes match exactly). None: no filter.
+        """
+        if not sdgs and not asjc:
+            return None
+        words = np.full(self.info["words"], 0xFFFFFFFF, dtype=np.uint32)
+        for s in sdgs:
+            pos = self.sdg_pos.get(int(s))
+            words &= self.sdg_bits[pos] if pos is not None else 0
+        for code in asjc:
+            pos = self.area_pos.get(asjc_area(int(code)))
+            words &= self.area_bits[pos] if pos is not None else 0
+        return words
+
+    def rows_for(self, sdgs=(), asjc=()):
+        """Candidate rows (ascending) for the filters; exact-code filters are checked per row."""
+        words = self.mask(sdgs, asjc)
+        if words is None:
+            return np.arange(self.rows)
+        rows = np.flatnonzero(np.unpackbits(words.view(np.uint8), bitorder="little")[:self.rows])
+        exact = [int(c) for c in asjc if int(c) >= 100 and int(c) % 100]
+        if exact:
+            rows = np.array([r for r in rows.tolist()
+                             if all(c in self.codes[self.offsets[r]:self.offsets[r + 1]] for c in exact)],
+                            dtype=np.int64)
+        return rows
+
+    def top_for_sdg(self, sdg, rows=None, k=10):
+        """[(row, affinity)] of the rows closest to one SDG, best first."""
+        pos = self.sdg_pos[int(sdg)]
+        rows = np.arange(self.rows) if rows is None else np.asarray(rows)
+        scores = self.affinity[rows, pos].astype(np.float32)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [(int(rows[i]), float(scores[i])) for i in order]
+
+
+def is_current(data_dir=OUTPUT_DIR, manifest=None):
+    """True if the facet index matches the current vector store and sdgs.json (no need to rebuild)."""
+    info = index_info(data_dir, FACETS_FILE, manifest)
+    sdgs_path = os.path.join(data_dir, SDGS_FILE)
+    return info is not None and os.path.exists(sdgs_path) and info.get("sdgs_sha256") == _file_sha256(sdgs_path)
+
+
+def load_index(data_dir=OUTPUT_DIR, manifest=None, metadata=False):
+    """The facet index if it matches the current vector store and sdgs.json, else None."""
+    path = os.path.join(data_dir, FACETS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        info = json.load(f)
+    if manifest is None:
+        manifest = load_manifest(data_dir)
+    sdgs_path = os.path.join(data_dir, SDGS_FILE)
+    if manifest is None or info.get("store_vectors_sha256") != manifest.get("vectors_sha256") \
+            or info.get("store_meta_sha256") != manifest.get("meta_sha256") \
+            or not os.path.exists(sdgs_path) or info.get("sdgs_sha256") != _file_sha256(sdgs_path):
+        print("Facet index is stale (vector store or sdgs.json rebuilt since).", flush=True)
+        return None
+    raw = np.fromfile(os.path.join(data_dir, info["bin_file"]), dtype=np.uint8)
+    rows, words, n_sdgs, n_areas = info["rows"], info["words"], len(info["sdg_ids"]), len(info["areas"])
+    at = 0
+    sdg_bits = raw[at:at + n_sdgs * words * 4].view("<u4").reshape(n_sdgs, words)
+    at += n_sdgs * words * 4
+    area_bits = raw[at:at + n_areas * words * 4].view("<u4").reshape(n_areas, words)
+    at += n_areas * words * 4
+    offsets = raw[at:at + (rows + 1) * 4].view(np.int32)
+    at += (rows + 1) * 4
+    affinity = raw[at:at + rows * n_sdgs * 2].view(np.float16).reshape(rows, n_sdgs)
+    at += rows * n_sdgs * 2
+    codes = raw[at:at + info["codes"] * 2].view(np.uint16)
+    meta = [{field: m.get(field) for field in META_FIELDS} for m in iter_metadata(data_dir, manifest)] \
+        if metadata else None
+    return FacetIndex(info, sdg_bits, area_bits, offsets, affinity, codes, meta)
+
+
+def _popcount(words):
+    return int(np.unpackbits(words.view(np.uint8)).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the SDG affinity / ASJC facet index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_p = sub.add_parser("build", help="Write the index from the vector store and sdgs.json")
+    build_p.add_argument("--sdg-top", type=int, default=SDG_TOP, help="SDGs a journal is aligned to")
+    build_p.add_argument("--asjc-file", default=os.path.join("resources", "ASJC1.xlsx"),
+                         help="Code list used for rows stored without asjc_codes")
+    stats = sub.add_parser("stats", help="Journals per SDG and per ASJC area")
+    filt = sub.add_parser("filter", help="Journals matching the filters (by SDG affinity with --sdg)")
+    filt.add_argument("--sdg", type=int, action="append", default=[])
+    filt.add_argument("--asjc", type=int, action="append", default=[])
+    filt.add_argument("--k", type=int, default=10)
+    for p in (build_p, stats, filt):
+        p.add_argument("--data-dir", default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        asjc_map = None
+        if os.path.exists(args.asjc_file):
+            from journal_transform import load_asjc_map
+            asjc_map = load_asjc_map(args.asjc_file)
+        build(args.data_dir, asjc_map, args.sdg_top)
+        write_generation(args.data_dir) # Running servers pick up the rebuilt index
+        return
+
+    index = load_index(args.data_dir, metadata=args.command == "filter")
+    if index is None:
+        raise SystemExit("No fresh facet index. Run: python scripts/facet_index.py build")
+    if args.command == "stats":
+        print(f"{index.rows} journals, each aligned to its top {index.info['sdg_top']} SDGs")
+        for s, pos in index.sdg_pos.items():
+            print(f"SDG {s:<3} {_popcount(index.sdg_bits[pos]):>9} journals")
+        for a, pos in index.area_pos.items():
+            print(f"ASJC {a:<3} {_popcount(index.area_bits[pos]):>8} journals")
+        return
+
+    start = time.perf_counter()
+    rows = index.rows_for(args.sdg, args.asjc)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{len(rows)} of {index.rows} journals match ({elapsed:.2f}ms)")
+    ranked = index.top_for_sdg(args.sdg[0], rows, args.k) if args.sdg else [(int(r), None) for r in rows[:args.k]]
+    for rank, (row, score) in enumerate(ranked, 1):
+        print(json.dumps(dict(index.metadata[row], rank=rank, affinity=None if score is None else round(score, 4))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import hashlib
+import random
+import threading
+import time
+
+import numpy as np
+
+# Deterministic offline stand-in for the OpenAI embeddings client
+# Same surface the embedding engine uses: client.embeddings.create(input=[...], model=...) returning
+# an object with .data[i].embedding. Vectors are derived from sha256(model + text), so the same
+# text always gets the same unit vector across runs and processes. Latency and failures are
+# injectable to exercise the scheduler (retries, backoff, out-of-order batches) without any
+# network or credits.
+
+
+class FakeAPIError(Exception):
+    """Carries a status_code like openai.APIStatusError, so retry classification works the same."""
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _Embedding:
+    def __init__(self, embedding, index):
+        self.embedding = embedding
+        self.index = index
+        self.object = "embedding"
+
+
+class _Response:
+    def __init__(self, data, model):
+        self.data = data
+        self.model = model
+        self.object = "list"
+
+
+class FakeEmbeddingsClient:
+    def __init__(self, dim=1536, latency_ms=0.0, jitter_ms=0.0, per_item_ms=0.0,
+                 error_rate=0.0, error_status=429, seed=0):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.per_item_ms = per_item_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.seed = seed
+        self.calls = 0
+        self.errors = 0
+        self.items = 0
+        self._lock = threading.Lock()
+        self.embeddings = self # client.embeddings.create(...)
+
+    def vector(self, text, model=""):
+        digest = hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+        rng = np.random.default_rng(int.from_bytes(digest[:8], "little"))
+        vec = rng.standard_normal(self.dim).astype(np.float32)
+        vec /= np.linalg.norm(vec)
+        return vec.tolist()
+
+    def create(self, input, model, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        # Per-call RNG: which calls fail and how long they take only depends on the seed and call number
+        rng = random.Random(self.seed * 1000003 + call)
+        delay = self.latency_ms + self.jitter_ms * rng.random() + self.per_item_ms * len(texts)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if self.error_rate and rng.random() < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            raise FakeAPIError(self.error_status, f"Injected error {self.error_status} (call {call})")
+        with self._lock:
+            self.items += len(texts)
+        return _Response([_Embedding(self.vector(t, model), i) for i, t in enumerate(texts)], model)
+
+    def stats(self):
+        return {"calls": self.calls, "errors": self.errors, "items": self.items}
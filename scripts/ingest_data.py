@@ -1,11 +1,27 @@
 import pandas as pd
 import os
 import json
-import uuid
 from openai import OpenAI
 from dotenv import load_dotenv
 import time
-from openpyxl import load_workbook
+import argparse
+from contextlib import contextmanager
+
+from embedding_backends import BACKENDS, make_backend
+from embedding_cache import EmbeddingCache
+from embedding_engine import EmbeddingEngine, OrderedCheckpointWriter, attach_embedding
+from ingest_jobs import writer_lock
+from journal_store import JournalStore, record_key
+from journal_transform import load_asjc_map, transform_frame
+from metrics import metrics, profiled
+from vector_store import build_from_jsonl, index_info, is_fresh, load_manifest, write_generation
+from ann_index import INDEX_FILE as ANN_FILE, build_index
+from facet_index import build as build_facets, is_current as facets_current
+from lexical_index import INDEX_FILE as LEXICAL_FILE, build_index as build_lexical_index
+from quantize import QUANT_FILE, build as build_quantized
+from sdg_matcher import write_matcher
+from shard_ingest import ingest_sharded
+from workbook_cache import iter_journal_frames
 
 # Resolve .env path relative to this script or CWD
 # Resolve .env path relative to this script or CWD
@@ -20,10 +36,31 @@ RESOURCES_DIR = "resources"
 OUTPUT_DIR = "web/data"
 JOURNALS_FILE = "List Scopus Outlet.xlsx"
 SDGS_FILE = "SDGs Keyword.xlsx"
-EMBEDDING_MODEL = "text-embedding-3-small"
-BATCH_SIZE = 500
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "openai") # openai or local (see embedding_backends.py)
+LOCAL_EMBED_DIM = int(os.getenv("LOCAL_EMBED_DIM", "0")) or None # Default: embedding_backends.LOCAL_DIM
+LOCAL_EMBED_WORKERS = int(os.getenv("LOCAL_EMBED_WORKERS", "0")) or None # Default: every core
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32") # float32 or float16 for journals.vectors.bin
+ANN_INDEX = os.getenv("ANN_INDEX", "0") == "1" # Also build the IVF index (see ann_index.py)
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0")) or None # Default: ~4 * sqrt(rows)
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+VECTOR_QUANT = os.getenv("VECTOR_QUANT", "") # int8 or pq: also write quantized vectors (see quantize.py)
+
+# Embedding scheduler (see embedding_engine.py)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100")) # Also the checkpoint granularity
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4")) # Requests in flight
+EMBED_RPM = int(os.getenv("EMBED_RPM", "3000"))
+EMBED_TPM = int(os.getenv("EMBED_TPM", "1000000"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+
+# Sharded ingestion (see shard_ingest.py): >1 splits the workbook over that many worker processes
+INGEST_SHARDS = int(os.getenv("INGEST_SHARDS", "0"))
+
+# Content-hash embedding cache (see embedding_cache.py)
+EMBED_CACHE_FILE = os.getenv("EMBED_CACHE_FILE", os.path.join(OUTPUT_DIR, "embeddings_cache.sqlite"))
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000"))
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Only built with a key: offline runs (no key, or an injected embed_client) never touch it
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY")) if os.getenv("OPENAI_API_KEY") else None
 
 SDG_NAMES = {
     1: "No Poverty",
@@ -45,39 +82,276 @@ SDG_NAMES = {
     17: "Partnerships for the Goals"
 }
 
-def get_embeddings_batched_safe(text_map, model):
+def engine_options():
+    return dict(
+        batch_size=EMBED_BATCH_SIZE,
+        max_in_flight=EMBED_CONCURRENCY,
+        rpm=EMBED_RPM,
+        tpm=EMBED_TPM,
+        max_retries=EMBED_MAX_RETRIES,
+    )
+
+def make_engine(backend, progress=None, phase="embed"):
+    options = engine_options()
+    options.update(backend.engine_options)
+    if progress:
+        options["on_progress"] = lambda done, total, api_calls: progress(phase, done, total, api_calls)
+    return EmbeddingEngine(backend.client, backend.model, **options)
+
+def get_embeddings_batched_safe(text_map, backend, progress=None, phase="embed"):
     """
     text_map: list of { index: int, text: string }
     Returns map of { index: embedding[] }
     """
     if not text_map:
         return {}
-        
-    results = {}
-    total = len(text_map)
-    print(f"Generating embeddings for {total} new items...")
-    
-    # Extract just texts for the batch
-    all_indices = [item['index'] for item in text_map]
-    all_texts = [item['text'].replace("\n", " ") for item in text_map]
-    
-    for i in range(0, total, BATCH_SIZE):
-        batch_texts = all_texts[i:i+BATCH_SIZE]
-        batch_indices = all_indices[i:i+BATCH_SIZE]
-        
+
+    print(f"Generating embeddings for {len(text_map)} new items...")
+    engine = make_engine(backend, progress, phase)
+    embedded = engine.embed_texts([item['text'] for item in text_map])
+    return {text_map[i]['index']: emb for i, emb in embedded.items()}
+
+class PhaseTimer:
+    """Wall time and row counts per ingest phase, printed as a report at the end."""
+
+    def __init__(self, progress=None):
+        self.phases = []
+        self.progress = progress # progress(phase, done, total=None, api_calls=None), see ingest()
+
+    @contextmanager
+    def phase(self, name):
+        info = {"name": name, "rows": 0}
+        start = time.time()
+        print(f"[{name}] started", flush=True)
+        if self.progress:
+            self.progress(name, 0)
         try:
-            response = client.embeddings.create(input=batch_texts, model=model)
-            for j, data in enumerate(response.data):
-                original_idx = batch_indices[j]
-                results[original_idx] = data.embedding
-            print(f"Processed {min(i+BATCH_SIZE, total)}/{total}")
-        except Exception as e:
-            print(f"Error in batch {i}: {e}")
-            time.sleep(2) # Backoff
-            
-    return results
+            yield info
+        finally:
+            info["seconds"] = time.time() - start
+            self.phases.append(info)
+            print(f"[{name}] {info['seconds']:.2f}s, {info['rows']} rows", flush=True)
+            metrics.observe(f"ingest.{name}", info["seconds"], rows=info["rows"])
+            metrics.count(f"rows.{name}", info["rows"])
+        if self.progress:
+            self.progress(name, info["rows"], info["rows"])
+
+    def record(self, name, start, rows):
+        self.add(name, time.time() - start, rows)
+
+    def add(self, name, seconds, rows):
+        info = {"name": name, "rows": rows, "seconds": seconds}
+        self.phases.append(info)
+        print(f"[{name}] {seconds:.2f}s, {rows} rows", flush=True)
+        metrics.observe(f"ingest.{name}", seconds, rows=rows)
+        metrics.count(f"rows.{name}", rows)
+        if self.progress:
+            self.progress(name, rows, rows)
+
+    def report(self):
+        print("--- Phase Report ---", flush=True)
+        for p in self.phases:
+            rate = p["rows"] / p["seconds"] if p["seconds"] > 0 else 0
+            print(f"{p['name']:<12} {p['seconds']:>9.2f}s {p['rows']:>9} rows {rate:>12.0f} rows/s", flush=True)
+        print(f"{'total':<12} {sum(p['seconds'] for p in self.phases):>9.2f}s", flush=True)
+
+
+def remap_exclusions(id_map):
+    """Rewrites exclusions.json so excluded journals keep their exclusion under their new ids."""
+    excl_path = os.path.join(OUTPUT_DIR, "exclusions.json")
+    if not id_map or not os.path.exists(excl_path):
+        return 0
+    with open(excl_path, "r", encoding="utf-8") as f:
+        excluded = json.load(f)
+    remapped = [id_map.get(i, i) for i in excluded]
+    changed = sum(1 for a, b in zip(excluded, remapped) if a != b)
+    if changed:
+        tmp_path = excl_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(dict.fromkeys(remapped)), f)
+        os.replace(tmp_path, excl_path)
+    return changed
+
+def upsert_journals(records, store, cache, engine, timer):
+    """
+    Diffs the workbook records against the current store and writes a compacted generation:
+    unchanged rows keep their vector, added/changed rows are embedded (cache first), rows no
+    longer in the workbook are dropped. The new file replaces journals.jsonl atomically.
+    """
+    existing_index = store.entries
+    with timer.phase("diff") as info:
+        new_keys = set()
+        to_embed = []
+        added = changed = unchanged = 0
+        for record in records:
+            key = record_key(record)
+            new_keys.add(key)
+            old = existing_index.get(key)
+            if old is None:
+                added += 1
+                to_embed.append(record)
+            elif not old["has_embedding"] or old["content_key"] != cache.key(record["content"]):
+                changed += 1
+                to_embed.append(record)
+            else:
+                unchanged += 1
+        removed = sum(1 for key in existing_index if key not in new_keys)
+        info["rows"] = len(records)
+        print(f"Diff: {added} added, {changed} changed, {removed} removed, {unchanged} unchanged.", flush=True)
+
+    with timer.phase("embed") as info:
+        cached = cache.get_many([r["content"] for r in to_embed])
+        misses = [r for i, r in enumerate(to_embed) if i not in cached]
+        info["rows"] = len(to_embed)
+        print(f"{len(cached)} from the embedding cache, {len(misses)} to embed.", flush=True)
+        if misses and engine is not None:
+            # Vectors go to the cache as batches finish, so an interrupted upsert resumes cheaply
+            failed = engine.embed_records(
+                misses, None,
+                on_embedded=lambda batch: cache.put_many([r["content"] for r in batch], [r["embedding"] for r in batch])
+            )
+            if failed:
+                print(f"WARNING: {len(failed)} records failed to embed after retries. "
+                      f"They are stored without a vector; re-run with --upsert to retry them.", flush=True)
+        elif misses:
+            print("No API Key: changed/added records without a cached vector are stored without embeddings.", flush=True)
 
-def ingest():
+    with timer.phase("write") as info:
+        id_map = {}
+        old_f = open(store.path, "rb") if existing_index else None
+        try:
+            with store.rewrite() as out:
+                for start in range(0, len(records), 1000):
+                    chunk = records[start:start + 1000]
+                    # Vectors for added/changed rows come from the cache (filled by the embed phase)
+                    fresh = cache.get_many([r["content"] for r in chunk], count=False)
+                    for i, record in enumerate(chunk):
+                        old = existing_index.get(record_key(record))
+                        if old and old["id"] and old["id"] != record["id"]:
+                            id_map[old["id"]] = record["id"]
+                        if i in fresh:
+                            attach_embedding(record, fresh[i], cache.model)
+                        elif old and old["has_embedding"] and old["content_key"] == cache.key(record["content"]):
+                            attach_embedding(record, store.read_at(old["offset"], old_f).get("embedding"), cache.model)
+                        out.write(record)
+                        record.pop("embedding", None)
+                        info["rows"] += 1
+        finally:
+            if old_f:
+                old_f.close()
+        remapped = remap_exclusions(id_map)
+        print(f"Compacted store written: {info['rows']} rows ({removed} removed). "
+              f"{remapped} exclusions remapped to stable ids.", flush=True)
+
+def write_if_changed(path, text):
+    """Writes `text` to `path` unless it already holds exactly that. Returns True if it wrote."""
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read() == text:
+                return False
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return True
+
+def ingest_journals(journals_path, store, cache, backend, asjc_map, upsert, timer, progress=None):
+    """
+    Journal stage of ingest() in this process: streams the workbook, transforms it chunk by chunk and
+    embeds the rows not in the store yet (or diffs every row with --upsert). Returns the embedding
+    cache keys of every workbook row (never evicted).
+    """
+    journals_jsonl_path = store.path
+    existing_names = store.names
+    # Cached frames when the workbook is unchanged, otherwise openpyxl streaming (low memory)
+    # with the cache written in the same pass
+    frames = iter_journal_frames(journals_path, RESOURCES_DIR)
+
+    # Columnar transform stage (journal_transform.py): one vectorized pass per chunk
+    pending_records = []
+    upsert_records = [] # --upsert: every workbook row, diffed against the store afterwards
+    live_cache_keys = set() # Cache entries used by the current workbook are never evicted
+    transform_start = time.time()
+    read_seconds = 0.0
+    transformed = 0
+    frames = iter(frames)
+    while True:
+        # Time spent producing frames is the Excel/Parquet read, the rest is the transform
+        read_start = time.time()
+        frame = next(frames, None)
+        read_seconds += time.time() - read_start
+        if frame is None:
+            break
+        metrics.observe("read.frame", time.time() - read_start, rows=len(frame))
+        if progress:
+            progress("read", transformed)
+        with metrics.span("transform.frame", rows=len(frame)):
+            records = transform_frame(frame, asjc_map)
+        for record in records:
+            transformed += 1
+            live_cache_keys.add(cache.key(record["content"]))
+
+            if upsert:
+                upsert_records.append(record)
+            # If we already have it fully processed (with embedding), skip it
+            elif record["name"] not in existing_names:
+                pending_records.append(record)
+    timer.add("read", read_seconds, transformed)
+    timer.add("transform", time.time() - transform_start - read_seconds, transformed)
+
+    if upsert:
+        engine = make_engine(backend, progress) if backend.available else None
+        upsert_journals(upsert_records, store, cache, engine, timer)
+        upsert_records = []
+
+    print(f"Pending processing: {len(pending_records)}", flush=True)
+
+    # 2.5 Reuse cached embeddings for unchanged content
+    if pending_records:
+        cached = cache.get_many([r["content"] for r in pending_records])
+        if cached:
+            for idx, emb in cached.items():
+                attach_embedding(pending_records[idx], emb, backend.model)
+            with metrics.span("cache.write", rows=len(cached)):
+                store.append_records([pending_records[idx] for idx in cached])
+            print(f"Saved {len(cached)} records from the embedding cache.", flush=True)
+            pending_records = [r for i, r in enumerate(pending_records) if i not in cached]
+    
+    # 3. Embed Pending Concurrently & SAVE INCREMENTALLY
+    # Batches are checkpointed to the JSONL in order as they finish (resume-safe).
+    if backend.available and pending_records:
+        embed_start = time.time()
+        engine = make_engine(backend, progress)
+        writer = OrderedCheckpointWriter(journals_jsonl_path, store)
+        print(f"Embedding {len(pending_records)} records "
+              f"({engine.max_in_flight} in flight, batch {engine.batch_size})...", flush=True)
+        failed = engine.embed_records(
+            pending_records, writer,
+            on_embedded=lambda batch: cache.put_many([r["content"] for r in batch], [r["embedding"] for r in batch])
+        )
+        print(f"Saved {writer.written} new records to {journals_jsonl_path} (Append-only). "
+              f"API calls: {engine.stats['api_calls']}, retries: {engine.stats['retries']}", flush=True)
+        if failed:
+            # Not written, so the next run picks them up again
+            print(f"WARNING: {len(failed)} records failed to embed after retries. "
+                  f"Re-run ingestion to retry them.", flush=True)
+        timer.add("embed", time.time() - embed_start - writer.seconds, len(pending_records))
+        timer.add("write", writer.seconds, writer.written)
+    else:
+        # No API key or no pending -> Just dump text data if needed
+        if pending_records:
+            print("No API Key or Dry Run: Saving pending records without embeddings.", flush=True)
+            store.append_records(pending_records)
+
+    return live_cache_keys
+
+
+def ingest(embed_client=None, upsert=False, ann=ANN_INDEX, backend=EMBED_BACKEND, progress=None,
+           shards=INGEST_SHARDS):
+    """
+    progress, if given, is called as progress(phase, done, total=None, api_calls=None) at every
+    phase start/end, per workbook chunk and per embedded batch (ingest_jobs.py stores these events).
+    Exceptions it raises abort the run at that checkpoint.
+    shards > 1 transforms and embeds the workbook in that many worker processes (shard_ingest.py).
+    """
     if not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR, exist_ok=True)
 
@@ -86,312 +360,229 @@ def ingest():
     journals_jsonl_path = os.path.join(OUTPUT_DIR, "journals.jsonl")
     journals_json_path = os.path.join(OUTPUT_DIR, "journals.json")
     
-    # 1. Load Existing Data from JSONL (Preferred for Resume)
-    existing_names = set()
+    timer = PhaseTimer(progress)
+    metrics.reset()
+    metrics.configure()
+
+    # Which model embeds this run; the cache, the resume index and the vector store are all keyed by it
+    backend = make_backend(backend, embed_client or client, LOCAL_EMBED_DIM, LOCAL_EMBED_WORKERS)
+    print(f"Embedding backend: {backend.name} ({backend.model}, {backend.dim}-d)", flush=True)
+
+    cache = None
+    rebuilt = [] # Store/indexes rebuilt by this run
+    try:
+        # 0. Embedding cache: unchanged content is never embedded twice
+        cache = EmbeddingCache(EMBED_CACHE_FILE, backend.model)
+        # First run with a cache: seed it from the vectors we already paid for
+        seed_cache = len(cache) == 0
+
+        # 1. Load Existing Data from the resume index (journals.jsonl.idx, see journal_store.py)
+        store = JournalStore(journals_jsonl_path, backend.model)
     
-    if os.path.exists(journals_jsonl_path):
-        print(f"Loading existing progress from {journals_jsonl_path}...", flush=True)
-        try:
-            with open(journals_jsonl_path, "r", encoding="utf-8") as f:
-                for line in f:
-                    if line.strip():
-                        try:
-                            # OPTIMIZATION: Only parse the name, don't keep full object in RAM
-                            # We search for "name": "..." manually or use json.loads but drop result immediately
-                            record = json.loads(line)
-                            if 'name' in record:
-                                existing_names.add(record['name'])
-                        except: pass
-            print(f"Loaded {len(existing_names)} existing records (Names only).", flush=True)
-        except Exception as e:
-            print(f"Error reading JSONL: {e}", flush=True)
-
-    # Fallback checking is less critical now, assuming JSONL is primary
-
-
-    # 1.5 Load ASJC Mapping
-    asjc_map = {}
-    asjc_path_file = os.path.join(RESOURCES_DIR, "ASJC1.xlsx")
-    if os.path.exists(asjc_path_file):
+        if os.path.exists(journals_jsonl_path):
+            print(f"Loading existing progress from {journals_jsonl_path}...", flush=True)
+            try:
+                with timer.phase("scan") as info:
+                    store.load()
+                    if seed_cache:
+                        # One-off full pass: the only time the stored vectors themselves are parsed
+                        cache.seed(store.iter_records())
+                    info["rows"] = len(store.entries)
+                print(f"Loaded {len(store.names)} existing records (Names only).", flush=True)
+            except Exception as e:
+                print(f"Error reading JSONL: {e}", flush=True)
+
+        # Fallback checking is less critical now, assuming JSONL is primary
+
+
+        # 1.5 Load ASJC Mapping
+        asjc_path_file = os.path.join(RESOURCES_DIR, "ASJC1.xlsx")
         print("Loading ASJC mapping...", flush=True)
-        df_asjc = pd.read_excel(asjc_path_file)
-        for _, r in df_asjc.iterrows():
-            code = str(r['Code']).strip()
-            desc = str(r['Description']).strip() 
-            asjc_map[code] = desc
-        print("ASJC mapping loaded.", flush=True)
-
-    # 2. Load Excel Data (with CSV Caching)
-    journals_path = os.path.join(RESOURCES_DIR, JOURNALS_FILE)
-    journals_cache_path = os.path.join(RESOURCES_DIR, "journals_cache.csv")
+        asjc_map = load_asjc_map(asjc_path_file)
+        print(f"ASJC mapping loaded ({len(asjc_map)} codes).", flush=True)
+
+        # 2. Load Excel Data (with Parquet Caching, keyed by the workbook's content hash)
+        journals_path = os.path.join(RESOURCES_DIR, JOURNALS_FILE)
     
-    if os.path.exists(journals_path):
-        print(f"Loading Journal Data from {journals_path}...", flush=True)
-        
-        # Try loading from CSV cache first
-        if os.path.exists(journals_cache_path):
-            # Check modification times to ensure cache is fresh
-            if os.path.getmtime(journals_cache_path) > os.path.getmtime(journals_path):
-                print("Found cached CSV. Loading fast...", flush=True)
-                try:
-                    df_journals = pd.read_csv(journals_cache_path)
-                    # Ensure strings
-                    df_journals['All Science Journal Classification Codes (ASJC)'] = df_journals['All Science Journal Classification Codes (ASJC)'].astype(str)
-                except:
-                    print("Cache load failed, falling back to Excel.", flush=True)
-                    df_journals = None
+        if os.path.exists(journals_path):
+            print(f"Loading Journal Data from {journals_path}...", flush=True)
+            # Shard workers build their own client from the environment; --upsert diffs the whole store at once
+            sharded = shards > 1 and not upsert and embed_client is None
+            if shards > 1 and not sharded:
+                print("Sharded ingestion needs the backend from the environment and no --upsert. Running in one process.",
+                      flush=True)
+            if sharded:
+                live_cache_keys = ingest_sharded(journals_path, RESOURCES_DIR, store, cache, backend, asjc_path_file,
+                                                 shards, engine_options(), timer, progress)
             else:
-                print("Cache outdated. Reloading from Excel...", flush=True)
-                df_journals = None
-        else:
-            df_journals = None
+                live_cache_keys = ingest_journals(journals_path, store, cache, backend, asjc_map, upsert, timer, progress)
 
-        # Fallback to Excel if no valid cache
-        if df_journals is None:
-            print("Reading Excel file (Streaming Mode - Low Memory)...", flush=True)
-            
-            # Use openpyxl in read-only mode to avoid loading everything into RAM
-            wb = load_workbook(journals_path, read_only=True, data_only=True)
-            ws = wb.active
-            
-            # Identify columns
-            headers = {}
-            target_cols = {
-                'Source Title': 'Source_Title',
-                'scope': 'scope',
-                'All Science Journal Classification Codes (ASJC)': 'All_Science_Journal_Classification_Codes_ASJC', 
-                'Publisher': 'Publisher',
-                'Sourcerecord ID': 'Sourcerecord_ID',
-                'Active or Inactive': 'Active_or_Inactive',
-                'Coverage': 'Coverage'
-            }
-            
-            rows = ws.iter_rows(values_only=True)
-            header_row = next(rows)
-            
-            for idx, col_name in enumerate(header_row):
-                if col_name in target_cols:
-                    headers[idx] = target_cols[col_name]
-            
-            data_buffer = []
-            count = 0
-            print("Found columns, starting stream...", flush=True)
-
-            class RowObject:
-                pass
-
-            # Generator to yield objects similar to itertuples
-            def row_generator():
-                nonlocal count
-                for row_data in rows:
-                    count += 1
-                    if count % 5000 == 0:
-                        print(f"Read {count} rows...", flush=True)
-                        
-                    obj = RowObject()
-                    has_data = False
-                    for col_idx, field_name in headers.items():
-                        val = row_data[col_idx]
-                        setattr(obj, field_name, val)
-                        if field_name == 'Source_Title' and val:
-                            has_data = True
-                    
-                    if has_data:
-                        yield obj
-            
-            # For the first run, we stream directly into the processor
-            # AND build the CSV cache simultaneously to avoid double reading
-            print("Processing and building cache simultaneously...", flush=True)
-            
-            cache_data = [] # We still need to collect for CSV dump, but at least we process as we go? 
-            # Actually, to save to CSV we need the full list or append mode. 
-            # Let's just collect dicts for DataFrame at the end for caching, 
-            # BUT yield to the main loop to show progress?
-            # Complexity: Providing a generator to the next step matches the 'itertuples' interface.
-            
-            # Let's use a list for simplicity but fill it progressively? 
-            # No, if memory is the issue, we should NOT build a huge list.
-            # But we need to save the cache.
-            # Compromise: Read all into a list of dicts (dict is heavier than tuple?)
-            # Valid optimization: Just read what we need.
-            
-            iterator_source = row_generator()
-            
-        else:
-            # If we loaded from CSV (df_journals is set), create an iterator from it
-            print(f"Total rows to process: {len(df_journals)}", flush=True)
-            iterator_source = df_journals.itertuples(index=False)
-
-        # Use the unified iterator
-        pending_records = []
-        for row in iterator_source:
-            # If coming from openpyxl, row is RowObject. If from pandas, it's namedtuple.
-            # The attribute access logic below works for both!
-            
-            title = getattr(row, "Source_Title", "")
-            # Basic cleanup if it's not a string (openpyxl might return None)
-            if title is None: continue
+            # Cache report + size-bounded eviction of entries no current record uses
+            removed = cache.evict(live_cache_keys, EMBED_CACHE_MAX_ENTRIES)
+            stats = cache.stats()
+            print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+                  f"({stats['hit_rate']:.1%} hit rate), {stats['puts']} stored, {removed} evicted, "
+                  f"{stats['entries']} entries.", flush=True)
+            metrics.count("cache.hits", stats["hits"])
+            metrics.count("cache.misses", stats["misses"])
 
-            
-            # If we already have it fully processed (with embedding), skip expensive logic
-            if title in existing_names:
-                # We do NOT append to final_list to save memory
-                continue
-
-            # ... Otherwise, prepare for processing ...
-            # Access attributes safely. Column names are sanitized by Pandas:
-            # 'scope' -> scope
-            # 'All Science Journal Classification Codes (ASJC)' -> All_Science_Journal_Classification_Codes_ASJC
-            # 'Publisher' -> Publisher
-            # 'Sourcerecord ID' -> Sourcerecord_ID
-            # 'Active or Inactive' -> Active_or_Inactive
-            # 'Coverage' -> Coverage
-            
-            scope = str(getattr(row, "scope", ""))
-            if scope == "nan": scope = ""
-            
-            # ASJC Optimization
-            raw_asjc = str(getattr(row, "All_Science_Journal_Classification_Codes_ASJC", ""))
-            if raw_asjc == "nan": raw_asjc = ""
-            
-            asjc_final = ""
-            if raw_asjc:
-                # Optimized single-pass
-                parts = raw_asjc.replace(',', ';').split(';')
-                # Generator expression for speed
-                decoded_parts = (asjc_map.get(p.strip(), p.strip()) for p in parts if p.strip())
-                asjc_final = "; ".join(decoded_parts)
-            
-            publisher = str(getattr(row, "Publisher", "Unknown Publisher"))
-            if publisher == "nan": publisher = "Unknown Publisher"
-            
-            source_id = str(getattr(row, "Sourcerecord_ID", ""))
-            if source_id == "nan": source_id = ""
-            
-            active_status = str(getattr(row, "Active_or_Inactive", "Unknown"))
-            if active_status == "nan": active_status = "Unknown"
-            
-            years = str(getattr(row, "Coverage", ""))
-            if years == "nan": years = ""
-            
-            coverage = f"{active_status} ({years})" if years else active_status
-            link = f"https://www.scopus.com/sourceid/{source_id}" if source_id else ""
+            # Memory Optimization: Skip syncing full JSON to avoid OOM
+            # Users should use journals.jsonl
+            # try:
+            #     print("Syncing journals.json (Backup)...")
+            #     with open(journals_json_path, "w", encoding="utf-8") as f:
+            #         json.dump(final_list, f)
+            #     print("Sync Complete.")
+            # except Exception as e:
+            #     print(f"Warning: Could not save full legacy JSON: {e}")
 
-            if len(scope) > 4000:
-                scope = scope[:4000] + "..."
-            
-            content = f"{title}. {scope}. matches ASJC codes: {asjc_final}".strip()
-            
-            # Reuse ID if possible
-            # Since we entered this block, it means we don't have it in our "existing_names" set
-            # So we treat it as a new record.
-            rec_id = str(uuid.uuid4())
-
-            record = {
-                "id": rec_id,
-                "name": title,
-                "scope": scope,
-                "content": content,
-                "publisher": publisher,
-                "link": link,
-                "coverage": coverage,
-                "asjc": asjc_final
-            }
-            
-            pending_records.append(record)
+            # Binary store for fast loading (journals.vectors.bin + journals.meta.jsonl + manifest).
+            # Skipped when journals.jsonl is unchanged since the last build (same dtype and model), and so is
+            # every index below that is still current: a run that adds nothing parses nothing.
+            manifest = load_manifest(OUTPUT_DIR)
+            store_current = (manifest is not None and is_fresh(OUTPUT_DIR, journals_jsonl_path)
+                             and manifest.get("dtype") == VECTOR_DTYPE
+                             and manifest.get("embedding") == backend.describe())
+            if store_current:
+                print("[vectors] journals.jsonl unchanged, vector store is current. Skipped.", flush=True)
+            elif os.path.exists(journals_jsonl_path):
+                rebuilt.append("vectors")
+                try:
+                    with timer.phase("vectors") as info:
+                        info["rows"] = build_from_jsonl(journals_jsonl_path, OUTPUT_DIR, dtype=VECTOR_DTYPE,
+                                                        embedding=backend.describe())["rows"]
+                except Exception as e:
+                    print(f"Warning: Could not build binary vector store: {e}", flush=True)
 
-        print(f"Pending processing: {len(pending_records)}", flush=True)
-        print(f"Pending processing: {len(pending_records)}")
-        
-        # 3. Process Pending in Batches & SAVE INCREMENTALLY
-        # Smaller batch size for better resume capability
-        RESUME_BATCH_SIZE = 100 
-        
-        if os.getenv("OPENAI_API_KEY") and pending_records:
-            total_pending = len(pending_records)
-            for i in range(0, total_pending, RESUME_BATCH_SIZE):
-                batch = pending_records[i : i + RESUME_BATCH_SIZE]
-                
-                # Prepare text map for embedding function
-                to_embed_map = [{"index": idx, "text": item["content"]} for idx, item in enumerate(batch)]
-                
+            # Optional quantized copy of the vectors (smaller resident matrix, full-precision rerank)
+            quant = index_info(OUTPUT_DIR, QUANT_FILE) if VECTOR_QUANT else None
+            if quant and quant.get("kind") == VECTOR_QUANT:
+                print("[quantize] quantized vectors are current. Skipped.", flush=True)
+            elif VECTOR_QUANT:
+                rebuilt.append("quantize")
+                try:
+                    with timer.phase("quantize") as info:
+                        built = build_quantized(OUTPUT_DIR, VECTOR_QUANT)
+                        info["rows"] = built["rows"] if built else 0
+                except Exception as e:
+                    print(f"Warning: Could not build quantized vectors: {e}", flush=True)
+
+            # BM25 inverted index over `content` (lexical search when there is no query embedding)
+            if index_info(OUTPUT_DIR, LEXICAL_FILE):
+                print("[lexical] lexical index is current. Skipped.", flush=True)
+            elif os.path.exists(journals_jsonl_path):
+                rebuilt.append("lexical")
+                try:
+                    with timer.phase("lexical") as info:
+                        built = build_lexical_index(OUTPUT_DIR)
+                        info["rows"] = built["rows"] if built else 0
+                except Exception as e:
+                    print(f"Warning: Could not build lexical index: {e}", flush=True)
+
+            # Optional ANN index over the fresh store (exact search stays the default without it)
+            if ann and index_info(OUTPUT_DIR, ANN_FILE):
+                print("[ann] ANN index is current. Skipped.", flush=True)
+            elif ann:
+                rebuilt.append("ann")
                 try:
-                    # Call OpenAI
-                    print(f"Embedding batch {i} to {i+len(batch)} of {total_pending}...")
-                    embeddings = get_embeddings_batched_safe(to_embed_map, EMBEDDING_MODEL)
-                    
-                    # Assign embeddings
-                    valid_batch = []
-                    for idx, emb in embeddings.items():
-                        batch[idx]["embedding"] = emb
-                        valid_batch.append(batch[idx])
-                    
-                    # APPEND TO JSONL IMMEDIATELY (Checkpoint)
-                    if valid_batch:
-                        with open(journals_jsonl_path, "a", encoding="utf-8") as f:
-                            for item in valid_batch:
-                                f.write(json.dumps(item) + "\n")
-                        print(f"Saved {len(valid_batch)} new records to {journals_jsonl_path} (Append-only)")
-                        
-                        # RAM OPTIMIZATION: Do not keep valid_batch in memory
-                        # final_list.extend(valid_batch) 
-                        
+                    with timer.phase("ann") as info:
+                        built = build_index(OUTPUT_DIR, ANN_NLIST, ANN_NPROBE)
+                        info["rows"] = built["rows"] if built else 0
                 except Exception as e:
-                    print(f"CRITICAL ERROR in batch {i}: {e}", flush=True)
-                    print("Waiting 10s before retry loop continues...", flush=True)
-                    time.sleep(10)
+                    print(f"Warning: Could not build ANN index: {e}", flush=True)
+
+            timer.report()
+
         else:
-            # No API key or no pending -> Just dump text data if needed
-            if pending_records:
-                print("No API Key or Dry Run: Saving pending records without embeddings.", flush=True)
-                with open(journals_jsonl_path, "a", encoding="utf-8") as f:
-                    for item in pending_records:
-                        f.write(json.dumps(item) + "\n")
-
-        # Memory Optimization: Skip syncing full JSON to avoid OOM
-        # Users should use journals.jsonl
-        # try:
-        #     print("Syncing journals.json (Backup)...")
-        #     with open(journals_json_path, "w", encoding="utf-8") as f:
-        #         json.dump(final_list, f)
-        #     print("Sync Complete.")
-        # except Exception as e:
-        #     print(f"Warning: Could not save full legacy JSON: {e}")
+            print(f"File not found: {journals_path}")
 
-    else:
-        print(f"File not found: {journals_path}")
-
-    # --- PROCESS SDGs (Fast) ---
-    # (Simpler logic here as it is small)
-    print("Processing SDGs...")
-    sdgs_path = os.path.join(RESOURCES_DIR, SDGS_FILE)
-    if os.path.exists(sdgs_path):
-        df_sdg = pd.read_excel(sdgs_path)
-        sdg_data = []
-        sdg_texts = []
+        # --- PROCESS SDGs (Fast) ---
+        # (Simpler logic here as it is small)
+        print("Processing SDGs...")
+        if progress:
+            progress("sdgs", 0)
+        sdgs_path = os.path.join(RESOURCES_DIR, SDGS_FILE)
+        if os.path.exists(sdgs_path):
+            df_sdg = pd.read_excel(sdgs_path)
+            sdg_data = []
+            sdg_texts = []
         
-        for _, row in df_sdg.iterrows():
-            sdg_id = row['SDG']
-            query = str(row['Query']) if pd.notna(row['Query']) else ""
-            keywords = [k.strip().lower() for k in query.split(';') if k.strip()]
-            name = SDG_NAMES.get(int(sdg_id), f"SDG {sdg_id}")
+            for _, row in df_sdg.iterrows():
+                sdg_id = row['SDG']
+                query = str(row['Query']) if pd.notna(row['Query']) else ""
+                keywords = [k.strip().lower() for k in query.split(';') if k.strip()]
+                name = SDG_NAMES.get(int(sdg_id), f"SDG {sdg_id}")
             
-            text_for_embedding = f"{name}: {query}".strip()
-            sdg_texts.append(text_for_embedding)
-
-            sdg_data.append({
-                "id": sdg_id,
-                "name": name,
-                "keywords": keywords
-            })
+                text_for_embedding = f"{name}: {query}".strip()
+                sdg_texts.append(text_for_embedding)
+
+                sdg_data.append({
+                    "id": sdg_id,
+                    "name": name,
+                    "keywords": keywords
+                })
         
-        if os.getenv("OPENAI_API_KEY"):
-            embeddings = get_embeddings_batched_safe([{'index': i, 'text': t} for i,t in enumerate(sdg_texts)], EMBEDDING_MODEL)
-            for i, emb in embeddings.items():
-                sdg_data[i]["embedding"] = emb
+            if backend.available:
+                embeddings = get_embeddings_batched_safe([{'index': i, 'text': t} for i,t in enumerate(sdg_texts)], backend,
+                                                         progress, "sdgs")
+                for i, emb in embeddings.items():
+                    attach_embedding(sdg_data[i], emb, backend.model)
         
-        with open(os.path.join(OUTPUT_DIR, "sdgs.json"), "w", encoding="utf-8") as f:
-            json.dump(sdg_data, f)
+            # Only rewritten when it differs: a new sdgs.json means a new generation for the server
+            if write_if_changed(os.path.join(OUTPUT_DIR, "sdgs.json"), json.dumps(sdg_data)):
+                rebuilt.append("sdgs")
+
+            # Keyword automaton for single-pass SDG keyword detection (sdg_matcher.json)
+            with metrics.span("sdg.matcher", sdgs=len(sdg_data)):
+                write_matcher(sdg_data, OUTPUT_DIR)
+
+            # SDG affinity + ASJC facets per journal (needs both the store and the SDG embeddings)
+            if facets_current(OUTPUT_DIR):
+                print("[facets] facet index is current. Skipped.", flush=True)
+            else:
+                rebuilt.append("facets")
+                try:
+                    with timer.phase("facets") as info:
+                        built = build_facets(OUTPUT_DIR, asjc_map)
+                        info["rows"] = built["rows"] if built else 0
+                except Exception as e:
+                    print(f"Warning: Could not build facet index: {e}", flush=True)
+
+        # Last: the running web server picks up the new generation (store, indexes, SDGs) from here
+        # The store itself is compared by content hash: a rebuild of identical rows publishes nothing
+        published = write_generation(OUTPUT_DIR, changed=any(name != "vectors" for name in rebuilt))
+        if published:
+            print(f"Published data generation {published['generation']} ({published['rows']} rows).", flush=True)
+        else:
+            print("Store, indexes and SDGs unchanged. No new data generation.", flush=True)
+
+        return timer.phases
+    finally:
+        # Also on failure or cancellation: the queue worker (ingest_jobs.py) outlives this run
+        if cache is not None:
+            cache.close()
+        backend.close()
+        metrics.report()
 
 if __name__ == "__main__":
-    ingest()
+    parser = argparse.ArgumentParser(description="Ingest journal and SDG workbooks into web/data")
+    parser.add_argument("--upsert", action="store_true",
+                        help="Diff the workbook against journals.jsonl (added/changed/removed) and write a compacted store")
+    parser.add_argument("--ann", action="store_true", default=ANN_INDEX,
+                        help="Build the IVF approximate nearest-neighbour index after the vector store")
+    parser.add_argument("--backend", choices=BACKENDS, default=EMBED_BACKEND,
+                        help="Embedding backend: the OpenAI API, or the CPU-only local model (no key needed)")
+    parser.add_argument("--shards", type=int, default=INGEST_SHARDS,
+                        help="Transform and embed the workbook in this many worker processes (resumable per shard)")
+    parser.add_argument("--trace", default=os.getenv("INGEST_TRACE", ""),
+                        help="Append a JSON-lines trace (stage spans, memory samples, summary) to this file")
+    parser.add_argument("--profile", default=os.getenv("INGEST_PROFILE", ""),
+                        help="cProfile the whole run and dump pstats to this file")
+    args = parser.parse_args()
+    metrics.configure(args.trace)
+    # Same single-writer lock as queued jobs (ingest_jobs.py): never two ingests over one store
+    lock = writer_lock(OUTPUT_DIR, on_wait=lambda: print("Another ingest is running; waiting for it to finish...",
+                                                         flush=True))
+    with lock, profiled(args.profile):
+        ingest(upsert=args.upsert, ann=args.ann, backend=args.backend, shards=args.shards)
+    metrics.close()
@@ -0,0 +1,326 @@
+import argparse
+import contextlib
+import fcntl
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+import traceback
+import uuid
+
+# Managed ingestion jobs
+# Uploads become queued jobs in a local SQLite file instead of fire-and-forget ingest runs:
+#   - one worker at a time holds the single-writer lock (ingest.lock next to journals.jsonl) and
+#     drains the queue oldest first, so concurrent uploads wait their turn instead of appending to
+#     the same store together. ingest_data.py run by hand takes the same lock.
+#   - ingest() reports progress events (phase, rows done/total, API calls); they are stored per job
+#     with an ETA, and ingest_status.json is rewritten with a snapshot the admin UI polls cheaply
+#   - cancel sets a flag the running job checks at every progress event; the job stops at the next
+#     checkpoint (everything already written stays, the next run resumes from it)
+#
+# Usage:
+#   python scripts/ingest_jobs.py submit [--workbook upload.xlsx] [--upsert] [--backend local] [--shards 8]
+#   python scripts/ingest_jobs.py worker
+#   python scripts/ingest_jobs.py {status,cancel} [--id JOB]
+# All commands take --status-dir (default web/data): where the job database, logs and snapshot live.
+
+STATUS_DIR = "web/data"
+JOBS_FILE = "ingest_jobs.sqlite"
+STATUS_FILE = "ingest_status.json"
+LOGS_DIR = "ingest_logs"
+LOCK_FILE = "ingest.lock"
+EVENT_INTERVAL = 0.5 # Seconds between stored events within a phase (phase changes always go through)
+RECENT_JOBS = 10
+
+
+class IngestCancelled(BaseException):
+    """Raised from the progress callback; BaseException so ingest's `except Exception` blocks let it through."""
+
+
+@contextlib.contextmanager
+def writer_lock(data_dir, blocking=True, on_wait=None):
+    """
+    flock on <data_dir>/ingest.lock; yields False (without waiting) if blocking=False and it is held.
+    Blocking, on_wait() is called once before waiting for another process to release it.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, LOCK_FILE), "a+") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            if not blocking:
+                yield False
+                return
+            if on_wait:
+                on_wait()
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            f.truncate()
+            f.write(f"{os.getpid()}\n")
+            f.flush()
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class JobStore:
+    def __init__(self, status_dir=STATUS_DIR):
+        self.status_dir = status_dir
+        os.makedirs(status_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(status_dir, JOBS_FILE), timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL," # queued, running, succeeded, failed, cancelled
+            " options TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " started REAL,"
+            " finished REAL,"
+            " cancel_requested INTEGER NOT NULL DEFAULT 0,"
+            " phase TEXT,"
+            " rows_done INTEGER,"
+            " rows_total INTEGER,"
+            " api_calls INTEGER,"
+            " eta_seconds REAL,"
+            " error TEXT,"
+            " log_file TEXT)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " job_id TEXT NOT NULL,"
+            " ts REAL NOT NULL,"
+            " phase TEXT NOT NULL,"
+            " rows_done INTEGER,"
+            " rows_total INTEGER,"
+            " api_calls INTEGER,"
+            " eta_seconds REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_events_job ON events(job_id, ts)")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def submit(self, **options):
+        job_id = uuid.uuid4().hex[:12]
+        self.conn.execute("INSERT INTO jobs (id, status, options, created) VALUES (?, 'queued', ?, ?)",
+                          (job_id, json.dumps(options), time.time()))
+        self.conn.commit()
+        self.write_status()
+        return job_id
+
+    def get(self, job_id):
+        row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_dict(row) if row else None
+
+    def has_queued(self):
+        return self.conn.execute("SELECT 1 FROM jobs WHERE status = 'queued' LIMIT 1").fetchone() is not None
+
+    def claim_next(self):
+        """Oldest queued job, marked running. Only called under the writer lock, so no two claims race."""
+        row = self.conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1").fetchone()
+        if row is None:
+            return None
+        self.conn.execute("UPDATE jobs SET status = 'running', started = ? WHERE id = ?", (time.time(), row["id"]))
+        self.conn.commit()
+        self.write_status()
+        return self.get(row["id"])
+
+    def record(self, job_id, phase, rows_done, rows_total, api_calls, eta_seconds):
+        now = time.time()
+        self.conn.execute("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?)",
+                          (job_id, now, phase, rows_done, rows_total, api_calls, eta_seconds))
+        self.conn.execute(
+            "UPDATE jobs SET phase = ?, rows_done = ?, rows_total = ?, api_calls = COALESCE(?, api_calls),"
+            " eta_seconds = ? WHERE id = ?",
+            (phase, rows_done, rows_total, api_calls, eta_seconds, job_id))
+        self.conn.commit()
+        self.write_status()
+
+    def cancel_requested(self, job_id):
+        row = self.conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def cancel(self, job_id):
+        """Queued jobs are cancelled at once; a running job is flagged and stops at its next checkpoint."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job["status"] == "queued":
+            self.conn.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ?", (time.time(), job_id))
+        elif job["status"] == "running":
+            self.conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+        self.conn.commit()
+        self.write_status()
+        return self.get(job_id)
+
+    def finish(self, job_id, status, error=None):
+        self.conn.execute("UPDATE jobs SET status = ?, finished = ?, error = ?, eta_seconds = NULL WHERE id = ?",
+                          (status, time.time(), error, job_id))
+        self.conn.commit()
+        self.write_status()
+
+    def set_log(self, job_id, log_file):
+        self.conn.execute("UPDATE jobs SET log_file = ? WHERE id = ?", (log_file, job_id))
+        self.conn.commit()
+
+    def jobs(self, limit=RECENT_JOBS):
+        rows = self.conn.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+        return [_job_dict(r) for r in rows]
+
+    def snapshot(self):
+        running = self.conn.execute("SELECT * FROM jobs WHERE status = 'running' LIMIT 1").fetchone()
+        queued = self.conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created").fetchall()
+        return {
+            "updated": time.time(),
+            "running": _job_dict(running) if running else None,
+            "queued": [_job_dict(r) for r in queued],
+            "recent": self.jobs(),
+        }
+
+    def write_status(self):
+        # Atomic replace: the UI never reads a half-written snapshot
+        path = os.path.join(self.status_dir, STATUS_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+
+def _job_dict(row):
+    job = dict(row)
+    job["options"] = json.loads(job["options"])
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+
+class JobProgress:
+    """Progress callback for ingest(): stores throttled events with an ETA and raises IngestCancelled on request."""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self.phase = None
+        self.phase_start = 0.0
+        self.last_write = 0.0
+        self.api_calls = {} # Each embedding phase counts its own calls; the job reports their sum
+
+    def __call__(self, phase, done, total=None, api_calls=None):
+        now = time.time()
+        if api_calls is not None:
+            self.api_calls[phase] = api_calls
+        changed = phase != self.phase
+        if changed:
+            self.phase, self.phase_start = phase, now
+        finished = total is not None and done >= total
+        if not (changed or finished or now - self.last_write >= EVENT_INTERVAL):
+            return
+        self.last_write = now
+        eta = None
+        if total and 0 < done < total:
+            eta = (now - self.phase_start) / done * (total - done)
+        self.store.record(self.job_id, phase, done, total, sum(self.api_calls.values()), eta)
+        if self.store.cancel_requested(self.job_id):
+            raise IngestCancelled()
+
+
+def run_job(store, job):
+    import ingest_data
+
+    options = job["options"]
+    log_dir = os.path.join(store.status_dir, LOGS_DIR)
+    os.makedirs(log_dir, exist_ok=True)
+    log_file = os.path.join(log_dir, f"{job['id']}.log")
+    store.set_log(job["id"], log_file)
+    workbook = options.get("workbook")
+    print(f"Job {job['id']}: started ({json.dumps(options)}), log: {log_file}", flush=True)
+    with open(log_file, "a", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        try:
+            if workbook:
+                # The upload only replaces the live workbook once it is this job's turn
+                target = os.path.join(ingest_data.RESOURCES_DIR, ingest_data.JOURNALS_FILE)
+                shutil.copyfile(workbook, target + ".tmp")
+                os.replace(target + ".tmp", target)
+            ingest_data.ingest(upsert=options.get("upsert", False),
+                               backend=options.get("backend") or ingest_data.EMBED_BACKEND,
+                               shards=options.get("shards") or ingest_data.INGEST_SHARDS,
+                               progress=JobProgress(store, job["id"]))
+            status, error = "succeeded", None
+        except IngestCancelled:
+            print("Cancelled.", flush=True)
+            status, error = "cancelled", None
+        except Exception as e:
+            traceback.print_exc(file=log)
+            status, error = "failed", str(e)
+    if workbook and os.path.exists(workbook):
+        os.remove(workbook)
+    store.finish(job["id"], status, error)
+    print(f"Job {job['id']}: {status}" + (f" ({error})" if error else ""), flush=True)
+    return status
+
+
+def run_worker(store):
+    """Drains the queue under the writer lock; returns at once if another worker holds it."""
+    import ingest_data
+
+    while True:
+        with writer_lock(ingest_data.OUTPUT_DIR, blocking=False) as held:
+            if not held:
+                print("Another ingest holds the writer lock; it will pick up queued jobs.", flush=True)
+                return
+            while True:
+                job = store.claim_next()
+                if job is None:
+                    break
+                run_job(store, job)
+        # A job submitted while we were releasing the lock may have found it held: check once more
+        if not store.has_queued():
+            return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queued, single-writer ingestion jobs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    submit = sub.add_parser("submit", help="Queue an ingest job; prints its id as JSON")
+    submit.add_argument("--workbook", help="Uploaded outlet workbook to ingest (moved into place when the job starts)")
+    submit.add_argument("--upsert", action="store_true")
+    submit.add_argument("--backend", choices=["openai", "local"])
+    submit.add_argument("--shards", type=int, help="Worker processes for the journal stage (see shard_ingest.py)")
+    submit.add_argument("--run", action="store_true", help="Also run a worker in this process")
+    sub.add_parser("worker", help="Run queued jobs until the queue is empty")
+    status = sub.add_parser("status", help="Print the status snapshot (or one job) as JSON")
+    status.add_argument("--id")
+    cancel = sub.add_parser("cancel", help="Cancel a queued or running job")
+    cancel.add_argument("--id", required=True)
+    for p in (submit, sub.choices["worker"], status, cancel):
+        p.add_argument("--status-dir", default=os.getenv("INGEST_STATUS_DIR", STATUS_DIR))
+    args = parser.parse_args()
+
+    store = JobStore(args.status_dir)
+    try:
+        if args.command == "submit":
+            workbook = os.path.abspath(args.workbook) if args.workbook else None
+            job_id = store.submit(workbook=workbook, upsert=args.upsert, backend=args.backend,
+                                  shards=args.shards)
+            print(json.dumps({"id": job_id}), flush=True)
+            if args.run:
+                run_worker(store)
+        elif args.command == "worker":
+            run_worker(store)
+        elif args.command == "status":
+            print(json.dumps(store.get(args.id) if args.id else store.snapshot(), indent=2))
+        else:
+            job = store.cancel(args.id)
+            if job is None:
+                sys.exit(f"No job {args.id}")
+            print(json.dumps(job))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
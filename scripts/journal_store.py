@@ -0,0 +1,335 @@
+import argparse
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+
+from embedding_cache import cache_key
+from vector_store import load_manifest
+
+# Resume index for journals.jsonl
+# journals.jsonl.idx is a sidecar with one compact line per record:
+#   [offset, length, key, id, name, content_key, has_embedding]
+# after a header line { version, model, inode }. It loads in a fraction of the time a full
+# json.loads pass over the store takes (no embedding floats are parsed), and gives random
+# access to any record by id or key with a single seek.
+# The append writers keep it in sync (record first, then its index line). On load the index
+# is checked against the store (inode, covered length, last record's id); records appended
+# after the last index line are picked up with a tail scan, anything else triggers a rebuild.
+# Rebuilds use a key-only scan that stops parsing each line at its "embedding" key.
+#
+# Usage: python scripts/journal_store.py {stats,rebuild,get} [--id ID] [--path web/data/journals.jsonl]
+
+JOURNALS_FILE = "web/data/journals.jsonl"
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+EMBEDDING_MARKER = b', "embedding": '
+VECTOR_TAIL = re.compile(rb"(?:null|\[[-+.0-9eE, ]*\])\}") # What follows the marker on a well-formed line
+
+
+def record_key(record):
+    """Upsert identity of a journal: its Scopus source id, or its title when there is no link."""
+    link = record.get("link") or ""
+    if link:
+        return "scopus:" + link.rstrip("/").rsplit("/", 1)[-1]
+    return f"title:{record.get('name')}"
+
+
+def parse_keys(raw):
+    """
+    Parses a journals.jsonl line without its embedding.
+    Returns (record without "embedding", has_embedding); raises ValueError on a broken line.
+    """
+    line = raw.rstrip()
+    cut = line.rfind(EMBEDDING_MARKER)
+    # json.dumps writes the embedding last, so everything before it is the rest of the record -
+    # unless the marker is inside a string value: then the tail is not just a vector and "}"
+    if cut != -1 and VECTOR_TAIL.fullmatch(line, cut + len(EMBEDDING_MARKER)):
+        record = json.loads(line[:cut] + b"}")
+        return record, line[cut + len(EMBEDDING_MARKER)] == ord("[") and not line.endswith(b"[]}")
+    record = json.loads(line)
+    return record, bool(record.pop("embedding", None))
+
+
+def stored_model(jsonl_path):
+    """
+    Embedding model of an existing store: from the vector store manifest next to it, else from the
+    index header. None when neither exists.
+    """
+    manifest = load_manifest(os.path.dirname(jsonl_path) or ".")
+    if manifest and manifest.get("embedding", {}).get("model"):
+        return manifest["embedding"]["model"]
+    try:
+        with open(jsonl_path + INDEX_SUFFIX, "r", encoding="utf-8") as f:
+            return json.loads(f.readline() or "{}").get("model") or None
+    except (OSError, ValueError):
+        return None
+
+
+class JournalStore:
+    def __init__(self, jsonl_path=JOURNALS_FILE, model=""):
+        self.path = jsonl_path
+        self.index_path = jsonl_path + INDEX_SUFFIX
+        self.model = model
+        self.entries = {} # record_key -> { offset, length, id, name, content_key, has_embedding }
+        self.by_id = {}
+        self.names = set()
+        self.covered = 0 # Bytes of the store described by the index
+
+    def _add(self, key, entry):
+        self.entries[key] = entry
+        if entry["id"]:
+            self.by_id[entry["id"]] = key
+        if entry["name"] is not None:
+            self.names.add(entry["name"])
+        self.covered = max(self.covered, entry["offset"] + entry["length"])
+
+    def _entry(self, record, has_embedding, offset, length):
+        return {
+            "offset": offset,
+            "length": length,
+            "id": record.get("id"),
+            "name": record.get("name"),
+            "content_key": cache_key(self.model, record.get("content", "")),
+            "has_embedding": has_embedding,
+        }
+
+    @staticmethod
+    def _line(key, e):
+        return json.dumps([e["offset"], e["length"], key, e["id"], e["name"], e["content_key"], e["has_embedding"]]) + "\n"
+
+    def _header(self, inode):
+        return json.dumps({"version": INDEX_VERSION, "model": self.model, "inode": inode}) + "\n"
+
+    def _reset(self):
+        self.entries, self.by_id, self.names, self.covered = {}, {}, set(), 0
+
+    # --- loading ---
+
+    def load(self):
+        """Loads the index (rebuilding or catching up as needed). Returns self."""
+        self._reset()
+        if not os.path.exists(self.path):
+            return self
+        start = time.time()
+        if not self._read_index():
+            print(f"Resume index missing or out of date, rebuilding {os.path.basename(self.index_path)}...", flush=True)
+            self.rebuild()
+            print(f"Resume index rebuilt: {len(self.entries)} records in {time.time() - start:.1f}s", flush=True)
+            return self
+        size = os.path.getsize(self.path)
+        if self.covered < size:
+            added = self._catch_up()
+            print(f"Resume index: {added} records appended since the last index update.", flush=True)
+        print(f"Resume index loaded: {len(self.entries)} records in {time.time() - start:.2f}s", flush=True)
+        return self
+
+    def _read_index(self):
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline() or "{}")
+                if (header.get("version") != INDEX_VERSION or header.get("model") != self.model
+                        or header.get("inode") != os.stat(self.path).st_ino):
+                    return False
+                last = None
+                for line in f:
+                    if not line.endswith("\n"):
+                        raise ValueError("torn index line")
+                    offset, length, key, rid, name, content_key, has_embedding = json.loads(line)
+                    last = {"offset": offset, "length": length, "id": rid, "name": name,
+                            "content_key": content_key, "has_embedding": has_embedding}
+                    self._add(key, last)
+        except (ValueError, OSError):
+            self._reset()
+            return False
+        if self.covered > os.path.getsize(self.path):
+            self._reset()
+            return False
+        # Spot check: the last indexed record is where the index says it is
+        if last is not None:
+            with open(self.path, "rb") as f:
+                f.seek(last["offset"])
+                raw = f.read(last["length"])
+            try:
+                if not raw.endswith(b"\n") or parse_keys(raw)[0].get("id") != last["id"]:
+                    raise ValueError
+            except ValueError:
+                self._reset()
+                return False
+        return True
+
+    def _scan(self, start_offset=0):
+        """Key-only scan: yields (key, entry) for every parseable line from start_offset."""
+        with open(self.path, "rb") as f:
+            f.seek(start_offset)
+            offset = start_offset
+            for raw in f:
+                line_offset = offset
+                offset += len(raw)
+                if not raw.endswith(b"\n") or not raw.strip():
+                    continue # Blank, or a torn last line from an interrupted append
+                try:
+                    record, has_embedding = parse_keys(raw)
+                except ValueError:
+                    continue
+                yield record_key(record), self._entry(record, has_embedding, line_offset, len(raw))
+
+    def _catch_up(self):
+        added = 0
+        with open(self.index_path, "a", encoding="utf-8") as idx:
+            for key, entry in self._scan(self.covered):
+                self._add(key, entry)
+                idx.write(self._line(key, entry))
+                added += 1
+        return added
+
+    def rebuild(self):
+        self._reset()
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as idx:
+            idx.write(self._header(os.stat(self.path).st_ino))
+            for key, entry in self._scan(0):
+                self._add(key, entry)
+                idx.write(self._line(key, entry))
+        os.replace(tmp_path, self.index_path)
+
+    # --- writing ---
+
+    def append_records(self, records):
+        """Appends records to journals.jsonl and their lines to the index (record first)."""
+        if not records:
+            return 0
+        with open(self.path, "ab") as out:
+            out.seek(0, os.SEEK_END)
+            offset = out.tell()
+            pending = []
+            for record in records:
+                raw = (json.dumps(record) + "\n").encode("utf-8")
+                out.write(raw)
+                pending.append((record, offset, len(raw)))
+                offset += len(raw)
+        if not os.path.exists(self.index_path):
+            # No index yet (new store, or deleted): index the whole file, including these records
+            self.rebuild()
+            return len(records)
+        with open(self.index_path, "a", encoding="utf-8") as idx:
+            for record, offset, length in pending:
+                key = record_key(record)
+                entry = self._entry(record, bool(record.get("embedding")), offset, length)
+                self._add(key, entry)
+                idx.write(self._line(key, entry))
+        return len(records)
+
+    @contextmanager
+    def rewrite(self):
+        """
+        Writes a new generation of the store: yields a writer with .write(record); on success the
+        new journals.jsonl and its index replace the old ones (store first, then index).
+        """
+        writer = _StoreRewriter(self)
+        try:
+            yield writer
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+
+    # --- random access ---
+
+    def read_at(self, offset, f=None):
+        if f is not None:
+            f.seek(offset)
+            return json.loads(f.readline())
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def get(self, record_id, f=None):
+        """Full record (with embedding) by id, or None."""
+        key = self.by_id.get(record_id)
+        return self.read_at(self.entries[key]["offset"], f) if key else None
+
+    def get_key(self, key, f=None):
+        entry = self.entries.get(key)
+        return self.read_at(entry["offset"], f) if entry else None
+
+    def iter_records(self):
+        """Every full record in file order (one json.loads per line)."""
+        with open(self.path, "rb") as f:
+            for raw in f:
+                if not raw.strip():
+                    continue
+                try:
+                    yield json.loads(raw)
+                except ValueError:
+                    continue
+
+
+class _StoreRewriter:
+    def __init__(self, store):
+        self.store = store
+        self.tmp_path = store.path + ".tmp"
+        self.out = open(self.tmp_path, "wb")
+        self.offset = 0
+        self.lines = []
+        self.rows = 0
+
+    def write(self, record):
+        raw = (json.dumps(record) + "\n").encode("utf-8")
+        self.out.write(raw)
+        key = record_key(record)
+        entry = self.store._entry(record, bool(record.get("embedding")), self.offset, len(raw))
+        self.lines.append((key, entry))
+        self.offset += len(raw)
+        self.rows += 1
+
+    def abort(self):
+        self.out.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def commit(self):
+        store = self.store
+        self.out.close()
+        index_tmp = store.index_path + ".tmp"
+        with open(index_tmp, "w", encoding="utf-8") as idx:
+            # os.replace keeps the tmp file's inode, so the header matches the new store
+            idx.write(store._header(os.stat(self.tmp_path).st_ino))
+            for key, entry in self.lines:
+                idx.write(store._line(key, entry))
+        os.replace(self.tmp_path, store.path)
+        os.replace(index_tmp, store.index_path)
+        store._reset()
+        for key, entry in self.lines:
+            store._add(key, entry)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or rebuild the journals.jsonl resume index")
+    parser.add_argument("command", choices=["stats", "rebuild", "get"])
+    parser.add_argument("--id", help="Record id for 'get'")
+    parser.add_argument("--path", default=JOURNALS_FILE)
+    parser.add_argument("--model", help="Embedding model the index is keyed by "
+                                        "(default: the store's own, see stored_model())")
+    args = parser.parse_args()
+
+    # A wrong model would make load() rebuild the index with the wrong content keys
+    model = args.model or stored_model(args.path) or os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    store = JournalStore(args.path, model)
+    if args.command == "rebuild":
+        start = time.time()
+        store.rebuild()
+        print(f"Rebuilt {store.index_path}: {len(store.entries)} records in {time.time() - start:.1f}s")
+    elif args.command == "get":
+        record = store.load().get(args.id)
+        if record is None:
+            raise SystemExit(f"No record with id {args.id}")
+        record.pop("embedding", None)
+        print(json.dumps(record, indent=2))
+    else:
+        store.load()
+        embedded = sum(1 for e in store.entries.values() if e["has_embedding"])
+        print(f"{len(store.entries)} records ({embedded} with embeddings), {store.covered} bytes indexed")
@@ -0,0 +1,186 @@
+import hashlib
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+# Columnar row-transform stage for the Scopus outlet sheet
+# Turns a frame of raw workbook columns into journal records with whole-column numpy ops on
+# object arrays (pandas' arrow-backed string ops are slower than the per-row loop they replace).
+# ASJC code lists and ids are computed once per distinct value and broadcast back to the rows.
+# Output matches the record layout ingest_data.py has always written.
+
+# Workbook header -> field name used throughout ingestion
+TARGET_COLS = {
+    'Source Title': 'Source_Title',
+    'scope': 'scope',
+    'All Science Journal Classification Codes (ASJC)': 'All_Science_Journal_Classification_Codes_ASJC',
+    'Publisher': 'Publisher',
+    'Sourcerecord ID': 'Sourcerecord_ID',
+    'Active or Inactive': 'Active_or_Inactive',
+    'Coverage': 'Coverage'
+}
+FIELDS = list(TARGET_COLS.values())
+SCOPE_MAX_CHARS = 4000
+CHUNK_SIZE = 5000
+
+
+# Stable ids: derived from the Scopus source id (via the record link), so re-ingesting the same
+# outlet keeps its id and exclusions.json stays valid. Titles are the fallback key.
+_ID_NAMESPACE = hashlib.sha1(uuid.NAMESPACE_URL.bytes)
+_VARIANT = "89ab89ab89ab89ab"
+_HEX = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+_DASHES = (8, 13, 18, 23)
+_HEX_POS = np.array([i for i in range(36) if i not in _DASHES])
+
+def stable_id(link, title):
+    # Same value as str(uuid.uuid5(uuid.NAMESPACE_URL, key)) without building UUID objects
+    key = link if link else f"journal:{title}"
+    h = _ID_NAMESPACE.copy()
+    h.update(key.encode("utf-8"))
+    x = h.hexdigest()
+    return f"{x[:8]}-{x[8:12]}-5{x[13:16]}-{_VARIANT[int(x[16], 16)]}{x[17:20]}-{x[20:32]}"
+
+
+def stable_ids(links, titles):
+    """stable_id() of whole columns: one SHA-1 per distinct key, the UUID layout is applied with numpy."""
+    keys = np.where(links != "", links, "journal:" + titles)
+    row_keys, uniques = pd.factorize(keys)
+    prefix = uuid.NAMESPACE_URL.bytes
+    digests = b"".join([hashlib.sha1(prefix + key.encode("utf-8")).digest() for key in uniques])
+    raw = np.frombuffer(digests, dtype=np.uint8).reshape(-1, 20)[:, :16].copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x50 # Version 5
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80 # RFC 4122 variant
+    chars = np.full((len(raw), 36), ord("-"), dtype=np.uint8)
+    chars[:, _HEX_POS] = _HEX[np.stack([raw >> 4, raw & 0x0F], axis=2).reshape(-1, 32)]
+    text = chars.view("S36").ravel().astype("U36").astype(object)
+    return text[row_keys]
+
+
+def load_asjc_map(path):
+    """ASJC1.xlsx -> { code: description }"""
+    if not os.path.exists(path):
+        return {}
+    df_asjc = pd.read_excel(path)
+    codes = df_asjc['Code'].astype(str).str.strip()
+    descriptions = df_asjc['Description'].astype(str).str.strip()
+    return dict(zip(codes, descriptions))
+
+
+def _text(df, col, default):
+    """str() of every cell as an object array, with missing cells (None/NaN/"nan") replaced by `default`."""
+    if col not in df.columns:
+        return np.full(len(df), default, dtype=object)
+    raw = df[col].to_numpy(dtype=object)
+    text = np.fromiter(map(str, raw), dtype=object, count=len(raw))
+    return np.where(pd.isna(raw) | (text == "nan"), default, text)
+
+
+def decode_asjc(raw_asjc, asjc_map):
+    """
+    '1706; 2100' -> ('Computer Science Applications; General Energy', [1706, 2100]) for a whole column:
+    an object array of decoded text and a list of numeric code lists, in row order. Unknown codes stay as-is.
+    """
+    # Many outlets share the same code list: decode each distinct string once, then broadcast
+    row_codes, uniques = pd.factorize(raw_asjc)
+    decoded = np.empty(len(uniques) + 1, dtype=object)
+    codes = np.empty(len(uniques) + 1, dtype=object)
+    for i, value in enumerate(uniques):
+        parts = [p.strip() for p in value.replace(",", ";").split(";")]
+        decoded[i] = "; ".join(asjc_map.get(p, p) for p in parts if p)
+        codes[i] = [int(p) for p in parts if p.isdigit()]
+    decoded[-1], codes[-1] = "", [] # factorize marks missing values -1
+    return decoded[row_codes], codes[row_codes].tolist()
+
+
+def transform_frame(df, asjc_map):
+    """
+    df: raw workbook columns, either original headers or field names (Source_Title, scope, ...).
+    Returns the list of journal records (without embeddings), in row order. Every field is built
+    as a whole column; the columns are only zipped into records at the end.
+    """
+    df = df.rename(columns=TARGET_COLS)
+    if "Source_Title" not in df.columns:
+        return []
+    df = df[df["Source_Title"].notna()]
+    if df.empty:
+        return []
+
+    names = df["Source_Title"].to_numpy(dtype=object)
+    titles = np.fromiter(map(str, names), dtype=object, count=len(names))
+    scope = _text(df, "scope", "")
+    raw_asjc = _text(df, "All_Science_Journal_Classification_Codes_ASJC", "")
+    publisher = _text(df, "Publisher", "Unknown Publisher")
+    source_id = _text(df, "Sourcerecord_ID", "")
+    active_status = _text(df, "Active_or_Inactive", "Unknown")
+    years = _text(df, "Coverage", "")
+
+    # The codes themselves too: several descriptions in ASJC1.xlsx are shared (e.g. 13, 1301 and
+    # 1303 are all "Biochemistry"), so the decoded text cannot be mapped back (facet_index.py)
+    asjc_final, asjc_codes = decode_asjc(raw_asjc, asjc_map)
+
+    coverage = np.where(years != "", active_status + " (" + years + ")", active_status)
+    link = np.where(source_id != "", "https://www.scopus.com/sourceid/" + source_id, "")
+
+    lengths = np.fromiter(map(len, scope), dtype=np.int64, count=len(scope))
+    for i in np.flatnonzero(lengths > SCOPE_MAX_CHARS).tolist():
+        scope[i] = scope[i][:SCOPE_MAX_CHARS] + "..."
+
+    # One format call per row: chained array + would copy every (long) scope once per operand
+    content = list(map(str.strip, map("{}. {}. matches ASJC codes: {}".format, titles, scope, asjc_final)))
+    ids = stable_ids(link, titles)
+
+    return [
+        {
+            "id": i,
+            "name": t,
+            "scope": s,
+            "content": c,
+            "publisher": p,
+            "link": l,
+            "coverage": cov,
+            "asjc": a,
+            "asjc_codes": codes
+        }
+        for i, t, s, c, p, l, cov, a, codes in zip(
+            ids.tolist(), names.tolist(), scope.tolist(), content, publisher.tolist(), link.tolist(),
+            coverage.tolist(), asjc_final.tolist(), asjc_codes
+        )
+    ]
+
+
+def iter_workbook_frames(path, chunk_size=CHUNK_SIZE):
+    """
+    Streams the outlet workbook with openpyxl (read-only, low memory) and yields DataFrames of
+    `chunk_size` rows with field-name columns, every cell a string or None. Rows without a title are skipped.
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        rows = ws.iter_rows(values_only=True)
+        header_row = next(rows)
+        headers = [(idx, TARGET_COLS[name]) for idx, name in enumerate(header_row) if name in TARGET_COLS]
+        fields = [field for _, field in headers]
+        title_pos = fields.index("Source_Title") if "Source_Title" in fields else None
+
+        count = 0
+        buffer = []
+        for row_data in rows:
+            count += 1
+            if count % 5000 == 0:
+                print(f"Read {count} rows...", flush=True)
+            values = tuple(row_data[idx] if idx < len(row_data) else None for idx, _ in headers)
+            if title_pos is None or not values[title_pos]:
+                continue
+            # Cells as text, like the Parquet cache stores them (ints, floats and dates from openpyxl
+            # included): a fresh read and a cache hit must give the same names, ids and keys
+            buffer.append(tuple(None if v is None else str(v) for v in values))
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=fields, dtype=object)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=fields, dtype=object)
+    finally:
+        wb.close()
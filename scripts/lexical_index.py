@@ -0,0 +1,294 @@
+import argparse
+import json
+import os
+import re
+import time
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from vector_store import OUTPUT_DIR, iter_metadata, load_manifest, write_generation
+
+# Inverted index with BM25 scoring over the journal `content` field
+# Replaces the per-journal Jaccard fallback (one token Set per journal, scanned linearly): a query
+# only walks the postings of its own terms. Doc ids are row numbers of the binary vector store
+# (journals.meta.jsonl order), so scores line up with the matrix rows. Files next to the store:
+#   journals.lex.json        - rows, terms, postings, avgdl, k1/b and the meta_sha256 it was built from
+#   journals.lex.terms.json  - vocabulary, sorted; term id = position
+#   journals.lex.bin         - int32 offsets (terms + 1), int32 doc ids (postings, ascending per term),
+#                              int32 doc lengths (rows), uint16 term frequencies (postings)
+# Tokens are the ones analyzeAbstract's tokenize() produces (lowercase, ASCII word characters,
+# 4+ chars), so web/lib/recommender.ts can score queries against the same index.
+# Scores are BM25 divided by the query's best attainable score, so they stay in [0, 1] like Jaccard.
+#
+# Usage:
+#   python scripts/lexical_index.py build
+#   python scripts/lexical_index.py query "abstract text" [--k 10]
+#   python scripts/lexical_index.py report [--n-queries 200] [--queries abstracts.csv]
+
+INDEX_FILE = "journals.lex.json"
+TERMS_FILE = "journals.lex.terms.json"
+POSTINGS_FILE = "journals.lex.bin"
+INDEX_VERSION = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_TF = 65535
+META_FIELDS = ("id", "name", "publisher", "link", "coverage", "asjc")
+
+# JS: text.toLowerCase().replace(/[^\w\s]/g, '').split(/\s+/).filter(w => w.length > 3)
+_STRIP_RE = re.compile(r"[^A-Za-z0-9_\s]")
+
+
+def tokenize(text):
+    """Token list (with repeats) in the same form as recommender.ts tokenize()."""
+    return [w for w in _STRIP_RE.sub("", str(text).lower()).split() if len(w) > 3]
+
+
+def build_index(data_dir=OUTPUT_DIR, k1=BM25_K1, b=BM25_B):
+    """Builds the index from the binary store's metadata (one streaming pass, content field)."""
+    manifest = load_manifest(data_dir)
+    if manifest is None:
+        print("No vector store manifest; skipping lexical index.", flush=True)
+        return None
+    start = time.time()
+    term_ids = {}
+    postings = [] # term id -> array of (doc, tf) pairs, flattened
+    doc_lengths = array("i")
+    for row, meta in enumerate(iter_metadata(data_dir, manifest)):
+        counts = Counter(tokenize(meta.get("content", "")))
+        doc_lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            tid = term_ids.get(term)
+            if tid is None:
+                tid = term_ids[term] = len(postings)
+                postings.append(array("i"))
+            postings[tid].append(row)
+            postings[tid].append(min(tf, MAX_TF))
+
+    # Sorted vocabulary: deterministic files, and the TS side can binary search if it ever needs to
+    terms = sorted(term_ids)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum([len(postings[term_ids[t]]) // 2 for t in terms], out=offsets[1:])
+    docs = np.empty(int(offsets[-1]), dtype=np.int32)
+    tfs = np.empty(int(offsets[-1]), dtype=np.uint16)
+    for i, term in enumerate(terms):
+        pairs = np.frombuffer(postings[term_ids[term]], dtype=np.int32)
+        docs[offsets[i]:offsets[i + 1]] = pairs[0::2]
+        tfs[offsets[i]:offsets[i + 1]] = pairs[1::2]
+    postings = None
+    lengths = np.frombuffer(doc_lengths, dtype=np.int32)
+
+    payload = offsets.astype(np.int32).tobytes() + docs.tobytes() + lengths.tobytes() + tfs.tobytes()
+    rows = len(lengths)
+    info = {
+        "version": INDEX_VERSION,
+        "kind": "bm25",
+        "rows": rows,
+        "terms": len(terms),
+        "postings": int(len(docs)),
+        "avgdl": float(lengths.mean()) if rows else 0.0,
+        "k1": k1,
+        "b": b,
+        "terms_file": TERMS_FILE,
+        "postings_file": POSTINGS_FILE,
+        "store_meta_sha256": manifest["meta_sha256"],
+        "build_seconds": round(time.time() - start, 2),
+        "created": time.time(),
+    }
+
+    # Data files first, index manifest last (same order as the vector store)
+    for name, data in ((TERMS_FILE, json.dumps(terms).encode("utf-8")), (POSTINGS_FILE, payload)):
+        path = os.path.join(data_dir, name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+    index_path = os.path.join(data_dir, INDEX_FILE)
+    with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+    os.replace(index_path + ".tmp", index_path)
+
+    print(f"Lexical index written: {len(terms)} terms, {len(docs)} postings over {rows} journals "
+          f"({len(payload) / 1e6:.1f}MB) in {info['build_seconds']:.1f}s", flush=True)
+    return info
+
+
+class LexicalIndex:
+    def __init__(self, terms, offsets, docs, lengths, tfs, info, metadata=None):
+        self.term_ids = {t: i for i, t in enumerate(terms)}
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.info = info
+        self.rows = info["rows"]
+        self.k1 = info["k1"]
+        self.metadata = metadata
+        # BM25 length normalization per doc, computed once
+        avgdl = info["avgdl"] or 1.0
+        self.doc_norm = (self.k1 * (1 - info["b"] + info["b"] * lengths / avgdl)).astype(np.float32)
+        df = np.diff(offsets).astype(np.float64)
+        self.idf = np.log(1 + (self.rows - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    def query_terms(self, text):
+        # Unique terms, like the Set analyzeAbstract builds
+        return sorted({self.term_ids[t] for t in tokenize(text) if t in self.term_ids})
+
+    def scores(self, text):
+        """(rows, scores) of every journal sharing a term with `text`; scores in [0, 1]."""
+        tids = self.query_terms(text)
+        if not tids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        acc = np.zeros(self.rows, dtype=np.float32)
+        for tid in tids:
+            start, end = self.offsets[tid], self.offsets[tid + 1]
+            docs = self.docs[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            acc[docs] += self.idf[tid] * tf * (self.k1 + 1) / (tf + self.doc_norm[docs])
+        best = float(self.idf[tids].sum()) * (self.k1 + 1)
+        rows = np.flatnonzero(acc)
+        return rows, acc[rows] / best
+
+    def search(self, text, k=10, excluded_rows=None):
+        """[(row, score)], best first."""
+        rows, scores = self.scores(text)
+        if excluded_rows:
+            keep = ~np.isin(rows, np.fromiter(excluded_rows, dtype=np.int64))
+            rows, scores = rows[keep], scores[keep]
+        if len(rows) > k:
+            part = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[part], scores[part]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(rows[i]), float(scores[i])) for i in order]
+
+
+def load_index(data_dir=OUTPUT_DIR, manifest=None, metadata=False):
+    """The lexical index if it exists and was built from the current vector store, else None."""
+    path = os.path.join(data_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        info = json.load(f)
+    if manifest is None:
+        manifest = load_manifest(data_dir)
+    if manifest is None or info.get("store_meta_sha256") != manifest.get("meta_sha256"):
+        print("Lexical index is stale (vector store rebuilt since).", flush=True)
+        return None
+    with open(os.path.join(data_dir, info["terms_file"]), "r", encoding="utf-8") as f:
+        terms = json.load(f)
+    raw = np.fromfile(os.path.join(data_dir, info["postings_file"]), dtype=np.uint8)
+    n_terms, n_postings, rows = info["terms"], info["postings"], info["rows"]
+    ints = raw[:(n_terms + 1 + n_postings + rows) * 4].view(np.int32)
+    offsets = ints[:n_terms + 1].astype(np.int64)
+    docs = ints[n_terms + 1:n_terms + 1 + n_postings]
+    lengths = ints[n_terms + 1 + n_postings:]
+    tfs = raw[len(ints) * 4:].view(np.uint16)
+    meta = [{field: m.get(field) for field in META_FIELDS} for m in iter_metadata(data_dir, manifest)] \
+        if metadata else None
+    return LexicalIndex(terms, offsets, docs, lengths, tfs, info, meta)
+
+
+def jaccard(a, b):
+    intersection = len(a & b)
+    union = len(a) + len(b) - intersection
+    return 0.0 if union == 0 else intersection / union
+
+
+def _sample_queries(data_dir, n, words, seed):
+    # Abstract-sized queries drawn from journal content: realistic term mixes without any input file
+    rng = np.random.default_rng(seed)
+    contents = [m.get("content", "") for m in iter_metadata(data_dir)]
+    queries = []
+    for row in rng.choice(len(contents), min(n, len(contents)), replace=False):
+        tokens = contents[row].split()
+        if tokens:
+            queries.append(" ".join(rng.choice(tokens, min(words, len(tokens)), replace=False)))
+    return queries
+
+
+def report(data_dir=OUTPUT_DIR, k=10, n_queries=200, queries_path=None, words=150, seed=0):
+    """Latency of BM25 over postings vs the Jaccard scan over per-journal token sets."""
+    index = load_index(data_dir)
+    if index is None:
+        raise SystemExit("No fresh lexical index. Run: python scripts/lexical_index.py build")
+    if queries_path:
+        from query_engine import read_queries
+        queries = [q["text"] for q in read_queries(queries_path) if q["text"]]
+    else:
+        queries = _sample_queries(data_dir, n_queries, words, seed)
+
+    # The fallback as analyzeAbstract runs it: one token set per journal, every journal scored
+    start = time.perf_counter()
+    token_sets = [set(tokenize(m.get("content", ""))) for m in iter_metadata(data_dir)]
+    sets_s = time.perf_counter() - start
+    jaccard_ms = []
+    for q in queries:
+        t0 = time.perf_counter()
+        qs = set(tokenize(q))
+        scores = np.fromiter((jaccard(qs, s) for s in token_sets), dtype=np.float32, count=len(token_sets))
+        np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        jaccard_ms.append((time.perf_counter() - t0) * 1000)
+
+    bm25_ms = []
+    touched = 0
+    for q in queries:
+        t0 = time.perf_counter()
+        index.search(q, k)
+        bm25_ms.append((time.perf_counter() - t0) * 1000)
+        touched += len(index.scores(q)[0])
+
+    result = {
+        "queries": len(queries),
+        "rows": index.rows,
+        "jaccard_ms": float(np.mean(jaccard_ms)),
+        "jaccard_p95_ms": float(np.percentile(jaccard_ms, 95)),
+        "bm25_ms": float(np.mean(bm25_ms)),
+        "bm25_p95_ms": float(np.percentile(bm25_ms, 95)),
+        "token_sets_seconds": sets_s,
+        "avg_docs_touched": touched / max(1, len(queries)),
+    }
+    print(f"{len(queries)} queries, {index.rows} journals, {index.info['terms']} terms, k {k}")
+    print(f"{'method':<10} {'ms/query':>10} {'p95 ms':>10} {'docs scored':>12}")
+    print(f"{'jaccard':<10} {result['jaccard_ms']:>10.2f} {result['jaccard_p95_ms']:>10.2f} {index.rows:>12}")
+    print(f"{'bm25':<10} {result['bm25_ms']:>10.2f} {result['bm25_p95_ms']:>10.2f} "
+          f"{result['avg_docs_touched']:>12.0f}")
+    print(f"Speedup: {result['jaccard_ms'] / result['bm25_ms']:.1f}x "
+          f"(token sets took {sets_s:.1f}s to build; the index needs none)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, query and evaluate the BM25 lexical index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Write the index from the vector store metadata")
+    build.add_argument("--k1", type=float, default=BM25_K1)
+    build.add_argument("--b", type=float, default=BM25_B)
+    query = sub.add_parser("query", help="Top-k journals for a text")
+    query.add_argument("text")
+    query.add_argument("--k", type=int, default=10)
+    rep = sub.add_parser("report", help="Latency against the Jaccard fallback")
+    rep.add_argument("--k", type=int, default=10)
+    rep.add_argument("--queries", help="CSV or JSONL with an `abstract` per row (default: sampled from content)")
+    rep.add_argument("--n-queries", type=int, default=200)
+    rep.add_argument("--output", help="Also write the report as JSON")
+    for p in (build, query, rep):
+        p.add_argument("--data-dir", default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_index(args.data_dir, args.k1, args.b)
+        write_generation(args.data_dir) # Running servers pick up the rebuilt index
+    elif args.command == "query":
+        index = load_index(args.data_dir, metadata=True)
+        if index is None:
+            raise SystemExit("No fresh lexical index. Run: python scripts/lexical_index.py build")
+        for rank, (row, score) in enumerate(index.search(args.text, args.k), 1):
+            print(json.dumps(dict(index.metadata[row], rank=rank, score=round(score, 4))))
+    else:
+        result = report(args.data_dir, args.k, args.n_queries, args.queries)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
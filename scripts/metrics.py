@@ -0,0 +1,240 @@
+import atexit
+import bisect
+import contextlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+# Ingest metrics: latency histograms, counters, peak memory, JSON-lines trace
+# One process-wide registry (`metrics`) that the ingest stages report into:
+#   metrics.span("embed.request")    - context manager, observes the elapsed seconds
+#   metrics.observe(name, seconds)   - same, for stages timed by hand
+#   metrics.count(name, n=1)         - counters (rows, API calls, retries, ...)
+# With a trace file (INGEST_TRACE=trace.jsonl, or --trace) every observation is also written as
+# one JSON line, and close() appends a summary line with every histogram and counter.
+# A sampler thread records resident memory every MEMORY_SAMPLE_SECONDS (peak and trace samples).
+# The peak covers the run since reset(): getrusage only knows the process lifetime peak, so it is
+# used when the run raised it, else the sampled peak; summaries say when only the lifetime is known.
+# Histograms have fixed exponential buckets (0.1ms .. ~107s) so summaries from several runs merge.
+# web/lib/metrics.ts writes the same line format for analyzeAbstract.
+
+TRACE_FILE = os.getenv("INGEST_TRACE", "") # Empty: no trace, histograms/counters are still kept
+MEMORY_SAMPLE_SECONDS = float(os.getenv("INGEST_MEMORY_SAMPLE_SECONDS", "1.0"))
+BUCKETS = [0.0001 * 2 ** i for i in range(21)] # Upper bounds in seconds
+BUCKET_INDEX = {f"{b:g}": i for i, b in enumerate(BUCKETS + [float("inf")])} # summary() bucket labels
+
+
+def rss_mb():
+    """Current resident memory (Linux /proc), else the peak from getrusage."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.n += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def merge(self, summary):
+        """Adds the observations of another histogram's summary()."""
+        for label, c in summary["buckets"].items():
+            self.counts[BUCKET_INDEX[label]] += c
+        if summary["count"]:
+            self.min = min(self.min, summary["min"])
+            self.max = max(self.max, summary["max"])
+        self.n += summary["count"]
+        self.total += summary["sum"]
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (capped at the observed max)."""
+        if self.n == 0:
+            return 0.0
+        rank = q * self.n
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(BUCKETS[i] if i < len(BUCKETS) else self.max, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.n,
+            "sum": round(self.total, 6),
+            "min": round(self.min, 6) if self.n else 0.0,
+            "max": round(self.max, 6),
+            "p50": round(self.quantile(0.5), 6),
+            "p95": round(self.quantile(0.95), 6),
+            "p99": round(self.quantile(0.99), 6),
+            "buckets": {f"{b:g}": c for b, c in zip(BUCKETS + [float("inf")], self.counts) if c},
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.peak_rss_mb = 0.0 # Sampled since reset()
+        self._sampled = False
+        self._rusage_base_mb = 0.0 # getrusage peak at reset(): above it, the run set the process high
+        self._lock = threading.Lock()
+        self._trace = None
+        self._sampler = None
+        self._stop = threading.Event()
+        self._start = time.time()
+
+    def configure(self, trace_path=TRACE_FILE, sample_seconds=MEMORY_SAMPLE_SECONDS):
+        """Opens the trace (appending) and starts the memory sampler. Safe to call more than once."""
+        if trace_path and self._trace is None:
+            self._trace = open(trace_path, "a", encoding="utf-8")
+            atexit.register(self.close)
+        if sample_seconds > 0 and self._sampler is None:
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample, args=(sample_seconds,), daemon=True)
+            self._sampler.start()
+        return self
+
+    def reset(self):
+        """Drops every histogram and counter (one ingest per report in a long-lived queue worker)."""
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+            self.peak_rss_mb = 0.0
+            self._sampled = False
+            self._rusage_base_mb = peak_rss_mb()
+            self._start = time.time()
+
+    def _emit(self, event):
+        if self._trace is not None:
+            self._trace.write(json.dumps(event) + "\n")
+
+    def observe(self, name, seconds, **attrs):
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.observe(seconds)
+            self._emit({"ts": round(time.time(), 6), "type": "span", "name": name,
+                        "seconds": round(seconds, 6), **attrs})
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        start = time.perf_counter()
+        try:
+            yield attrs # Callers may add attributes (rows, batch size, ...) before the span ends
+        finally:
+            self.observe(name, time.perf_counter() - start, **attrs)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def _sample(self, interval):
+        while not self._stop.wait(interval):
+            mb = rss_mb()
+            with self._lock:
+                self.peak_rss_mb = max(self.peak_rss_mb, mb)
+                self._sampled = True
+                self._emit({"ts": round(time.time(), 6), "type": "memory", "rss_mb": round(mb, 1)})
+
+    def _peak(self):
+        """(peak MB since reset(), scope): "run", or "process" when only the lifetime peak is known."""
+        lifetime = peak_rss_mb()
+        if lifetime > self._rusage_base_mb:
+            return lifetime, "run" # The process peak was reached after reset(): exact
+        if self._sampled:
+            return max(self.peak_rss_mb, rss_mb()), "run"
+        return lifetime, "process" # No sampler ran (sample_seconds=0)
+
+    def summary(self):
+        with self._lock:
+            peak, scope = self._peak()
+            return {
+                "ts": round(time.time(), 6),
+                "type": "summary",
+                "seconds": round(time.time() - self._start, 3),
+                "peak_rss_mb": round(peak, 1),
+                "peak_rss_scope": scope,
+                "counters": dict(self.counters),
+                "histograms": {name: h.summary() for name, h in sorted(self.histograms.items())},
+            }
+
+    def merge(self, summary):
+        """Folds the summary() of another process (a shard worker) into these histograms and counters."""
+        with self._lock:
+            for name, value in summary["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, h in summary["histograms"].items():
+                if name not in self.histograms:
+                    self.histograms[name] = Histogram()
+                self.histograms[name].merge(h)
+
+    def report(self):
+        summary = self.summary()
+        print("--- Metrics ---", flush=True)
+        print(f"{'stage':<24} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'total s':>9}", flush=True)
+        for name, h in summary["histograms"].items():
+            print(f"{name:<24} {h['count']:>7} {h['p50'] * 1000:>9.1f} {h['p95'] * 1000:>9.1f} "
+                  f"{h['max'] * 1000:>9.1f} {h['sum']:>9.2f}", flush=True)
+        for name, value in sorted(summary["counters"].items()):
+            print(f"{name:<24} {value:>7}", flush=True)
+        note = " (process lifetime; no memory samples since the last reset)" if summary["peak_rss_scope"] == "process" else ""
+        print(f"Peak RSS: {summary['peak_rss_mb']:.0f} MB{note}", flush=True)
+        return summary
+
+    def close(self):
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+        summary = self.summary()
+        with self._lock:
+            if self._trace is not None:
+                self._emit(summary)
+                self._trace.close()
+                self._trace = None
+
+
+metrics = Metrics()
+
+
+@contextlib.contextmanager
+def profiled(path):
+    """cProfile the block and dump pstats to `path` (load with pstats / snakeviz); no-op without a path."""
+    if not path:
+        yield
+        return
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"Profile written to {path}. Top functions by cumulative time:", flush=True)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
@@ -2,6 +2,8 @@
 import json
 import os
 
+from sdg_matcher import write_matcher
+
 # Paths
 SDG_FILE = 'web/data/sdgs.json'
 
@@ -34,6 +36,8 @@ def patch_sdgs():
         with open(SDG_FILE, 'w') as f:
             json.dump(data, f, indent=4)
         print("Successfully updated sdgs.json")
+        # Keep the keyword automaton in step with the patched lists
+        write_matcher(data, os.path.dirname(SDG_FILE))
     else:
         print("No SDGs matched for patching.")
 
@@ -0,0 +1,295 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from vector_store import OUTPUT_DIR, iter_metadata, load_manifest, load_vectors, write_generation
+
+# Quantized journal vectors (optional, VECTOR_QUANT=int8|pq at ingest)
+# Compact copies of journals.vectors.bin for resident memory; the float store stays on disk for
+# reranking a shortlist at full precision. Both work on L2-normalized rows.
+#   int8 - symmetric scalar quantization with a per-row scale (max |x| / 127): 4x smaller than float32
+#            journals.q8.bin (int8, rows x dim), journals.q8.scales.bin (float32, rows)
+#   pq   - product quantization: dim split into `m` subspaces, 256 k-means centroids each, one byte
+#          per subspace per row (1536-d float32 at m=96: 64x smaller). Scored with per-query lookup tables.
+#            journals.pq.codebooks.bin (float32, m x 256 x dim/m), journals.pq.codes.bin (uint8, rows x m)
+#   journals.quant.json - kind, sizes, and the vectors_sha256 of the store it was built from
+# web/lib/recommender.ts serves from the int8 copy when it is fresh; pq is scored here only.
+#
+# Usage:
+#   python scripts/quantize.py build {int8,pq} [--m 96]
+#   python scripts/quantize.py report [--k 3] [--rerank 10] [--n-queries 200]
+
+QUANT_FILE = "journals.quant.json"
+Q8_FILE = "journals.q8.bin"
+Q8_SCALES_FILE = "journals.q8.scales.bin"
+PQ_CODEBOOKS_FILE = "journals.pq.codebooks.bin"
+PQ_CODES_FILE = "journals.pq.codes.bin"
+QUANT_VERSION = 1
+KINDS = ("int8", "pq")
+PQ_CENTROIDS = 256
+PQ_SUBVECTOR = 16 # Default m = dim / PQ_SUBVECTOR
+PQ_ITERATIONS = 15
+PQ_TRAIN_ROWS = 65536
+DEFAULT_RERANK = 10 # Shortlist = k * rerank rows rescored at full precision
+BLOCK_ROWS = 8192
+
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _write(data_dir, name, payload):
+    path = os.path.join(data_dir, name)
+    with open(path + ".tmp", "wb") as f:
+        f.write(payload)
+    os.replace(path + ".tmp", path)
+    return hashlib.sha256(payload).hexdigest()
+
+
+def quantize_int8(vectors):
+    """Normalized float rows -> (int8 codes, float32 per-row scales); zero rows get scale 0."""
+    vectors = _normalize(vectors)
+    peak = np.abs(vectors).max(axis=1) if vectors.size else np.zeros(len(vectors), dtype=np.float32)
+    scales = (peak / 127.0).astype(np.float32)
+    safe = np.where(scales > 0, scales, 1.0)[:, None]
+    codes = np.clip(np.rint(vectors / safe), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def train_pq(vectors, m, iterations=PQ_ITERATIONS, seed=0):
+    """k-means (256 centroids) per subspace on normalized rows: codebooks (m, 256, dim / m)."""
+    rng = np.random.default_rng(seed)
+    dsub = vectors.shape[1] // m
+    codebooks = np.empty((m, PQ_CENTROIDS, dsub), dtype=np.float32)
+    for s in range(m):
+        sub = vectors[:, s * dsub:(s + 1) * dsub]
+        ncent = min(PQ_CENTROIDS, len(sub))
+        cent = sub[rng.choice(len(sub), ncent, replace=False)].copy()
+        for _ in range(iterations):
+            labels = _nearest(sub, cent)
+            counts = np.bincount(labels, minlength=ncent)
+            sums = np.stack([np.bincount(labels, weights=sub[:, d], minlength=ncent) for d in range(dsub)], axis=1)
+            filled = counts > 0
+            cent[filled] = sums[filled] / counts[filled, None]
+            if (~filled).any():
+                # Re-seed empty clusters with random training rows
+                cent[~filled] = sub[rng.choice(len(sub), int((~filled).sum()), replace=False)]
+        codebooks[s, :ncent] = cent
+        codebooks[s, ncent:] = cent[0]
+    return codebooks
+
+
+def _nearest(sub, cent):
+    # argmin ||x - c||^2 = argmax (x.c - |c|^2 / 2)
+    return np.argmax(sub @ cent.T - 0.5 * np.sum(cent * cent, axis=1), axis=1)
+
+
+def encode_pq(vectors, codebooks):
+    m, _, dsub = codebooks.shape
+    codes = np.empty((len(vectors), m), dtype=np.uint8)
+    for s in range(m):
+        codes[:, s] = _nearest(vectors[:, s * dsub:(s + 1) * dsub], codebooks[s])
+    return codes
+
+
+def build(data_dir=OUTPUT_DIR, kind="int8", m=None, seed=0):
+    """Quantizes the current vector store and writes it next to it (index file last)."""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown quantization '{kind}' (expected one of {', '.join(KINDS)})")
+    start = time.time()
+    manifest, matrix = load_vectors(data_dir)
+    rows, dim = manifest["rows"], manifest["dim"]
+    info = {"version": QUANT_VERSION, "kind": kind, "rows": rows, "dim": dim,
+            "store_vectors_sha256": manifest["vectors_sha256"]}
+
+    if kind == "int8":
+        codes = bytearray()
+        scales = bytearray()
+        for block in range(0, rows, BLOCK_ROWS):
+            c, s = quantize_int8(matrix[block:block + BLOCK_ROWS])
+            codes += c.tobytes()
+            scales += s.tobytes()
+        info.update(codes_file=Q8_FILE, scales_file=Q8_SCALES_FILE,
+                    codes_sha256=_write(data_dir, Q8_FILE, bytes(codes)),
+                    scales_sha256=_write(data_dir, Q8_SCALES_FILE, bytes(scales)),
+                    bytes=len(codes) + len(scales))
+    else:
+        m = m or max(1, dim // PQ_SUBVECTOR)
+        if dim % m:
+            raise ValueError(f"--m must divide the dimension ({dim})")
+        embedded = np.asarray([r for r, meta in enumerate(iter_metadata(data_dir, manifest)) if meta.get("hasEmbedding")],
+                              dtype=np.int64)
+        if len(embedded) == 0:
+            print("No embedded rows, skipping quantization.", flush=True)
+            return None
+        rng = np.random.default_rng(seed)
+        train_rows = np.sort(rng.choice(embedded, min(len(embedded), PQ_TRAIN_ROWS), replace=False))
+        print(f"Training PQ codebooks: {len(train_rows)} vectors, m={m}, {PQ_CENTROIDS} centroids...", flush=True)
+        codebooks = train_pq(_normalize(matrix[train_rows]), m, seed=seed)
+        codes = bytearray()
+        for block in range(0, rows, BLOCK_ROWS):
+            codes += encode_pq(_normalize(matrix[block:block + BLOCK_ROWS]), codebooks).tobytes()
+        info.update(m=m, codebooks_file=PQ_CODEBOOKS_FILE, codes_file=PQ_CODES_FILE,
+                    codebooks_sha256=_write(data_dir, PQ_CODEBOOKS_FILE, codebooks.tobytes()),
+                    codes_sha256=_write(data_dir, PQ_CODES_FILE, bytes(codes)),
+                    bytes=len(codes) + codebooks.nbytes)
+
+    info["float32_bytes"] = rows * dim * 4
+    info["build_seconds"] = round(time.time() - start, 2)
+    info["created"] = time.time()
+    path = os.path.join(data_dir, QUANT_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+    os.replace(path + ".tmp", path)
+    print(f"Quantized vectors written ({kind}): {info['bytes'] / 1e6:.1f}MB vs "
+          f"{info['float32_bytes'] / 1e6:.1f}MB float32 in {info['build_seconds']:.1f}s", flush=True)
+    return info
+
+
+class QuantizedIndex:
+    def __init__(self, info, embedded, full, codes, scales=None, codebooks=None):
+        self.info = info
+        self.kind = info["kind"]
+        self.embedded = embedded # bool per row; rows without a vector never score
+        self.full = full # float store (memmap), only touched for reranking
+        self.codes = codes
+        self.scales = scales
+        self.codebooks = codebooks
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0) + \
+            (self.codebooks.nbytes if self.codebooks is not None else 0)
+
+    def approx_scores(self, query):
+        """Approximate cosine of a normalized query against every row (float32, rows)."""
+        if self.kind == "int8":
+            scores = (self.codes @ query) * self.scales
+        else:
+            m, _, dsub = self.codebooks.shape
+            # Lookup table: query sub-vector . every centroid, then one gather-sum per row
+            table = np.einsum("skd,sd->sk", self.codebooks, query.reshape(m, dsub))
+            scores = table[np.arange(m), self.codes].sum(axis=1)
+        return np.where(self.embedded, scores, -np.inf).astype(np.float32)
+
+    def search(self, query, k=3, rerank=DEFAULT_RERANK):
+        """(rows, scores), best first. rerank > 0: shortlist k * rerank rows, rescored at full precision."""
+        query = _normalize(query[None, :])[0]
+        scores = self.approx_scores(query)
+        short = min(len(scores), k * rerank if rerank else k)
+        if short == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.argpartition(-scores, short - 1)[:short]
+        rows = rows[np.isfinite(scores[rows])]
+        if rerank:
+            rows = np.sort(rows) # Ascending reads from the memmapped store
+            exact = _normalize(self.full[rows]) @ query
+        else:
+            exact = scores[rows]
+        order = np.argsort(-exact, kind="stable")[:k]
+        return rows[order], exact[order]
+
+
+def load_index(data_dir=OUTPUT_DIR, manifest=None):
+    """The quantized vectors if they exist and were built from the current vector store, else None."""
+    path = os.path.join(data_dir, QUANT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        info = json.load(f)
+    if manifest is None:
+        manifest = load_manifest(data_dir)
+    if manifest is None or info.get("store_vectors_sha256") != manifest.get("vectors_sha256"):
+        print("Quantized vectors are stale (vector store rebuilt since).", flush=True)
+        return None
+    _, full = load_vectors(data_dir)
+    embedded = np.fromiter((bool(meta.get("hasEmbedding")) for meta in iter_metadata(data_dir, manifest)),
+                           dtype=bool, count=info["rows"])
+    rows, dim = info["rows"], info["dim"]
+    codes_path = os.path.join(data_dir, info["codes_file"])
+    if info["kind"] == "int8":
+        codes = np.fromfile(codes_path, dtype=np.int8).reshape(rows, dim)
+        scales = np.fromfile(os.path.join(data_dir, info["scales_file"]), dtype=np.float32)
+        return QuantizedIndex(info, embedded, full, codes, scales=scales)
+    m = info["m"]
+    codes = np.fromfile(codes_path, dtype=np.uint8).reshape(rows, m)
+    codebooks = np.fromfile(os.path.join(data_dir, info["codebooks_file"]), dtype=np.float32) \
+        .reshape(m, PQ_CENTROIDS, dim // m)
+    return QuantizedIndex(info, embedded, full, codes, codebooks=codebooks)
+
+
+def report(data_dir=OUTPUT_DIR, k=3, rerank=DEFAULT_RERANK, n_queries=200, noise=0.05, seed=0):
+    """Memory, ms/query and top-k overlap with exact float32 search, with and without reranking."""
+    index = load_index(data_dir)
+    if index is None:
+        raise SystemExit("No fresh quantized vectors. Run: python scripts/quantize.py build int8")
+    exact_vectors = _normalize(np.asarray(index.full))
+    embedded = np.flatnonzero(index.embedded)
+    rng = np.random.default_rng(seed)
+    # Stored journal vectors plus noise: realistic neighbourhoods without needing API calls
+    picked = rng.choice(embedded, min(n_queries, len(embedded)), replace=False)
+    queries = _normalize(exact_vectors[picked] + rng.normal(0, noise, (len(picked), exact_vectors.shape[1])))
+
+    def run(search):
+        results, latencies = [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            results.append(set(search(q).tolist()))
+            latencies.append((time.perf_counter() - t0) * 1000)
+        return results, float(np.mean(latencies))
+
+    def exact_search(q):
+        scores = np.where(index.embedded, exact_vectors @ q, -np.inf)
+        return np.argpartition(-scores, k - 1)[:k]
+
+    truth, exact_ms = run(exact_search)
+    rows = [("float32 exact", exact_vectors.nbytes, exact_ms, 1.0)]
+    for label, factor in ((f"{index.kind}", 0), (f"{index.kind} + rerank x{rerank}", rerank)):
+        found, ms = run(lambda q: index.search(q, k, factor)[0])
+        overlap = sum(len(t & f) for t, f in zip(truth, found)) / sum(len(t) for t in truth)
+        rows.append((label, index.nbytes, ms, overlap))
+
+    print(f"{len(queries)} queries, {len(embedded)} journals, {index.info['dim']}-d, top-{k}")
+    print(f"{'method':<22} {'memory MB':>10} {'ms/query':>10} {'top-' + str(k) + ' overlap':>14}")
+    for label, nbytes, ms, overlap in rows:
+        print(f"{label:<22} {nbytes / 1e6:>10.1f} {ms:>10.2f} {overlap:>14.3f}")
+    return {"k": k, "rerank": rerank, "results": [
+        {"method": label, "bytes": nbytes, "ms": ms, "overlap": overlap} for label, nbytes, ms, overlap in rows
+    ]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and evaluate quantized journal vectors")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="Quantize the current vector store")
+    b.add_argument("kind", choices=KINDS)
+    b.add_argument("--m", type=int, default=None, help="PQ subspaces (default: dim / 16)")
+    b.add_argument("--seed", type=int, default=0)
+    rep = sub.add_parser("report", help="Memory / speed / top-k overlap against exact float32")
+    rep.add_argument("--k", type=int, default=3)
+    rep.add_argument("--rerank", type=int, default=DEFAULT_RERANK)
+    rep.add_argument("--n-queries", type=int, default=200)
+    rep.add_argument("--output", help="Also write the report as JSON")
+    for p in (b, rep):
+        p.add_argument("--data-dir", default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build(args.data_dir, args.kind, args.m, args.seed)
+        write_generation(args.data_dir) # Running servers pick up the rebuilt index
+    else:
+        result = report(args.data_dir, args.k, args.rerank, args.n_queries)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import argparse
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+from ann_index import load_index
+from embedding_backends import backend_for_manifest
+from vector_store import OUTPUT_DIR, iter_metadata, load_vectors
+
+# Offline query engine over the binary vector store
+# Loads the journal matrix once, L2-normalizes the rows, then scores whole batches of query
+# embeddings with one matrix multiply per block and picks the top-k with argpartition
+# (O(N) per query instead of sorting every score). Same cosine scores as analyzeAbstract.
+#
+# CLI: python scripts/query_engine.py --input abstracts.csv --output ranked.jsonl [--top-k 3] [--ann [--nprobe 8]]
+#   input: CSV or JSONL with an `abstract` column/field (or a precomputed `embedding`) and optional `id`
+#   abstracts are embedded with the backend the store was built with (the manifest's "embedding")
+#   output: one JSON line per query with its ranked journals
+
+QUERY_BLOCK = 256 # Queries scored per matmul; bounds the score block to QUERY_BLOCK x rows floats
+META_FIELDS = ("id", "name", "publisher", "link", "coverage", "asjc")
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def load_exclusions(data_dir):
+    path = os.path.join(data_dir, "exclusions.json")
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return set(json.load(f))
+
+
+def top_k(scores, k):
+    """Row-wise top-k of a (queries x rows) score block: (indices, scores), best first."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64), np.empty((scores.shape[0], 0), dtype=scores.dtype)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+class JournalIndex:
+    def __init__(self, vectors, metadata, dim, ann=None, manifest=None):
+        # vectors: normalized float32 (rows x dim) of searchable journals, metadata: same order
+        self.vectors = vectors
+        self.metadata = metadata
+        self.dim = dim
+        self.ann = ann # Optional IVFIndex (ann_index.py) with ids remapped to positions in `vectors`
+        self.manifest = manifest or {}
+
+    @classmethod
+    def load(cls, data_dir=OUTPUT_DIR, exclusions=True, ann=False):
+        start = time.time()
+        manifest, matrix = load_vectors(data_dir)
+        excluded = load_exclusions(data_dir) if exclusions else set()
+
+        keep = []
+        metadata = []
+        for row, meta in enumerate(iter_metadata(data_dir, manifest)):
+            if not meta.get("hasEmbedding") or meta.get("id") in excluded:
+                continue
+            keep.append(row)
+            metadata.append({field: meta.get(field) for field in META_FIELDS})
+
+        vectors = normalize_rows(matrix[np.asarray(keep, dtype=np.int64)]) if keep \
+            else np.zeros((0, manifest["dim"]), dtype=np.float32)
+
+        ivf = None
+        if ann:
+            ivf = load_index(data_dir, manifest)
+            if ivf is not None:
+                position_of_row = np.full(manifest["rows"], -1, dtype=np.int64)
+                position_of_row[np.asarray(keep, dtype=np.int64)] = np.arange(len(keep))
+                ivf = ivf.remap(position_of_row)
+        print(f"Loaded {len(keep)} searchable journals ({manifest['rows'] - len(keep)} excluded or without vectors) "
+              f"in {time.time() - start:.1f}s" + (f", ANN index with {ivf.nlist} lists" if ivf else ""), flush=True)
+        return cls(vectors, metadata, manifest["dim"], ivf, manifest)
+
+    def search(self, queries, k=3, nprobe=None):
+        """
+        queries: (n, dim) array of query embeddings.
+        Returns a list (one per query) of [(metadata, score), ...], best first.
+        With an ANN index loaded, only the `nprobe` closest lists are scored (nprobe=0: exact).
+        """
+        queries = normalize_rows(np.atleast_2d(queries))
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Query dimension {queries.shape[1]} does not match the store ({self.dim})")
+        if self.ann is not None and nprobe != 0:
+            return [
+                [(self.metadata[i], float(s)) for i, s in zip(rows, scores)]
+                for rows, scores in self.ann.search(self.vectors, queries, k, nprobe)
+            ]
+        results = []
+        for start in range(0, len(queries), QUERY_BLOCK):
+            scores = queries[start:start + QUERY_BLOCK] @ self.vectors.T
+            indices, best = top_k(scores, k)
+            for row_idx, row_scores in zip(indices, best):
+                results.append([(self.metadata[i], float(s)) for i, s in zip(row_idx, row_scores)])
+        return results
+
+
+def read_queries(path, text_field="abstract", id_field="id"):
+    """Reads CSV or JSONL into [{ id, text, embedding }]."""
+    queries = []
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    for i, row in enumerate(rows):
+        embedding = row.get("embedding")
+        if isinstance(embedding, str) and embedding:
+            embedding = json.loads(embedding)
+        queries.append({
+            "id": row.get(id_field) or str(i),
+            "text": row.get(text_field) or "",
+            "embedding": embedding or None,
+        })
+    return queries
+
+
+def embed_queries(queries, manifest=None):
+    """
+    Fills in missing query embeddings through the embedding engine (batched, rate-limited),
+    with the backend that produced the store's vectors.
+    """
+    missing = [q for q in queries if q["embedding"] is None and q["text"]]
+    if not missing:
+        return
+    from embedding_engine import EmbeddingEngine
+
+    client = None
+    if ((manifest or {}).get("embedding") or {}).get("backend", "openai") == "openai":
+        from dotenv import load_dotenv
+        from openai import OpenAI
+
+        env_path = os.path.join(os.getcwd(), "web", ".env")
+        load_dotenv(env_path if os.path.exists(env_path) else os.path.join(os.getcwd(), ".env"))
+        # The OpenAI constructor raises without a key; like ingest_data.py, run without a client instead
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY")) if os.getenv("OPENAI_API_KEY") else None
+    backend = backend_for_manifest(manifest, client)
+    if not backend.available:
+        print(f"WARNING: No OPENAI_API_KEY; {len(missing)} text queries cannot be embedded and are written "
+              f"with \"no embedding\".", flush=True)
+        backend.close()
+        return
+    options = {"max_in_flight": int(os.getenv("EMBED_CONCURRENCY", "4"))}
+    options.update(backend.engine_options)
+    engine = EmbeddingEngine(backend.client, backend.model, **options)
+    print(f"Embedding {len(missing)} queries ({backend.model})...", flush=True)
+    embedded = engine.embed_texts([q["text"] for q in missing])
+    for i, emb in embedded.items():
+        missing[i]["embedding"] = emb
+    backend.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch top-k journal recommendations")
+    parser.add_argument("--input", required=True, help="CSV or JSONL of queries")
+    parser.add_argument("--output", required=True, help="Ranked JSONL output")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--data-dir", default=OUTPUT_DIR)
+    parser.add_argument("--text-field", default="abstract")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--no-exclusions", action="store_true", help="Ignore exclusions.json")
+    parser.add_argument("--ann", action="store_true", help="Use the IVF index (ann_index.py) when it is fresh")
+    parser.add_argument("--nprobe", type=int, default=None, help="Lists probed per query with --ann (default: index setting)")
+    args = parser.parse_args()
+
+    index = JournalIndex.load(args.data_dir, exclusions=not args.no_exclusions, ann=args.ann)
+    queries = read_queries(args.input, args.text_field, args.id_field)
+    embed_queries(queries, index.manifest)
+
+    scorable = [q for q in queries if q["embedding"] is not None]
+    start = time.time()
+    ranked = index.search(np.asarray([q["embedding"] for q in scorable], dtype=np.float32), args.top_k, args.nprobe) \
+        if scorable else []
+    elapsed = time.time() - start
+
+    by_id = {id(q): r for q, r in zip(scorable, ranked)}
+    with open(args.output, "w", encoding="utf-8") as f:
+        for q in queries:
+            results = by_id.get(id(q))
+            line = {"query_id": q["id"]}
+            if results is None:
+                line["error"] = "no embedding"
+                line["results"] = []
+            else:
+                line["results"] = [dict(meta, rank=rank, score=score) for rank, (meta, score) in enumerate(results, 1)]
+            f.write(json.dumps(line) + "\n")
+
+    print(f"Scored {len(scorable)} queries against {len(index.metadata)} journals in {elapsed:.2f}s "
+          f"-> {args.output}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,243 @@
+import argparse
+import codecs
 import json
 import os
+import time
+
+from vector_store import OUTPUT_DIR, VectorStoreWriter, build_from_jsonl
 
 INPUT_FILE = "web/data/journals.json"
 OUTPUT_FILE = "web/data/journals.jsonl"
 
-def convert():
-    if not os.path.exists(INPUT_FILE):
-        print(f"Error: {INPUT_FILE} not found.")
-        return
+# Streaming journals.json -> journals.jsonl converter
+# journals.json is one ~1.7GB JSON array, json.load on it needs several times that in RAM.
+# Instead the array is read in fixed-size chunks and every element is decoded on its own
+# (JSONDecoder.raw_decode), so memory stays at one chunk plus one record.
+# - progress every PROGRESS_EVERY records (bytes read, records/s)
+# - a checkpoint (<output>.restore.json) records the input byte offset after the last written
+#   record, so an interrupted run continues with --resume (or from any element with --offset)
+# - the record count written is checked against the elements read from the input at the end
+# - --vectors also writes the binary vector store (vector_store.py) in the same pass
+#
+# Usage: python scripts/restore_jsonl.py [--input ...] [--output ...] [--resume | --offset N] [--vectors]
+
+CHUNK_BYTES = 4 * 1024 * 1024
+MAX_RECORD_BYTES = 256 * 1024 * 1024 # A single element bigger than this means the input is broken
+PROGRESS_EVERY = 5000
+CHECKPOINT_EVERY = 1000
+WHITESPACE = " \t\r\n"
+
+
+class JsonArrayReader:
+    """
+    Yields (element, end_offset) for each element of a top-level JSON array.
+    end_offset is the input byte offset just after the element, a valid place to resume from.
+    """
+
+    def __init__(self, f, start_offset=0, chunk_bytes=CHUNK_BYTES):
+        self.f = f
+        self.chunk_bytes = chunk_bytes
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.offset = start_offset # Input byte offset of buf[self.pos]
+        self.eof = False
+        self.inside = start_offset > 0 # Resuming: already past the opening '['
+        f.seek(start_offset)
+
+    def _fill(self):
+        data = self.f.read(self.chunk_bytes)
+        if not data:
+            self.eof = True
+            self.buf = self.buf[self.pos:] + self.utf8.decode(b"", final=True)
+        else:
+            self.buf = self.buf[self.pos:] + self.utf8.decode(data)
+        self.pos = 0
+        if len(self.buf) > MAX_RECORD_BYTES:
+            raise ValueError(f"Element at byte {self.offset} exceeds {MAX_RECORD_BYTES} bytes")
+
+    def _consume(self, end):
+        self.offset += len(self.buf[self.pos:end].encode("utf-8"))
+        self.pos = end
+
+    def _next_char(self):
+        """Skips whitespace, returns the next significant character (None at end of input)."""
+        while True:
+            start = self.pos
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            self.offset += self.pos - start # whitespace is ASCII
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return None
+            self._fill()
+
+    def __iter__(self):
+        if not self.inside:
+            ch = self._next_char()
+            if ch == "\ufeff": # BOM
+                self._consume(self.pos + 1)
+                ch = self._next_char()
+            if ch != "[":
+                raise ValueError(f"Expected a JSON array at byte {self.offset}, found {ch!r}")
+            self._consume(self.pos + 1)
+            expect_value = True
+        else:
+            # Resume offsets sit right after an element, before its ',' (or the closing ']')
+            expect_value = False
+
+        while True:
+            ch = self._next_char()
+            if ch is None:
+                raise ValueError("Unexpected end of input (array not closed)")
+            if ch == "]":
+                self._consume(self.pos + 1)
+                return
+            if not expect_value:
+                if ch != ",":
+                    raise ValueError(f"Expected ',' or ']' at byte {self.offset}, found {ch!r}")
+                self._consume(self.pos + 1)
+                expect_value = True
+                continue
+            element, end = self._decode()
+            self._consume(end)
+            expect_value = False
+            yield element, self.offset
+
+    def _decode(self):
+        while True:
+            try:
+                element, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number running into the chunk edge parses "successfully" but short
+                if end < len(self.buf) or self.eof:
+                    return element, end
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def checkpoint_path(output_path):
+    return output_path + ".restore.json"
+
 
-    print("Reading JSON...")
-    # Since we can't load 1.7GB easily in some envs, let's try standard load (Python handles large strings better than Node somewhat, but mostly because of 64bit).
-    # If this fails, we need ijson. But let's try standard load first as User machine likely has RAM.
+def write_checkpoint(path, state):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def count_lines(path):
+    count = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                count += 1
+    return count
+
+
+def convert(input_path=INPUT_FILE, output_path=OUTPUT_FILE, resume=False, offset=None, vectors=False,
+            vector_dtype=os.getenv("VECTOR_DTYPE", "float32")):
+    if not os.path.exists(input_path):
+        print(f"Error: {input_path} not found.")
+        return False
+
+    input_bytes = os.path.getsize(input_path)
+    ckpt_path = checkpoint_path(output_path)
+    records = 0
+    start_offset = 0
+    mode = "w"
+
+    if offset is not None:
+        start_offset = offset
+        mode = "a"
+        records = count_lines(output_path) if os.path.exists(output_path) else 0
+        print(f"Starting at byte {start_offset} (appending after {records} existing records)...", flush=True)
+    elif resume and os.path.exists(ckpt_path):
+        with open(ckpt_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("input_bytes") != input_bytes:
+            print("Error: input changed since the checkpoint was written. Run without --resume.")
+            return False
+        start_offset = state["offset"]
+        records = state["records"]
+        # Drop anything written after the last checkpoint (it will be converted again)
+        with open(output_path, "r+b") as f:
+            f.truncate(state["output_bytes"])
+        mode = "a"
+        print(f"Resuming at byte {start_offset} ({records} records already converted)...", flush=True)
+
+    index_path = output_path + ".idx"
+    if mode == "w" and os.path.exists(index_path):
+        os.remove(index_path) # Resume index of the old journals.jsonl (journal_store.py rebuilds it)
+
+    # Vectors can only be streamed on a fresh run; resumed runs rebuild them from the JSONL
+    writer = VectorStoreWriter(os.path.dirname(output_path) or OUTPUT_DIR, dtype=vector_dtype) \
+        if vectors and start_offset == 0 else None
+
+    print(f"Streaming {input_path} ({input_bytes / 1e6:.0f} MB)...", flush=True)
+    start = time.time()
+    new_records = 0
     try:
-        with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        print(f"Loaded {len(data)} records. Writing JSONL...")
-        
-        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            for entry in data:
-                f.write(json.dumps(entry) + '\n')
-        
-        print("Success! JSONL created.")
-    except Exception as e:
-        print(f"Failed to convert: {e}")
+        with open(input_path, "rb") as fin, open(output_path, mode + "b") as fout:
+            reader = JsonArrayReader(fin, start_offset)
+            for entry, end_offset in reader:
+                fout.write((json.dumps(entry) + "\n").encode("utf-8"))
+                if writer:
+                    writer.add(entry)
+                records += 1
+                new_records += 1
+
+                if new_records % CHECKPOINT_EVERY == 0:
+                    fout.flush()
+                    write_checkpoint(ckpt_path, {
+                        "input_bytes": input_bytes,
+                        "offset": end_offset,
+                        "records": records,
+                        "output_bytes": fout.tell(),
+                    })
+                if new_records % PROGRESS_EVERY == 0:
+                    elapsed = time.time() - start
+                    print(f"{records} records, {end_offset / 1e6:.0f}/{input_bytes / 1e6:.0f} MB "
+                          f"({end_offset / input_bytes:.0%}), {new_records / elapsed:.0f} records/s", flush=True)
+    except BaseException as e:
+        if writer:
+            writer.abort()
+        if isinstance(e, Exception):
+            print(f"Failed to convert: {e}")
+            print(f"Re-run with --resume to continue from the last checkpoint ({ckpt_path}).")
+            return False
+        raise
+
+    # Verify: every element read from the input is a line in the output
+    written = count_lines(output_path)
+    if written != records:
+        print(f"Error: {output_path} has {written} records but the input had {records}.")
+        if writer:
+            writer.abort()
+        return False
+    if os.path.exists(ckpt_path):
+        os.remove(ckpt_path)
+    print(f"Success! JSONL created: {records} records (verified) in {time.time() - start:.1f}s.", flush=True)
+
+    if writer:
+        manifest = writer.close(source_path=output_path)
+        print(f"Vector store written: {manifest['rows']} rows ({manifest['embedded']} with embeddings).", flush=True)
+    elif vectors:
+        build_from_jsonl(output_path, os.path.dirname(output_path) or OUTPUT_DIR, dtype=vector_dtype)
+    return True
+
 
 if __name__ == "__main__":
-    convert()
+    parser = argparse.ArgumentParser(description="Convert legacy journals.json to journals.jsonl (streaming)")
+    parser.add_argument("--input", default=INPUT_FILE)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint")
+    parser.add_argument("--offset", type=int, help="Start at this input byte offset (just after an element) and append")
+    parser.add_argument("--vectors", action="store_true", help="Also write the binary vector store")
+    args = parser.parse_args()
+    ok = convert(args.input, args.output, args.resume, args.offset, args.vectors)
+    raise SystemExit(0 if ok else 1)
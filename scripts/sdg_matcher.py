@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import re
+from collections import deque
+
+# Precompiled SDG keyword matcher
+# One Aho-Corasick automaton over every keyword of every SDG: a single pass over the abstract
+# finds all (overlapping) keyword occurrences, instead of compiling and running one `\b...\b`
+# regex per keyword. Semantics match the per-keyword RegExp in analyzeAbstract exactly:
+#   - case-insensitive (per character lower-casing)
+#   - `\b` is an ASCII word boundary ([A-Za-z0-9_]), checked on both sides of each occurrence
+#   - a keyword counts for an SDG once per entry in that SDG's list (duplicates kept, list order)
+# ingest_data.py writes the automaton to web/data/sdg_matcher.json next to sdgs.json; the web app
+# and the Python tools load it instead of rebuilding.
+#
+# Usage: python scripts/sdg_matcher.py [sdgs.json]  (rebuilds sdg_matcher.json from sdgs.json)
+
+OUTPUT_DIR = "web/data"
+MATCHER_FILE = "sdg_matcher.json"
+MATCHER_VERSION = 1
+WORD_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_")
+
+
+def fold(text):
+    """Lower-cases character by character (keeps offsets, unlike str.lower() on e.g. 'İ')."""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+class SDGMatcher:
+    def __init__(self, patterns, targets, goto, fail, out, keyword_lists):
+        self.patterns = patterns # unique folded keywords
+        self.targets = targets # pattern -> [[sdg_id, position in that SDG's list], ...]
+        self.goto = goto # node -> {char: node}
+        self.fail = fail # node -> failure link
+        self.out = out # node -> pattern ids ending here (failure chain merged in)
+        self.keyword_lists = keyword_lists # sdg_id -> keywords, as in sdgs.json
+        self._lengths = [len(p) for p in patterns]
+        self._first_word = [p[0] in WORD_CHARS for p in patterns]
+        self._last_word = [p[-1] in WORD_CHARS for p in patterns]
+
+    @classmethod
+    def build(cls, sdgs):
+        """sdgs: [{ id, keywords }] as written to sdgs.json."""
+        pattern_ids = {}
+        patterns = []
+        targets = []
+        keyword_lists = {}
+        for sdg in sdgs:
+            sdg_id = int(sdg["id"])
+            keyword_lists[sdg_id] = list(sdg.get("keywords") or [])
+            for pos, kw in enumerate(keyword_lists[sdg_id]):
+                key = fold(kw)
+                if not key:
+                    continue
+                if key not in pattern_ids:
+                    pattern_ids[key] = len(patterns)
+                    patterns.append(key)
+                    targets.append([])
+                targets[pattern_ids[key]].append([sdg_id, pos])
+
+        # Trie
+        goto = [{}]
+        out = [[]]
+        for pid, pattern in enumerate(patterns):
+            node = 0
+            for ch in pattern:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                node = nxt
+            out[node].append(pid)
+
+        # Failure links (BFS), outputs of the failure target merged into each node
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0) if node else 0
+                out[nxt] = out[nxt] + out[fail[nxt]]
+        return cls(patterns, targets, goto, fail, out, keyword_lists)
+
+    def iter_matches(self, text):
+        """Yields (pattern id, start, end) for every occurrence that sits on word boundaries."""
+        folded = fold(text)
+        n = len(text)
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        for i, ch in enumerate(folded):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not out[node]:
+                continue
+            end = i + 1
+            after_word = end < n and text[end] in WORD_CHARS
+            for pid in out[node]:
+                start = end - self._lengths[pid]
+                before_word = start > 0 and text[start - 1] in WORD_CHARS
+                # \b on both sides: the word-ness has to flip at the start and at the end
+                if before_word != self._first_word[pid] and after_word != self._last_word[pid]:
+                    yield pid, start, end
+
+    def find_all(self, text):
+        """Every hit: [{ sdg, keyword, start, end }] in text order."""
+        hits = []
+        for pid, start, end in self.iter_matches(text):
+            seen = set()
+            for sdg_id, pos in self.targets[pid]:
+                if sdg_id in seen:
+                    continue
+                seen.add(sdg_id)
+                hits.append({"sdg": sdg_id, "keyword": self.keyword_lists[sdg_id][pos], "start": start, "end": end})
+        return hits
+
+    def keywords_found(self, text):
+        """{ sdg_id: [keywords] } with the same content and order as the per-keyword regex filter."""
+        matched = set(pid for pid, _, _ in self.iter_matches(text))
+        positions = {}
+        for pid in matched:
+            for sdg_id, pos in self.targets[pid]:
+                positions.setdefault(sdg_id, []).append(pos)
+        found = {sdg_id: [] for sdg_id in self.keyword_lists}
+        for sdg_id, pos_list in positions.items():
+            found[sdg_id] = [self.keyword_lists[sdg_id][p] for p in sorted(pos_list)]
+        return found
+
+    def to_json(self):
+        return {
+            "version": MATCHER_VERSION,
+            "wordChars": "ascii",
+            "patterns": self.patterns,
+            "targets": self.targets,
+            "goto": self.goto,
+            "fail": self.fail,
+            "out": self.out,
+            "keywordLists": {str(k): v for k, v in self.keyword_lists.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        if data.get("version") != MATCHER_VERSION:
+            raise ValueError(f"Unsupported matcher version {data.get('version')}")
+        return cls(
+            data["patterns"], data["targets"], data["goto"], data["fail"], data["out"],
+            {int(k): v for k, v in data["keywordLists"].items()},
+        )
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+
+def load_matcher(data_dir=OUTPUT_DIR):
+    """The saved matcher, or one built from sdgs.json if it is missing or out of date."""
+    sdgs_path = os.path.join(data_dir, "sdgs.json")
+    matcher_path = os.path.join(data_dir, MATCHER_FILE)
+    with open(sdgs_path, "r", encoding="utf-8") as f:
+        sdgs = json.load(f)
+    current = {int(s["id"]): list(s.get("keywords") or []) for s in sdgs}
+    if os.path.exists(matcher_path):
+        with open(matcher_path, "r", encoding="utf-8") as f:
+            matcher = SDGMatcher.from_json(json.load(f))
+        if matcher.keyword_lists == current:
+            return matcher
+        print(f"{MATCHER_FILE} is out of date with sdgs.json, rebuilding in memory.", flush=True)
+    return SDGMatcher.build(sdgs)
+
+
+def regex_keywords_found(sdgs, text):
+    """Reference: the per-keyword `\\b...\\b` regex the matcher replaces (ASCII \\b like JS)."""
+    found = {}
+    for sdg in sdgs:
+        found[int(sdg["id"])] = [
+            kw for kw in sdg.get("keywords") or []
+            if re.search(rf"\b{re.escape(kw)}\b", text, re.IGNORECASE | re.ASCII)
+        ]
+    return found
+
+
+def write_matcher(sdgs, data_dir=OUTPUT_DIR):
+    matcher = SDGMatcher.build(sdgs)
+    matcher.save(os.path.join(data_dir, MATCHER_FILE))
+    print(f"SDG matcher written: {len(matcher.patterns)} keywords, {len(matcher.goto)} states.", flush=True)
+    return matcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild sdg_matcher.json from sdgs.json")
+    parser.add_argument("sdgs", nargs="?", default=os.path.join(OUTPUT_DIR, "sdgs.json"),
+                        help="sdgs.json to compile; the matcher is written next to it")
+    args = parser.parse_args()
+    with open(args.sdgs, "r", encoding="utf-8") as f:
+        write_matcher(json.load(f), os.path.dirname(args.sdgs) or ".")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import json
+import multiprocessing
+import os
+import shutil
+import time
+
+from openai import OpenAI
+
+from embedding_backends import make_backend
+from embedding_cache import EmbeddingCache
+from embedding_engine import EmbeddingEngine, OrderedCheckpointWriter, attach_embedding
+from journal_store import JournalStore
+from journal_transform import load_asjc_map, transform_frame
+from metrics import metrics
+from workbook_cache import ensure_cache, iter_range_frames
+
+# Sharded, resumable ingestion for very large outlet lists (ingest_data.py --shards N)
+# 1. plan   - the workbook is streamed once into its Parquet cache (workbook_cache.py) and its rows
+#             are split into N contiguous ranges. The plan (shards/<workbook hash>/plan.json under
+#             the data dir) is keyed by the workbook's hash and the embedding model, so a re-run
+#             resumes it unchanged whatever --shards says.
+# 2. shards - one worker process per range (at most one per core at a time) reads only its row
+#             groups from the cache, transforms them and embeds the rows that are neither in
+#             journals.jsonl nor in its shard file yet. Each shard is its own JournalStore
+#             (shard-0003.jsonl + .idx) checkpointed batch by batch, so an interrupted run only
+#             redoes the unfinished batches of each shard. Workers share the embedding cache
+#             (SQLite WAL); the rate budget (EMBED_RPM/EMBED_TPM) is split between the processes
+#             running at once, and the local backend embeds in the worker itself (one core each).
+# 3. merge  - shard files are appended to journals.jsonl in shard order (= workbook order), then the
+#             shard directory is removed. Rows already in the store are skipped, so a merge that was
+#             interrupted half way is simply run again.
+# ingest_data.py then builds the vector store, indexes and data generation from journals.jsonl as
+# for a single-process run, so the store holds the same rows.
+
+SHARDS_DIR = "shards"
+PLAN_FILE = "plan.json"
+PLAN_VERSION = 1
+MERGE_CHUNK = 1000
+PROGRESS_INTERVAL = 1.0 # Seconds between progress callbacks while shards run
+
+
+def plan_shards(data_dir, digest, model, rows, shards):
+    """(shard dir, plan) for this workbook and model: the existing plan if there is one, else a fresh split."""
+    root = os.path.join(data_dir, SHARDS_DIR)
+    shard_dir = os.path.join(root, digest[:16])
+    plan_path = os.path.join(shard_dir, PLAN_FILE)
+    # Shards of another workbook can never be merged; whatever they embedded is in the embedding cache
+    if os.path.isdir(root):
+        for name in os.listdir(root):
+            if name != os.path.basename(shard_dir):
+                print(f"Removing shards of a previous workbook ({name}).", flush=True)
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    if os.path.exists(plan_path):
+        with open(plan_path, "r", encoding="utf-8") as f:
+            plan = json.load(f)
+        if plan.get("version") == PLAN_VERSION and plan.get("model") == model and plan.get("rows") == rows:
+            print(f"Resuming {len(plan['shards'])} shards in {shard_dir}.", flush=True)
+            return shard_dir, plan
+        shutil.rmtree(shard_dir)
+
+    os.makedirs(shard_dir, exist_ok=True)
+    shards = max(1, min(shards, rows))
+    bounds = [rows * i // shards for i in range(shards + 1)]
+    plan = {
+        "version": PLAN_VERSION,
+        "workbook_sha256": digest,
+        "model": model,
+        "rows": rows,
+        "created": time.time(),
+        "shards": [{"index": i, "start": bounds[i], "stop": bounds[i + 1], "file": f"shard-{i:04d}.jsonl"}
+                   for i in range(shards)],
+    }
+    tmp_path = plan_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(plan, f, indent=2)
+    os.replace(tmp_path, plan_path)
+    print(f"Planned {shards} shards of ~{rows // shards} rows in {shard_dir}.", flush=True)
+    return shard_dir, plan
+
+
+def run_shard(spec):
+    """Worker process: transforms and embeds one row range into its shard file. Returns its counts."""
+    start_time = time.time()
+    # Pool processes run several shards in turn; each summary must cover this shard only
+    metrics.reset()
+    client = None
+    if spec["backend"] == "openai" and os.getenv("OPENAI_API_KEY"):
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    # One process per shard is the parallelism: the local model embeds in this process
+    backend = make_backend(spec["backend"], client, spec["dim"], 1)
+    cache = EmbeddingCache(spec["cache_path"], backend.model)
+
+    existing_names = set()
+    if os.path.exists(spec["store_path"]):
+        existing_names = JournalStore(spec["store_path"], backend.model).load().names
+    store = JournalStore(spec["path"], backend.model).load()
+    if os.path.exists(spec["path"]) and os.path.getsize(spec["path"]) > store.covered:
+        # A torn last line from a killed run: cut it so the next append starts on a fresh line
+        os.truncate(spec["path"], store.covered)
+
+    asjc_map = load_asjc_map(spec["asjc_path"])
+    pending = []
+    live_keys = []
+    rows = 0
+    for frame in iter_range_frames(spec["parquet"], spec["start"], spec["stop"]):
+        with metrics.span("shard.transform", rows=len(frame)):
+            records = transform_frame(frame, asjc_map)
+        for record in records:
+            rows += 1
+            live_keys.append(cache.key(record["content"]))
+            if record["name"] not in existing_names and record["name"] not in store.names:
+                pending.append(record)
+    new = len(pending)
+
+    cached = cache.get_many([r["content"] for r in pending])
+    if cached:
+        for idx, emb in cached.items():
+            attach_embedding(pending[idx], emb, backend.model)
+        with metrics.span("cache.write", rows=len(cached)):
+            store.append_records([pending[idx] for idx in cached])
+        pending = [r for i, r in enumerate(pending) if i not in cached]
+
+    embedded = failed = api_calls = 0
+    if backend.available and pending:
+        options = dict(spec["engine"])
+        options.update(backend.engine_options)
+        engine = EmbeddingEngine(backend.client, backend.model, **options)
+        writer = OrderedCheckpointWriter(spec["path"], store)
+        with metrics.span("shard.embed", rows=len(pending)):
+            failed = len(engine.embed_records(
+                pending, writer,
+                on_embedded=lambda batch: cache.put_many([r["content"] for r in batch], [r["embedding"] for r in batch])
+            ))
+        embedded, api_calls = writer.written, engine.stats["api_calls"]
+    elif pending:
+        store.append_records(pending)
+
+    hits, misses, puts = cache.hits, cache.misses, cache.puts
+    cache.close()
+    backend.close()
+    return {
+        "index": spec["index"],
+        "rows": rows,
+        "new": new,
+        "cached": len(cached),
+        "embedded": embedded,
+        "failed": failed,
+        "api_calls": api_calls,
+        "cache_hits": hits,
+        "cache_misses": misses,
+        "cache_puts": puts,
+        "seconds": time.time() - start_time,
+        "live_keys": live_keys,
+        "metrics": metrics.summary(),
+    }
+
+
+def merge_shards(shard_dir, plan, store):
+    """Appends every shard file to the store in shard order, skipping rows it already has. Returns rows appended."""
+    # Names present before the merge: rows appended by an interrupted merge are skipped on the re-run,
+    # repeated titles within the workbook are kept like in a single-process run
+    present = set(store.names)
+    merged = 0
+    for shard in plan["shards"]:
+        path = os.path.join(shard_dir, shard["file"])
+        if not os.path.exists(path):
+            continue
+        chunk = []
+        for record in JournalStore(path, store.model).iter_records():
+            if record.get("name") in present:
+                continue
+            chunk.append(record)
+            if len(chunk) >= MERGE_CHUNK:
+                merged += store.append_records(chunk)
+                chunk = []
+        merged += store.append_records(chunk)
+    return merged
+
+
+def ingest_sharded(workbook_path, cache_dir, store, cache, backend, asjc_path, shards, engine_options, timer,
+                   progress=None):
+    """
+    Journal stage of ingest() over `shards` worker processes (see the top of this file).
+    engine_options are the EmbeddingEngine settings of a single-process run. Returns the embedding
+    cache keys of every workbook row (never evicted). Exceptions - a failed shard, or one raised by
+    progress - stop the workers and leave the shard files in place for the next run.
+    """
+    data_dir = os.path.dirname(store.path)
+    with timer.phase("read") as info:
+        parquet_path, digest, rows = ensure_cache(workbook_path, cache_dir)
+        info["rows"] = rows
+    shard_dir, plan = plan_shards(data_dir, digest, backend.model, rows, shards)
+
+    processes = min(len(plan["shards"]), os.cpu_count() or 1)
+    engine = dict(engine_options)
+    for budget in ("rpm", "tpm"):
+        if engine.get(budget):
+            engine[budget] = max(1, engine[budget] // processes)
+    specs = [{
+        "index": shard["index"],
+        "start": shard["start"],
+        "stop": shard["stop"],
+        "path": os.path.join(shard_dir, shard["file"]),
+        "parquet": parquet_path,
+        "store_path": store.path,
+        "asjc_path": asjc_path,
+        "cache_path": cache.path,
+        "backend": backend.name,
+        "dim": backend.dim,
+        "engine": engine,
+    } for shard in plan["shards"]]
+
+    live_keys = set()
+    failed = 0
+    with timer.phase("shards") as info:
+        print(f"Running {len(specs)} shards on {processes} processes...", flush=True)
+        # spawn: workers start clean (no copies of this process's threads, SQLite handles or pools)
+        pool = multiprocessing.get_context("spawn").Pool(processes)
+        try:
+            waiting = [pool.apply_async(run_shard, (spec,)) for spec in specs]
+            api_calls = 0
+            while waiting:
+                waiting[0].wait(PROGRESS_INTERVAL)
+                for result in [r for r in waiting if r.ready()]:
+                    waiting.remove(result)
+                    summary = result.get() # Re-raises a worker's exception
+                    info["rows"] += summary["rows"]
+                    api_calls += summary["api_calls"]
+                    failed += summary["failed"]
+                    live_keys.update(summary["live_keys"])
+                    cache.hits += summary["cache_hits"]
+                    cache.misses += summary["cache_misses"]
+                    cache.puts += summary["cache_puts"]
+                    metrics.merge(summary["metrics"])
+                    print(f"Shard {summary['index']}: {summary['rows']} rows, {summary['new']} new "
+                          f"({summary['cached']} cached, {summary['embedded']} embedded, {summary['failed']} failed) "
+                          f"in {summary['seconds']:.1f}s, peak {summary['metrics']['peak_rss_mb']:.0f} MB", flush=True)
+                if progress:
+                    progress("shards", info["rows"], rows, api_calls)
+            pool.close()
+        except BaseException:
+            # Finished batches are already in the shard files; the next run resumes from them
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    if failed:
+        print(f"WARNING: {failed} records failed to embed after retries. "
+              f"Re-run ingestion to retry them.", flush=True)
+
+    with timer.phase("merge") as info:
+        info["rows"] = merge_shards(shard_dir, plan, store)
+    shutil.rmtree(shard_dir)
+    print(f"Merged {info['rows']} new records into {store.path}.", flush=True)
+    return live_keys
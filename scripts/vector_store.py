@@ -0,0 +1,283 @@
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# Binary embedding store
+# journals.jsonl keeps every vector as a JSON float list (~12KB per row), which makes
+# cold starts slow. Next to it we write:
+#   journals.vectors.bin   - contiguous row-major matrix (rows x dim), float32 or float16
+#   journals.meta.jsonl    - one compact JSON line per row, same order, no embedding
+#   journals.manifest.json - dim, rows, dtype, content hashes, the source it was built from and
+#                            the embedding backend/model of its vectors (embedding_backends.py)
+# Readers load the manifest first; the vectors can then be memory-mapped (numpy) or
+# bulk-read in a single call (Node) without any per-line parsing.
+#   journals.generation.json - data generation number, bumped by ingestion once the store and
+#                              every index derived from it are written. The web server watches it
+#                              and swaps the new generation in without a restart.
+
+OUTPUT_DIR = "web/data"
+MANIFEST_FILE = "journals.manifest.json"
+VECTORS_FILE = "journals.vectors.bin"
+META_FILE = "journals.meta.jsonl"
+GENERATION_FILE = "journals.generation.json"
+DIMENSIONS = 1536
+DTYPES = {
+    "float32": np.float32,
+    "float16": np.float16,
+}
+MANIFEST_VERSION = 1
+
+
+def _replace(tmp_path, final_path):
+    # os.replace is atomic on the same filesystem, readers never see a half-written file
+    os.replace(tmp_path, final_path)
+
+
+class VectorStoreWriter:
+    """
+    Streams records (dicts as stored in journals.jsonl) into the binary store.
+    Rows without a usable embedding are written as zero vectors with hasEmbedding=false
+    so row numbers always line up with the metadata file. With `embedding` ({ backend, model, dim })
+    only vectors from that model count as usable (records from before backends existed carry no
+    model and are kept when their dimension matches).
+    """
+
+    def __init__(self, out_dir=OUTPUT_DIR, dim=DIMENSIONS, dtype="float32", embedding=None):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype '{dtype}' (expected one of {sorted(DTYPES)})")
+        self.out_dir = out_dir
+        self.dim = dim
+        self.dtype = dtype
+        self.np_dtype = DTYPES[dtype]
+        self.embedding = embedding
+        self.model = embedding["model"] if embedding else None
+        self.rows = 0
+        self.embedded = 0
+        self.foreign = 0 # Vectors from another model, stored as hasEmbedding=false
+
+        os.makedirs(out_dir, exist_ok=True)
+        self.vectors_path = os.path.join(out_dir, VECTORS_FILE)
+        self.meta_path = os.path.join(out_dir, META_FILE)
+        self.manifest_path = os.path.join(out_dir, MANIFEST_FILE)
+
+        self._vectors_tmp = self.vectors_path + ".tmp"
+        self._meta_tmp = self.meta_path + ".tmp"
+        self._vectors_f = open(self._vectors_tmp, "wb")
+        self._meta_f = open(self._meta_tmp, "w", encoding="utf-8")
+        self._vectors_hash = hashlib.sha256()
+        self._meta_hash = hashlib.sha256()
+        self._zero_row = np.zeros(dim, dtype=self.np_dtype).tobytes()
+
+    def add(self, record):
+        embedding = record.get("embedding")
+        has_embedding = bool(embedding) and len(embedding) == self.dim
+        if has_embedding and self.model and record.get("embedding_model", self.model) != self.model:
+            has_embedding = False
+            self.foreign += 1
+
+        if has_embedding:
+            row_bytes = np.asarray(embedding, dtype=self.np_dtype).tobytes()
+            self.embedded += 1
+        else:
+            row_bytes = self._zero_row
+
+        meta = {k: v for k, v in record.items() if k != "embedding"}
+        meta["hasEmbedding"] = has_embedding
+        meta_line = json.dumps(meta) + "\n"
+
+        self._vectors_f.write(row_bytes)
+        self._vectors_hash.update(row_bytes)
+        self._meta_f.write(meta_line)
+        self._meta_hash.update(meta_line.encode("utf-8"))
+        self.rows += 1
+
+    def abort(self):
+        self._vectors_f.close()
+        self._meta_f.close()
+        for path in (self._vectors_tmp, self._meta_tmp):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def close(self, source_path=None):
+        self._vectors_f.close()
+        self._meta_f.close()
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "dim": self.dim,
+            "rows": self.rows,
+            "embedded": self.embedded,
+            "dtype": self.dtype,
+            "vectors_file": VECTORS_FILE,
+            "meta_file": META_FILE,
+            "vectors_sha256": self._vectors_hash.hexdigest(),
+            "meta_sha256": self._meta_hash.hexdigest(),
+            "created": time.time(),
+        }
+        if self.embedding:
+            manifest["embedding"] = self.embedding
+        if source_path and os.path.exists(source_path):
+            manifest["source"] = {
+                "file": os.path.basename(source_path),
+                "bytes": os.path.getsize(source_path),
+                "mtime": os.path.getmtime(source_path),
+            }
+
+        # Data files first, manifest last: a reader that sees the new manifest always finds matching data
+        _replace(self._vectors_tmp, self.vectors_path)
+        _replace(self._meta_tmp, self.meta_path)
+        manifest_tmp = self.manifest_path + ".tmp"
+        with open(manifest_tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        _replace(manifest_tmp, self.manifest_path)
+        return manifest
+
+
+def build_from_jsonl(jsonl_path, out_dir=OUTPUT_DIR, dtype="float32", dim=DIMENSIONS, embedding=None):
+    """Rebuild the binary store from journals.jsonl in one streaming pass."""
+    print(f"Building binary vector store ({dtype}) from {jsonl_path}...", flush=True)
+    start = time.time()
+    if embedding:
+        dim = embedding["dim"]
+    writer = VectorStoreWriter(out_dir, dim=dim, dtype=dtype, embedding=embedding)
+    try:
+        with open(jsonl_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                writer.add(record)
+    except BaseException:
+        writer.abort()
+        raise
+    manifest = writer.close(source_path=jsonl_path)
+    print(f"Vector store written: {manifest['rows']} rows ({manifest['embedded']} with embeddings) "
+          f"in {time.time() - start:.1f}s", flush=True)
+    if writer.foreign:
+        print(f"WARNING: {writer.foreign} vectors came from another embedding model and were left out. "
+              f"Re-run ingestion with --upsert to re-embed them.", flush=True)
+    return manifest
+
+
+def load_manifest(data_dir=OUTPUT_DIR):
+    path = os.path.join(data_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def is_fresh(data_dir=OUTPUT_DIR, jsonl_path=None):
+    """True if the manifest was built from the current journals.jsonl (same size and mtime)."""
+    manifest = load_manifest(data_dir)
+    if manifest is None:
+        return False
+    if jsonl_path is None:
+        jsonl_path = os.path.join(data_dir, "journals.jsonl")
+    source = manifest.get("source")
+    if not source or not os.path.exists(jsonl_path):
+        return source is None
+    # mtime too: an --upsert rewrite can leave the size unchanged
+    return source.get("bytes") == os.path.getsize(jsonl_path) and source.get("mtime") == os.path.getmtime(jsonl_path)
+
+
+def index_info(data_dir, index_file, manifest=None):
+    """
+    Header of a derived index (journals.lex.json, journals.ivf.json, ...) if it was built from the
+    current vector store (every store_*_sha256 it records matches the manifest), else None.
+    """
+    path = os.path.join(data_dir, index_file)
+    if manifest is None:
+        manifest = load_manifest(data_dir)
+    if manifest is None or not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        info = json.load(f)
+    keys = [k for k in ("vectors_sha256", "meta_sha256") if "store_" + k in info]
+    if not keys or any(info["store_" + k] != manifest.get(k) for k in keys):
+        return None
+    return info
+
+
+def load_generation(data_dir=OUTPUT_DIR):
+    path = os.path.join(data_dir, GENERATION_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_generation(data_dir=OUTPUT_DIR, changed=True):
+    """
+    Publishes the current store as a new data generation. Call it last: everything a reader loads
+    with the store (indexes, sdgs.json, exclusions) must already be in place.
+    changed=False (nothing but the store could have changed) keeps the current generation when it
+    already has this store: readers would reload everything and drop their caches for nothing.
+    Returns the new generation, or None when nothing was published.
+    """
+    manifest = load_manifest(data_dir)
+    if manifest is None:
+        return None
+    previous = load_generation(data_dir)
+    if not changed and previous and previous.get("vectors_sha256") == manifest["vectors_sha256"] \
+            and previous.get("meta_sha256") == manifest["meta_sha256"]:
+        return None
+    generation = {
+        "generation": (previous["generation"] if previous else 0) + 1,
+        "created": time.time(),
+        "rows": manifest["rows"],
+        # Readers only swap in a store whose manifest matches (a later rebuild may be half done)
+        "vectors_sha256": manifest["vectors_sha256"],
+        "meta_sha256": manifest["meta_sha256"],
+    }
+    path = os.path.join(data_dir, GENERATION_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(generation, f, indent=2)
+    _replace(path + ".tmp", path)
+    return generation
+
+
+def load_vectors(data_dir=OUTPUT_DIR, mmap=True):
+    """Returns (manifest, matrix) where matrix has shape (rows, dim)."""
+    manifest = load_manifest(data_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No {MANIFEST_FILE} in {data_dir}")
+    path = os.path.join(data_dir, manifest["vectors_file"])
+    dtype = DTYPES[manifest["dtype"]]
+    shape = (manifest["rows"], manifest["dim"])
+    if manifest["rows"] == 0:
+        return manifest, np.zeros(shape, dtype=dtype)
+    if mmap:
+        matrix = np.memmap(path, dtype=dtype, mode="r", shape=shape)
+    else:
+        matrix = np.fromfile(path, dtype=dtype).reshape(shape)
+    return manifest, matrix
+
+
+def iter_metadata(data_dir=OUTPUT_DIR, manifest=None):
+    if manifest is None:
+        manifest = load_manifest(data_dir)
+    with open(os.path.join(data_dir, manifest["meta_file"]), "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+if __name__ == "__main__":
+    # Usage: python scripts/vector_store.py [float32|float16]
+    # Keeps the embedding model of the current store (EMBED_BACKEND / LOCAL_EMBED_DIM when there is none)
+    from embedding_backends import make_backend
+
+    dtype = sys.argv[1] if len(sys.argv) > 1 else os.getenv("VECTOR_DTYPE", "float32")
+    current = load_manifest(OUTPUT_DIR)
+    embedding = (current or {}).get("embedding") or \
+        make_backend(os.getenv("EMBED_BACKEND", "openai"), dim=int(os.getenv("LOCAL_EMBED_DIM", "0")) or None).describe()
+    build_from_jsonl(os.path.join(OUTPUT_DIR, "journals.jsonl"), OUTPUT_DIR, dtype=dtype, embedding=embedding)
+    write_generation(OUTPUT_DIR)
@@ -0,0 +1,143 @@
+import glob
+import hashlib
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from journal_transform import CHUNK_SIZE, FIELDS, iter_workbook_frames
+
+# Typed Parquet cache for the Scopus outlet workbook
+# - keyed by the workbook's SHA-256 (journals_cache.<hash>.parquet), not mtime, so a re-upload of
+#   the same file still hits and any edit misses
+# - every field is stored as a nullable string column: missing cells stay null (no "nan" strings)
+#   and ASJC/source ids keep their exact text
+# - written in the same pass that streams the workbook with openpyxl (one row group per chunk)
+# - reads only the columns ingestion needs, chunk by chunk
+
+CACHE_PREFIX = "journals_cache"
+SCHEMA = pa.schema([(field, pa.string()) for field in FIELDS])
+
+
+def workbook_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_path_for(cache_dir, digest):
+    return os.path.join(cache_dir, f"{CACHE_PREFIX}.{digest[:16]}.parquet")
+
+
+def _to_table(frame):
+    columns = {}
+    for field in FIELDS:
+        if field in frame.columns:
+            columns[field] = frame[field].tolist() # Already text (iter_workbook_frames)
+        else:
+            columns[field] = [None] * len(frame)
+    return pa.Table.from_pydict(columns, schema=SCHEMA)
+
+
+def iter_cached_frames(cache_path, chunk_size=CHUNK_SIZE, columns=None):
+    """Yields DataFrames of `chunk_size` rows from the Parquet cache, reading only `columns`."""
+    pf = pq.ParquetFile(cache_path)
+    available = set(pf.schema_arrow.names)
+    wanted = [c for c in (columns or FIELDS) if c in available]
+    for batch in pf.iter_batches(batch_size=chunk_size, columns=wanted):
+        yield batch.to_pandas()
+
+
+def iter_range_frames(cache_path, start, stop, columns=None):
+    """Yields DataFrames covering rows [start, stop) of the Parquet cache, reading only the row groups they span."""
+    pf = pq.ParquetFile(cache_path)
+    available = set(pf.schema_arrow.names)
+    wanted = [c for c in (columns or FIELDS) if c in available]
+    offset = 0
+    for group in range(pf.num_row_groups):
+        rows = pf.metadata.row_group(group).num_rows
+        lo, hi = max(start, offset), min(stop, offset + rows)
+        if lo < hi:
+            frame = pf.read_row_group(group, columns=wanted).to_pandas()
+            yield frame.iloc[lo - offset:hi - offset].reset_index(drop=True)
+        offset += rows
+        if offset >= stop:
+            break
+
+
+def iter_workbook_frames_caching(workbook_path, cache_path, chunk_size=CHUNK_SIZE):
+    """
+    Streams the workbook with openpyxl and writes every chunk to the Parquet cache as it goes.
+    The cache only appears (atomic rename) once the whole workbook has been read.
+    """
+    tmp_path = cache_path + ".tmp"
+    writer = pq.ParquetWriter(tmp_path, SCHEMA, compression="zstd")
+    rows = 0
+    try:
+        for frame in iter_workbook_frames(workbook_path, chunk_size):
+            writer.write_table(_to_table(frame))
+            rows += len(frame)
+            yield frame
+        writer.close()
+        writer = None
+        os.replace(tmp_path, cache_path)
+        _remove_stale(cache_path)
+        print(f"Parquet cache written: {cache_path} ({rows} rows)", flush=True)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _remove_stale(current_path):
+    cache_dir = os.path.dirname(current_path)
+    for path in glob.glob(os.path.join(cache_dir, f"{CACHE_PREFIX}.*.parquet")):
+        if os.path.abspath(path) != os.path.abspath(current_path):
+            os.remove(path)
+    # Superseded CSV cache
+    legacy_csv = os.path.join(cache_dir, f"{CACHE_PREFIX}.csv")
+    if os.path.exists(legacy_csv):
+        os.remove(legacy_csv)
+
+
+def _usable_cache(cache_path):
+    if not os.path.exists(cache_path):
+        return False
+    try:
+        rows = pq.ParquetFile(cache_path).metadata.num_rows
+        print(f"Found Parquet cache {os.path.basename(cache_path)} ({rows} rows). Loading fast...", flush=True)
+        return True
+    except Exception as e:
+        print(f"WARNING: Parquet cache unreadable ({e}). Rebuilding from Excel.", flush=True)
+        os.remove(cache_path)
+        return False
+
+
+def iter_journal_frames(workbook_path, cache_dir, chunk_size=CHUNK_SIZE):
+    """
+    Frames of the outlet workbook: from the Parquet cache when it matches the workbook's content
+    hash, otherwise streamed from Excel (building the cache on the way).
+    """
+    cache_path = cache_path_for(cache_dir, workbook_hash(workbook_path))
+    if _usable_cache(cache_path):
+        return iter_cached_frames(cache_path, chunk_size)
+    print("Reading Excel file (Streaming Mode - Low Memory), building Parquet cache...", flush=True)
+    return iter_workbook_frames_caching(workbook_path, cache_path, chunk_size)
+
+
+def ensure_cache(workbook_path, cache_dir, chunk_size=CHUNK_SIZE):
+    """
+    (cache path, workbook hash, rows), streaming the workbook into the Parquet cache first if needed.
+    Sharded ingestion (shard_ingest.py) reads row ranges of the cache in parallel; Excel itself can
+    only be streamed from the top.
+    """
+    digest = workbook_hash(workbook_path)
+    cache_path = cache_path_for(cache_dir, digest)
+    if not _usable_cache(cache_path):
+        print("Reading Excel file (Streaming Mode - Low Memory), building Parquet cache...", flush=True)
+        for _ in iter_workbook_frames_caching(workbook_path, cache_path, chunk_size):
+            pass
+    return cache_path, digest, pq.ParquetFile(cache_path).metadata.num_rows
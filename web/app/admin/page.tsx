@@ -1,6 +1,7 @@
 "use client";
 
 import { useState, useEffect } from 'react';
+import type { IngestJob, IngestStatus } from '@/lib/ingestJobs';
 
 interface AdminJournal {
     id: string;
@@ -17,6 +18,36 @@ export default function AdminPage() {
     const [loading, setLoading] = useState(false);
 
     const [uploading, setUploading] = useState(false);
+    const [ingest, setIngest] = useState<IngestStatus | null>(null);
+
+    const fetchIngest = async () => {
+        try {
+            const res = await fetch('/api/admin/ingest');
+            setIngest(await res.json());
+        } catch { }
+    };
+
+    const ingestActive = !!ingest && (!!ingest.running || ingest.queued.length > 0);
+
+    // Poll while a job is queued or running
+    useEffect(() => {
+        fetchIngest();
+    }, []);
+
+    useEffect(() => {
+        if (!ingestActive) return;
+        const t = setInterval(fetchIngest, 2000);
+        return () => clearInterval(t);
+    }, [ingestActive]);
+
+    const cancelIngest = async (id: string) => {
+        await fetch('/api/admin/ingest', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ action: 'cancel', id })
+        });
+        fetchIngest();
+    };
 
     const handleUpload = async (e: React.ChangeEvent<HTMLInputElement>) => {
         if (!e.target.files?.[0]) return;
@@ -31,7 +62,7 @@ export default function AdminPage() {
             });
             const data = await res.json();
             if (res.ok) {
-                alert("Upload successful! Ingestion started background.");
+                fetchIngest();
             } else {
                 alert("Upload failed: " + data.error);
             }
@@ -93,6 +124,10 @@ export default function AdminPage() {
                     </div>
                 </div>
 
+                {ingest && (ingest.running || ingest.queued.length > 0 || ingest.recent.length > 0) && (
+                    <IngestPanel status={ingest} onCancel={cancelIngest} />
+                )}
+
                 <div className="space-y-4">
                     <input
                         type="text"
@@ -161,3 +196,58 @@ export default function AdminPage() {
         </main>
     );
 }
+
+function formatEta(seconds: number | null) {
+    if (seconds == null) return "";
+    if (seconds < 60) return `~${Math.ceil(seconds)}s left`;
+    return `~${Math.ceil(seconds / 60)} min left`;
+}
+
+function IngestPanel({ status, onCancel }: { status: IngestStatus; onCancel: (id: string) => void }) {
+    const job: IngestJob | undefined = status.running || status.recent[0];
+    if (!job) return null;
+    const pct = job.rows_total ? Math.min(100, Math.round(100 * (job.rows_done || 0) / job.rows_total)) : null;
+    const active = job.status === 'running' || job.status === 'queued';
+
+    return (
+        <div className="border border-gray-200 dark:border-white/10 rounded p-4 bg-white dark:bg-transparent shadow-sm dark:shadow-none space-y-2">
+            <div className="flex justify-between items-center">
+                <div className="font-semibold">
+                    Ingestion: <span className="capitalize">{job.status}</span>
+                    {job.status === 'running' && job.phase && <span className="text-gray-600 dark:text-gray-400 font-normal"> · {job.phase}</span>}
+                    {job.cancel_requested && active && <span className="text-gray-600 dark:text-gray-400 font-normal"> · cancelling...</span>}
+                </div>
+                {active && !job.cancel_requested && (
+                    <button
+                        onClick={() => onCancel(job.id)}
+                        className="px-3 py-1 rounded text-sm font-medium text-white transition-colors bg-red-600 hover:bg-red-500"
+                    >
+                        Cancel
+                    </button>
+                )}
+            </div>
+            {job.status === 'running' && (
+                <>
+                    {pct != null && (
+                        <div className="w-full h-2 bg-gray-200 dark:bg-white/10 rounded overflow-hidden">
+                            <div className="h-full bg-blue-600 transition-all" style={{ width: `${pct}%` }} />
+                        </div>
+                    )}
+                    <div className="text-sm text-gray-600 dark:text-gray-400">
+                        {job.rows_done ?? 0}{job.rows_total ? ` / ${job.rows_total}` : ""} rows
+                        {job.api_calls ? ` · ${job.api_calls} API calls` : ""}
+                        {job.eta_seconds != null ? ` · ${formatEta(job.eta_seconds)}` : ""}
+                    </div>
+                </>
+            )}
+            {job.status === 'failed' && job.error && (
+                <div className="text-sm text-red-700 dark:text-red-400">{job.error}</div>
+            )}
+            {status.queued.length > 0 && (
+                <div className="text-sm text-gray-600 dark:text-gray-400">
+                    {status.queued.length} upload{status.queued.length > 1 ? "s" : ""} queued
+                </div>
+            )}
+        </div>
+    );
+}
@@ -0,0 +1,10 @@
+import { NextResponse } from 'next/server';
+import { getDataGeneration } from '@/lib/recommender';
+import { analysisCacheStats } from '@/lib/resultCache';
+
+export const dynamic = 'force-dynamic';
+
+// Hit/miss counters of the analysis caches (query embeddings, ranked results), for monitoring
+export async function GET() {
+    return NextResponse.json({ generation: getDataGeneration(), ...analysisCacheStats() });
+}
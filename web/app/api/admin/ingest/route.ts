@@ -0,0 +1,24 @@
+import { NextResponse } from 'next/server';
+import { cancelIngest, readIngestStatus } from '@/lib/ingestJobs';
+
+export const dynamic = 'force-dynamic';
+
+// GET: current ingest job, queue and recent jobs (cheap: one small JSON file)
+export async function GET() {
+    return NextResponse.json(readIngestStatus());
+}
+
+// POST { action: 'cancel', id }: queued jobs are dropped, a running one stops at its next checkpoint
+export async function POST(req: Request) {
+    try {
+        const { action, id } = await req.json();
+        if (action !== 'cancel' || typeof id !== 'string' || !/^[0-9a-f]+$/.test(id)) {
+            return NextResponse.json({ error: "Invalid request" }, { status: 400 });
+        }
+        const job = await cancelIngest(id);
+        return NextResponse.json({ success: true, job });
+    } catch (e: any) {
+        console.error(e);
+        return NextResponse.json({ error: e.message }, { status: 500 });
+    }
+}
@@ -1,5 +1,5 @@
 import { NextResponse } from 'next/server';
-import { getJournals, ensureDataLoaded } from '@/lib/recommender';
+import { getJournals, ensureDataLoaded, filterJournalRows, getJournalSearchTexts } from '@/lib/recommender';
 import fs from 'fs';
 import path from 'path';
 
@@ -26,13 +26,20 @@ export async function GET(req: Request) {
         }
     } catch { }
 
-    // Filter
+    // Filter: facet bitmaps first (?sdg=13&asjc=2100), then the precomputed lowercase name/publisher text
+    const sdgFilter = searchParams.getAll('sdg').map(Number).filter(Number.isInteger);
+    const asjcFilter = searchParams.getAll('asjc').map(Number).filter(Number.isInteger);
+    const facetFiltered = sdgFilter.length > 0 || asjcFilter.length > 0;
+    const facetRows = facetFiltered ? filterJournalRows({ sdgs: sdgFilter, asjc: asjcFilter }) : null;
+    if (facetFiltered && !facetRows) {
+        // Missing or stale facet index: never pass the whole catalog off as the filtered result
+        return NextResponse.json({ error: 'Facet index not built', facets_unavailable: true }, { status: 503 });
+    }
     let filtered = allJournals;
-    if (q) {
-        filtered = allJournals.filter(j =>
-            j.name.toLowerCase().includes(q) ||
-            (j.publisher && j.publisher.toLowerCase().includes(q))
-        );
+    if (q || facetRows) {
+        const texts = getJournalSearchTexts();
+        const rows = facetRows ?? allJournals.map((_, i) => i);
+        filtered = rows.filter(i => !q || texts[i].includes(q)).map(i => allJournals[i]);
     }
 
     // Paginate
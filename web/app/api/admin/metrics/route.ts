@@ -0,0 +1,9 @@
+import { NextResponse } from 'next/server';
+import { metrics } from '@/lib/metrics';
+
+export const dynamic = 'force-dynamic';
+
+// Stage latency histograms (analyze.*, data.*), counters and peak memory of this server process
+export async function GET() {
+    return NextResponse.json(metrics.summary());
+}
@@ -1,11 +1,9 @@
 import { NextResponse } from 'next/server';
-import { writeFile } from 'fs/promises';
+import { mkdir, writeFile } from 'fs/promises';
 import path from 'path';
-import { exec } from 'child_process';
-import util from 'util';
+import { submitIngest } from '@/lib/ingestJobs';
 
-const execAsync = util.promisify(exec);
-const RESOURCES_DIR = path.join(process.cwd(), 'resources'); // /app/resources
+const UPLOADS_DIR = path.join(process.cwd(), 'resources', 'uploads'); // /app/resources/uploads
 
 export async function POST(req: Request) {
     try {
@@ -16,33 +14,16 @@ export async function POST(req: Request) {
             return NextResponse.json({ error: "No file uploaded" }, { status: 400 });
         }
 
+        // Each upload gets its own file: the live workbook is only replaced when its job starts,
+        // so an upload arriving mid-ingest waits in the queue instead of changing the input under it
         const buffer = Buffer.from(await file.arrayBuffer());
-        const filePath = path.join(RESOURCES_DIR, "List Scopus Outlet.xlsx");
-
-        // Save file (overwrite)
+        await mkdir(UPLOADS_DIR, { recursive: true });
+        const filePath = path.join(UPLOADS_DIR, `${Date.now()}.xlsx`);
         await writeFile(filePath, buffer);
         console.log(`Saved file to ${filePath}`);
 
-        // Trigger Ingestion (Background?)
-        // If we await, it might timeout the request.
-        // But user wants to know if it succeeds.
-        // Ingest takes time. Let's return success and run in background, 
-        // OR run small batch.
-        // The script is robust now.
-        // Let's spawn it detached?
-        // Or just run it and hope it's fast (it won't be if partial).
-        // Let's run it non-blocking and return "Ingestion Started".
-
-        exec('python3 scripts/ingest_data.py', { cwd: '/app' }, (error, stdout, stderr) => {
-            if (error) {
-                console.error(`Ingestion error: ${error}`);
-                return;
-            }
-            console.log(`Ingestion output: ${stdout}`);
-            if (stderr) console.error(`Ingestion stderr: ${stderr}`);
-        });
-
-        return NextResponse.json({ success: true, message: "File uploaded. Ingestion started in background." });
+        const jobId = await submitIngest(filePath);
+        return NextResponse.json({ success: true, jobId, message: "File uploaded. Ingestion queued." });
 
     } catch (e: any) {
         console.error(e);
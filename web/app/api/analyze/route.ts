@@ -1,9 +1,9 @@
 import { NextResponse } from 'next/server';
-import { analyzeAbstract } from '@/lib/recommender';
+import { analyzeAbstract, FacetsUnavailableError } from '@/lib/recommender';
 
 export async function POST(req: Request) {
     try {
-        const { abstract, topK } = await req.json();
+        const { abstract, topK, filters } = await req.json();
 
         if (!abstract) {
             return NextResponse.json({ error: 'Abstract required' }, { status: 400 });
@@ -12,9 +12,14 @@ export async function POST(req: Request) {
         // Limit topK
         const k = Math.min(Math.max(topK, 1), 20);
 
-        const result = await analyzeAbstract(abstract, k);
+        // Optional facets: { sdgs: [13], asjc: [2100] } (see JournalFilters)
+        const ints = (v: any) => Array.isArray(v) ? v.map(Number).filter(Number.isInteger) : [];
+        const result = await analyzeAbstract(abstract, k, { sdgs: ints(filters?.sdgs), asjc: ints(filters?.asjc) });
         return NextResponse.json(result);
     } catch (e: any) {
+        if (e instanceof FacetsUnavailableError) {
+            return NextResponse.json({ error: e.message, facets_unavailable: true }, { status: 503 });
+        }
         console.error(e);
         return NextResponse.json({ error: e.message }, { status: 500 });
     }
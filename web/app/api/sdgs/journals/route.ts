@@ -0,0 +1,26 @@
+import { NextResponse } from 'next/server';
+import { getSdgJournals } from '@/lib/recommender';
+
+export const dynamic = 'force-dynamic';
+
+// GET ?sdg=7[&asjc=2100][&topK=10]: journals closest to one SDG (precomputed affinity, no abstract)
+export async function GET(req: Request) {
+    try {
+        const { searchParams } = new URL(req.url);
+        const sdg = Number(searchParams.get('sdg'));
+        if (!Number.isInteger(sdg)) {
+            return NextResponse.json({ error: 'sdg required' }, { status: 400 });
+        }
+        const k = Math.min(Math.max(parseInt(searchParams.get('topK') || '10'), 1), 50);
+        const asjc = searchParams.getAll('asjc').map(Number).filter(Number.isInteger);
+
+        const journals = await getSdgJournals(sdg, k, asjc);
+        if (!journals) {
+            return NextResponse.json({ error: 'Facet index not built' }, { status: 503 });
+        }
+        return NextResponse.json({ sdg, journals });
+    } catch (e: any) {
+        console.error(e);
+        return NextResponse.json({ error: e.message }, { status: 500 });
+    }
+}
@@ -0,0 +1,68 @@
+import { execFile, spawn } from 'child_process';
+import fs from 'fs';
+import path from 'path';
+import util from 'util';
+
+// Thin wrapper over scripts/ingest_jobs.py: uploads become queued jobs that one worker at a time
+// runs under the ingest writer lock. Status is read from the JSON snapshot the jobs write
+// (ingest_status.json), so polling never touches Python or SQLite.
+
+const execFileAsync = util.promisify(execFile);
+const APP_DIR = '/app'; // Where scripts/ lives (same cwd the ingest always ran with)
+const DATA_DIR = path.join(process.cwd(), 'data');
+const STATUS_PATH = path.join(DATA_DIR, 'ingest_status.json');
+const JOBS_SCRIPT = 'scripts/ingest_jobs.py';
+
+export type JobState = 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled';
+
+export interface IngestJob {
+    id: string;
+    status: JobState;
+    options: { workbook: string | null; upsert: boolean; backend: string | null };
+    created: number;
+    started: number | null;
+    finished: number | null;
+    cancel_requested: boolean;
+    phase: string | null;
+    rows_done: number | null;
+    rows_total: number | null;
+    api_calls: number | null;
+    eta_seconds: number | null;
+    error: string | null;
+}
+
+export interface IngestStatus {
+    updated: number | null;
+    running: IngestJob | null;
+    queued: IngestJob[];
+    recent: IngestJob[];
+}
+
+async function runJobs(args: string[]): Promise<any> {
+    const { stdout } = await execFileAsync('python3', [JOBS_SCRIPT, ...args, '--status-dir', DATA_DIR], { cwd: APP_DIR });
+    return JSON.parse(stdout.trim().split('\n').pop() || '{}');
+}
+
+export async function submitIngest(workbook: string): Promise<string> {
+    const { id } = await runJobs(['submit', '--workbook', workbook]);
+    // Detached worker: exits at once if another one holds the writer lock (that one drains the queue)
+    const worker = spawn('python3', [JOBS_SCRIPT, 'worker', '--status-dir', DATA_DIR], {
+        cwd: APP_DIR,
+        detached: true,
+        stdio: 'ignore',
+    });
+    worker.unref();
+    return id;
+}
+
+export async function cancelIngest(id: string): Promise<IngestJob> {
+    return runJobs(['cancel', '--id', id]);
+}
+
+export function readIngestStatus(): IngestStatus {
+    try {
+        return JSON.parse(fs.readFileSync(STATUS_PATH, 'utf-8'));
+    } catch {
+        return { updated: null, running: null, queued: [], recent: [] };
+    }
+}
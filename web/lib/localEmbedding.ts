@@ -0,0 +1,57 @@
+// Local hashed n-gram embedding (same function as scripts/embedding_backends.py local_embed)
+// Used at query time when the vector store was built with EMBED_BACKEND=local: no API call, no key.
+// Word unigrams, word bigrams and character trigrams of lowercase ASCII words (3+ chars) are hashed
+// with crc32 into `dim` signed buckets, weighted 1 + ln(tf) per feature type, then L2-normalized.
+// Any change here must be mirrored in the Python version (and LOCAL_MODEL_VERSION bumped there).
+
+const MIN_WORD_LEN = 3;
+const FEATURE_WEIGHTS: Record<string, number> = { w: 1.0, b: 0.7, c: 0.3 };
+
+let crcTable: Uint32Array | null = null;
+function getCrcTable(): Uint32Array {
+    if (crcTable) return crcTable;
+    crcTable = new Uint32Array(256);
+    for (let n = 0; n < 256; n++) {
+        let c = n;
+        for (let k = 0; k < 8; k++) c = (c & 1) ? (0xedb88320 ^ (c >>> 1)) : (c >>> 1);
+        crcTable[n] = c >>> 0;
+    }
+    return crcTable;
+}
+
+// zlib.crc32 of an ASCII string (features are built from [a-z0-9], ' ', ':', '<' and '>')
+function crc32(text: string): number {
+    const table = getCrcTable();
+    let crc = 0xffffffff;
+    for (let i = 0; i < text.length; i++) crc = table[(crc ^ text.charCodeAt(i)) & 0xff] ^ (crc >>> 8);
+    return (crc ^ 0xffffffff) >>> 0;
+}
+
+function hashedFeatures(text: string): Map<string, number> {
+    const words = (text.toLowerCase().match(/[a-z0-9]+/g) || []).filter(w => w.length >= MIN_WORD_LEN);
+    const features = new Map<string, number>();
+    const add = (f: string) => features.set(f, (features.get(f) || 0) + 1);
+    for (const w of words) add('w:' + w);
+    for (let i = 0; i + 1 < words.length; i++) add(`b:${words[i]} ${words[i + 1]}`);
+    for (const w of words) {
+        const padded = `<${w}>`;
+        for (let i = 0; i + 3 <= padded.length; i++) add('c:' + padded.slice(i, i + 3));
+    }
+    return features;
+}
+
+export function localEmbed(text: string, dim: number): number[] {
+    const vec = new Float64Array(dim);
+    hashedFeatures(text).forEach((tf, feature) => {
+        const h = crc32(feature);
+        const weight = (1 + Math.log(tf)) * FEATURE_WEIGHTS[feature[0]];
+        // Top bit picks the sign so colliding features cancel out on average
+        vec[h % dim] += (h >>> 31) ? -weight : weight;
+    });
+    let norm = 0;
+    for (let i = 0; i < dim; i++) norm += vec[i] * vec[i];
+    norm = Math.sqrt(norm);
+    const out = new Array(dim);
+    for (let i = 0; i < dim; i++) out[i] = norm > 0 ? Math.fround(vec[i] / norm) : 0;
+    return out;
+}
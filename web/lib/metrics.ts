@@ -0,0 +1,114 @@
+import fs from 'fs';
+
+// Analysis metrics: latency histograms, counters and memory samples (same model as scripts/metrics.py)
+//   metrics.start('analyze.scan')(attrs) - span: observes the seconds between start() and the call
+//   metrics.observe(name, seconds)       - stages timed by hand
+//   metrics.count(name, n)               - counters (requests, rows scanned, cache hits, ...)
+// ANALYZE_TRACE=trace.jsonl appends every observation and memory sample as one JSON line, in the
+// ingest trace format. GET /api/admin/metrics returns summary().
+
+const TRACE_FILE = process.env.ANALYZE_TRACE || "";
+const MEMORY_SAMPLE_MS = parseInt(process.env.METRICS_MEMORY_SAMPLE_MS || "5000", 10); // 0: no sampling
+const BUCKETS = Array.from({ length: 21 }, (_, i) => 0.0001 * 2 ** i); // Upper bounds in seconds
+
+class Histogram {
+    counts = new Array(BUCKETS.length + 1).fill(0);
+    n = 0;
+    total = 0;
+    min = Infinity;
+    max = 0;
+
+    observe(seconds: number) {
+        let i = 0;
+        while (i < BUCKETS.length && BUCKETS[i] < seconds) i++;
+        this.counts[i]++;
+        this.n++;
+        this.total += seconds;
+        this.min = Math.min(this.min, seconds);
+        this.max = Math.max(this.max, seconds);
+    }
+
+    // Upper bound of the bucket holding the q-quantile (capped at the observed max)
+    quantile(q: number) {
+        if (this.n === 0) return 0;
+        const rank = q * this.n;
+        let seen = 0;
+        for (let i = 0; i < this.counts.length; i++) {
+            seen += this.counts[i];
+            if (seen >= rank) return Math.min(i < BUCKETS.length ? BUCKETS[i] : this.max, this.max);
+        }
+        return this.max;
+    }
+
+    summary() {
+        const buckets: Record<string, number> = {};
+        this.counts.forEach((c, i) => {
+            if (c) buckets[i < BUCKETS.length ? String(+BUCKETS[i].toPrecision(6)) : 'inf'] = c;
+        });
+        return {
+            count: this.n,
+            sum: this.total,
+            min: this.n ? this.min : 0,
+            max: this.max,
+            p50: this.quantile(0.5),
+            p95: this.quantile(0.95),
+            p99: this.quantile(0.99),
+            buckets,
+        };
+    }
+}
+
+class Metrics {
+    private histograms = new Map<string, Histogram>();
+    private counters: Record<string, number> = {};
+    private peakRssMb = 0;
+    private trace: fs.WriteStream | null = null;
+    private started = Date.now();
+
+    constructor() {
+        if (TRACE_FILE) this.trace = fs.createWriteStream(TRACE_FILE, { flags: 'a' });
+        if (MEMORY_SAMPLE_MS > 0) setInterval(() => this.sampleMemory(), MEMORY_SAMPLE_MS).unref();
+    }
+
+    private emit(event: Record<string, any>) {
+        if (this.trace) this.trace.write(JSON.stringify({ ts: Date.now() / 1000, ...event }) + '\n');
+    }
+
+    observe(name: string, seconds: number, attrs: Record<string, any> = {}) {
+        let hist = this.histograms.get(name);
+        if (!hist) this.histograms.set(name, hist = new Histogram());
+        hist.observe(seconds);
+        this.emit({ type: 'span', name, seconds, ...attrs });
+    }
+
+    start(name: string) {
+        const t0 = performance.now();
+        return (attrs: Record<string, any> = {}) => this.observe(name, (performance.now() - t0) / 1000, attrs);
+    }
+
+    count(name: string, n: number = 1) {
+        this.counters[name] = (this.counters[name] || 0) + n;
+    }
+
+    sampleMemory() {
+        const rssMb = process.memoryUsage().rss / (1024 * 1024);
+        this.peakRssMb = Math.max(this.peakRssMb, rssMb);
+        this.emit({ type: 'memory', rss_mb: Math.round(rssMb * 10) / 10 });
+    }
+
+    summary() {
+        this.sampleMemory();
+        const histograms: Record<string, ReturnType<Histogram['summary']>> = {};
+        Array.from(this.histograms.keys()).sort().forEach(name => { histograms[name] = this.histograms.get(name)!.summary(); });
+        return {
+            ts: Date.now() / 1000,
+            type: 'summary',
+            seconds: (Date.now() - this.started) / 1000,
+            peak_rss_mb: Math.round(this.peakRssMb * 10) / 10,
+            counters: { ...this.counters },
+            histograms,
+        };
+    }
+}
+
+export const metrics = new Metrics();
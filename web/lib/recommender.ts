@@ -1,17 +1,34 @@
+import crypto from 'crypto';
 import fs from 'fs';
 import path from 'path';
 import readline from 'readline';
 import OpenAI from 'openai';
 import { Journal, SDG, AnalysisResult } from './types';
+import { SdgMatcher, loadSdgMatcher, matchSdgKeywords } from './sdgMatcher';
+import { localEmbed } from './localEmbedding';
+import { abstractKey, embeddingCache, resultCache } from './resultCache';
+import { metrics } from './metrics';
 
 // Singleton Data Cache
 // Optimization: Matrix-based storage
 const DIMENSIONS = 1536;
-const MAX_JOURNALS = 100000; // Cap at 100k to reserve ~600MB RAM for the Float32Array
+const MAX_JOURNALS = 100000; // Legacy JSONL loader cap; the matrix grows with the rows actually read
+const QUANT_RERANK = parseInt(process.env.QUANT_RERANK || "10", 10); // Shortlist = topK * QUANT_RERANK
 export let journalMatrix: Float32Array | null = null;
+let quantCodes: Int8Array | null = null; // int8 rows (scripts/quantize.py) in place of journalMatrix, if fresh
+let quantScales: Float32Array | null = null; // Per-row scale: row ~= codes * scale (unit length)
+let vectorsFile: { fd: number; dtype: 'float32' | 'float16' } | null = null; // Full precision (open descriptor), for reranking
 export let journalMetadata: any[] = [];
 export let journalCount = 0; // Actual loaded count
+let dimensions = DIMENSIONS; // Set from the binary store manifest when available
+let storeEmbedding: EmbeddingInfo | null = null; // Backend that produced the loaded vectors (manifest)
+let annIndex: AnnIndex | null = null; // IVF index over the binary store (scripts/ann_index.py), if fresh
+let unembeddedRows: number[] = []; // Rows the ANN index does not cover (scored lexically)
+let lexIndex: LexIndex | null = null; // BM25 inverted index over content (scripts/lexical_index.py), if fresh
+let facetIndex: FacetIndex | null = null; // SDG affinity + ASJC bitmaps (scripts/facet_index.py), if fresh
 let sdgs: SDG[] = [];
+let sdgMatcher: SdgMatcher | null = null; // Keyword automaton (sdg_matcher.json), if in step with sdgs.json
+let sdgKeywordRegexes: (RegExp | null)[][] = []; // Fallback: per-keyword regexes, compiled once at load
 
 const DATA_DIR = path.join(process.cwd(), 'data');
 
@@ -24,6 +41,26 @@ export function getJournals() {
     return journalMetadata.slice(0, journalCount);
 }
 
+// Lowercased "name\npublisher" per row for the admin search, built once per loaded generation
+let searchTexts: { metadata: any[]; texts: string[] } | null = null;
+
+export function getJournalSearchTexts(): string[] {
+    if (!searchTexts || searchTexts.metadata !== journalMetadata) {
+        const texts = new Array(journalCount);
+        for (let i = 0; i < journalCount; i++) {
+            const j = journalMetadata[i];
+            texts[i] = `${j.name || ''}\n${j.publisher || ''}`.toLowerCase();
+        }
+        searchTexts = { metadata: journalMetadata, texts };
+    }
+    return searchTexts.texts;
+}
+
+// Rows passing SDG / ASJC filters (facet bitmaps); null without a fresh facet index
+export function filterJournalRows(filters: JournalFilters): number[] | null {
+    return facetIndex ? facetRows(facetIndex, filters, journalCount) : null;
+}
+
 // OpenAI for embeddings
 const openai = new OpenAI({
     apiKey: process.env.OPENAI_API_KEY || "dummy",
@@ -57,95 +94,643 @@ function calculateJaccard(setA: Set<string>, setB: Set<string>): number {
     return union === 0 ? 0 : intersection / union;
 }
 
+// Embedding backend of the stored vectors (scripts/embedding_backends.py)
+interface EmbeddingInfo {
+    backend: 'openai' | 'local';
+    model: string;
+    dim: number;
+}
+
+const OPENAI_EMBEDDING: EmbeddingInfo = { backend: 'openai', model: 'text-embedding-3-small', dim: DIMENSIONS };
+
+// Binary Store (written by scripts/vector_store.py)
+interface StoreManifest {
+    dim: number;
+    rows: number;
+    dtype: 'float32' | 'float16';
+    vectors_file: string;
+    meta_file: string;
+    vectors_sha256?: string;
+    meta_sha256?: string;
+    source?: { file: string; bytes: number; mtime: number };
+    embedding?: EmbeddingInfo; // Absent in stores built before backends existed (openai)
+}
+
+// IVF-flat ANN index: centroids (nlist x dim, unit length) + row ids grouped by list
+interface AnnIndex {
+    nlist: number;
+    nprobe: number;
+    centroids: Float32Array;
+    offsets: Int32Array; // nlist + 1
+    ids: Int32Array;
+}
+
+// BM25 inverted index: postings (ascending doc rows) per term, doc lengths, precomputed idf / length norms
+interface LexIndex {
+    termIds: Map<string, number>;
+    offsets: Int32Array; // terms + 1
+    docs: Int32Array;
+    tfs: Uint16Array;
+    idf: Float32Array;
+    docNorm: Float32Array; // k1 * (1 - b + b * len / avgdl)
+    k1: number;
+}
+
+// SDG affinity / ASJC facets: one uint32 bitmap per SDG and per ASJC area (bit r = row r),
+// ASJC codes per row (CSR) and float16 affinity rows x SDGs
+interface FacetIndex {
+    sdgIds: number[];
+    areas: number[];
+    words: number;
+    sdgBits: Uint32Array; // sdgs x words
+    areaBits: Uint32Array; // areas x words
+    offsets: Int32Array; // rows + 1
+    affinity: Uint16Array; // float16 bits, rows x sdgs
+    codes: Uint16Array;
+}
+
+// Recommendation filters: journals aligned to every listed SDG and classified under every listed
+// ASJC code (an area code like 2100, or a two-digit area, matches the whole area)
+export interface JournalFilters {
+    sdgs?: number[];
+    asjc?: number[];
+}
+
+// Filters were requested but there is no fresh facet index (routes answer 503 facets_unavailable)
+export class FacetsUnavailableError extends Error {
+    constructor() {
+        super('Facet index not built');
+        this.name = 'FacetsUnavailableError';
+    }
+}
+
+function readManifest(): StoreManifest | null {
+    const manifestPath = path.join(DATA_DIR, 'journals.manifest.json');
+    if (!fs.existsSync(manifestPath)) return null;
+    try {
+        const manifest: StoreManifest = JSON.parse(fs.readFileSync(manifestPath, 'utf-8'));
+        // Only trust the binary store if it was built from the current journals.jsonl
+        const jsonlPath = path.join(DATA_DIR, 'journals.jsonl');
+        if (manifest.source && fs.existsSync(jsonlPath) && fs.statSync(jsonlPath).size !== manifest.source.bytes) {
+            console.warn("Binary store is stale (journals.jsonl changed since build). Falling back to JSONL.");
+            return null;
+        }
+        return manifest;
+    } catch (e) {
+        console.warn("Manifest load failed");
+        return null;
+    }
+}
+
+// Bulk read a file straight into typed array memory (readSync is capped per call, so chunk at 1GB)
+function readInto(filePath: string, target: Uint8Array) {
+    const fd = fs.openSync(filePath, 'r');
+    try {
+        let done = 0;
+        while (done < target.length) {
+            const n = fs.readSync(fd, target, done, Math.min(target.length - done, 1 << 30), done);
+            if (n <= 0) throw new Error(`Unexpected end of file: ${filePath}`);
+            done += n;
+        }
+    } finally {
+        fs.closeSync(fd);
+    }
+}
+
+// float16 -> float32 lookup table (65536 entries, built once)
+let halfTable: Float32Array | null = null;
+function getHalfTable(): Float32Array {
+    if (halfTable) return halfTable;
+    halfTable = new Float32Array(65536);
+    for (let h = 0; h < 65536; h++) {
+        const sign = (h & 0x8000) ? -1 : 1;
+        const exp = (h >> 10) & 0x1f;
+        const frac = h & 0x3ff;
+        if (exp === 0) halfTable[h] = sign * Math.pow(2, -14) * (frac / 1024);
+        else if (exp === 0x1f) halfTable[h] = frac ? NaN : sign * Infinity;
+        else halfTable[h] = sign * Math.pow(2, exp - 15) * (1 + frac / 1024);
+    }
+    return halfTable;
+}
+
+function loadAnnIndex(manifest: StoreManifest): AnnIndex | null {
+    const indexPath = path.join(DATA_DIR, 'journals.ivf.json');
+    if (!fs.existsSync(indexPath)) return null;
+    try {
+        const info = JSON.parse(fs.readFileSync(indexPath, 'utf-8'));
+        if (info.store_vectors_sha256 !== manifest.vectors_sha256 || info.dim !== manifest.dim) {
+            console.warn("ANN index is stale (vector store rebuilt since). Using exact scan.");
+            return null;
+        }
+        const centroids = new Float32Array(info.nlist * info.dim);
+        readInto(path.join(DATA_DIR, info.centroids_file), new Uint8Array(centroids.buffer));
+        const lists = new Int32Array(info.nlist + 1 + info.rows);
+        readInto(path.join(DATA_DIR, info.lists_file), new Uint8Array(lists.buffer));
+        return {
+            nlist: info.nlist,
+            nprobe: info.nprobe,
+            centroids,
+            offsets: lists.subarray(0, info.nlist + 1),
+            ids: lists.subarray(info.nlist + 1)
+        };
+    } catch (e) {
+        console.warn("ANN index load failed. Using exact scan.");
+        return null;
+    }
+}
+
+function loadLexIndex(manifest: StoreManifest): LexIndex | null {
+    const indexPath = path.join(DATA_DIR, 'journals.lex.json');
+    if (!fs.existsSync(indexPath)) return null;
+    try {
+        const info = JSON.parse(fs.readFileSync(indexPath, 'utf-8'));
+        if (info.store_meta_sha256 !== manifest.meta_sha256 || info.rows !== manifest.rows) {
+            console.warn("Lexical index is stale (vector store rebuilt since). Using Jaccard fallback.");
+            return null;
+        }
+        const terms: string[] = JSON.parse(fs.readFileSync(path.join(DATA_DIR, info.terms_file), 'utf-8'));
+        const { rows, postings } = info;
+        const raw = new Uint8Array(4 * (terms.length + 1 + postings + rows) + 2 * postings);
+        readInto(path.join(DATA_DIR, info.postings_file), raw);
+        const offsets = new Int32Array(raw.buffer, 0, terms.length + 1);
+        const docs = new Int32Array(raw.buffer, offsets.byteLength, postings);
+        const lengths = new Int32Array(raw.buffer, offsets.byteLength + docs.byteLength, rows);
+        const tfs = new Uint16Array(raw.buffer, offsets.byteLength + docs.byteLength + lengths.byteLength, postings);
+
+        const termIds = new Map<string, number>();
+        const idf = new Float32Array(terms.length);
+        for (let t = 0; t < terms.length; t++) {
+            termIds.set(terms[t], t);
+            const df = offsets[t + 1] - offsets[t];
+            idf[t] = Math.log(1 + (rows - df + 0.5) / (df + 0.5));
+        }
+        const avgdl = info.avgdl || 1;
+        const docNorm = new Float32Array(rows);
+        for (let d = 0; d < rows; d++) docNorm[d] = info.k1 * (1 - info.b + info.b * lengths[d] / avgdl);
+        return { termIds, offsets, docs, tfs, idf, docNorm, k1: info.k1 };
+    } catch (e) {
+        console.warn("Lexical index load failed. Using Jaccard fallback.");
+        return null;
+    }
+}
+
+// BM25 over the postings of the query terms only; scores divided by the best attainable score (0..1)
+function lexicalScores(index: LexIndex, queryTokens: Set<string>, rowCount: number) {
+    const scores = new Float32Array(rowCount);
+    const rows: number[] = [];
+    let best = 0;
+    queryTokens.forEach(term => {
+        const t = index.termIds.get(term);
+        if (t === undefined) return;
+        const idf = index.idf[t];
+        best += idf * (index.k1 + 1);
+        for (let p = index.offsets[t]; p < index.offsets[t + 1]; p++) {
+            const d = index.docs[p];
+            const tf = index.tfs[p];
+            if (scores[d] === 0) rows.push(d);
+            scores[d] += idf * tf * (index.k1 + 1) / (tf + index.docNorm[d]);
+        }
+    });
+    if (best > 0) for (const d of rows) scores[d] /= best;
+    return { rows, scores };
+}
+
+function asjcArea(code: number) {
+    return code >= 100 ? Math.floor(code / 100) : code;
+}
+
+function loadFacets(manifest: StoreManifest): FacetIndex | null {
+    const indexPath = path.join(DATA_DIR, 'journals.facets.json');
+    if (!fs.existsSync(indexPath)) return null;
+    try {
+        const info = JSON.parse(fs.readFileSync(indexPath, 'utf-8'));
+        const sdgsSha = crypto.createHash('sha256').update(fs.readFileSync(path.join(DATA_DIR, 'sdgs.json'))).digest('hex');
+        if (info.store_vectors_sha256 !== manifest.vectors_sha256 || info.store_meta_sha256 !== manifest.meta_sha256
+            || info.sdgs_sha256 !== sdgsSha) {
+            console.warn("Facet index is stale (vector store or sdgs.json rebuilt since). Filters are unavailable.");
+            return null;
+        }
+        const { rows, words, codes } = info;
+        const nSdgs = info.sdg_ids.length;
+        const nAreas = info.areas.length;
+        const raw = new Uint8Array(4 * ((nSdgs + nAreas) * words + rows + 1) + 2 * (rows * nSdgs + codes));
+        readInto(path.join(DATA_DIR, info.bin_file), raw);
+        let at = 0;
+        const sdgBits = new Uint32Array(raw.buffer, at, nSdgs * words);
+        at += sdgBits.byteLength;
+        const areaBits = new Uint32Array(raw.buffer, at, nAreas * words);
+        at += areaBits.byteLength;
+        const offsets = new Int32Array(raw.buffer, at, rows + 1);
+        at += offsets.byteLength;
+        const affinity = new Uint16Array(raw.buffer, at, rows * nSdgs);
+        at += affinity.byteLength;
+        return {
+            sdgIds: info.sdg_ids, areas: info.areas, words,
+            sdgBits, areaBits, offsets, affinity,
+            codes: new Uint16Array(raw.buffer, at, codes),
+        };
+    } catch (e) {
+        console.warn("Facet index load failed. Filters are unavailable.");
+        return null;
+    }
+}
+
+// Rows (ascending) passing the filters: AND of the bitmaps, then exact ASJC codes checked per row
+function facetRows(index: FacetIndex, filters: JournalFilters, rowCount: number): number[] {
+    const { words } = index;
+    const mask = new Uint32Array(words).fill(0xFFFFFFFF);
+    const and = (bits: Uint32Array, pos: number) => {
+        if (pos < 0) mask.fill(0);
+        else for (let w = 0; w < words; w++) mask[w] &= bits[pos * words + w];
+    };
+    (filters.sdgs || []).forEach(s => and(index.sdgBits, index.sdgIds.indexOf(s)));
+    (filters.asjc || []).forEach(c => and(index.areaBits, index.areas.indexOf(asjcArea(c))));
+    const exact = (filters.asjc || []).filter(c => c >= 100 && c % 100 !== 0);
+
+    const rows: number[] = [];
+    for (let w = 0; w < words; w++) {
+        let bits = mask[w] | 0;
+        while (bits !== 0) {
+            const row = w * 32 + (31 - Math.clz32(bits & -bits));
+            bits &= bits - 1;
+            if (row >= rowCount) break;
+            if (exact.length > 0 && !exact.every(c => {
+                for (let p = index.offsets[row]; p < index.offsets[row + 1]; p++) if (index.codes[p] === c) return true;
+                return false;
+            })) continue;
+            rows.push(row);
+        }
+    }
+    return rows;
+}
+
+// int8 copy of the store: rows x dim codes + one scale per row, sized to the row count
+function loadQuantized(manifest: StoreManifest): { codes: Int8Array; scales: Float32Array } | null {
+    const quantPath = path.join(DATA_DIR, 'journals.quant.json');
+    if (!fs.existsSync(quantPath)) return null;
+    try {
+        const info = JSON.parse(fs.readFileSync(quantPath, 'utf-8'));
+        if (info.store_vectors_sha256 !== manifest.vectors_sha256 || info.rows !== manifest.rows) {
+            console.warn("Quantized vectors are stale (vector store rebuilt since). Using float vectors.");
+            return null;
+        }
+        if (info.kind !== 'int8') {
+            console.log(`Quantized vectors are '${info.kind}' (offline only). Using float vectors.`);
+            return null;
+        }
+        const codes = new Int8Array(info.rows * info.dim);
+        readInto(path.join(DATA_DIR, info.codes_file), new Uint8Array(codes.buffer));
+        const scales = new Float32Array(info.rows);
+        readInto(path.join(DATA_DIR, info.scales_file), new Uint8Array(scales.buffer));
+        return { codes, scales };
+    } catch (e) {
+        console.warn("Quantized vectors load failed. Using float vectors.");
+        return null;
+    }
+}
+
+// Full-precision rows from journals.vectors.bin, read on demand (the shortlist only).
+// null for a row the file no longer holds in full (e.g. truncated under a swap): never stale buffer bytes
+function readFullRows(rows: number[]): (Float32Array | null)[] {
+    const { fd, dtype } = vectorsFile!;
+    const bytesPerValue = dtype === 'float16' ? 2 : 4;
+    const rowBytes = dimensions * bytesPerValue;
+    const buffer = new Uint8Array(rowBytes);
+    return rows.map(row => {
+        let done = 0;
+        while (done < rowBytes) {
+            const n = fs.readSync(fd, buffer, done, rowBytes - done, row * rowBytes + done);
+            if (n <= 0) return null;
+            done += n;
+        }
+        if (dtype === 'float32') return new Float32Array(buffer.slice().buffer);
+        const half = new Uint16Array(buffer.buffer);
+        const table = getHalfTable();
+        const out = new Float32Array(dimensions);
+        for (let k = 0; k < dimensions; k++) out[k] = table[half[k]];
+        return out;
+    });
+}
+
+// Rows to score for a query: members of the `nprobe` lists whose centroids are closest
+function annCandidates(index: AnnIndex, embedding: number[], nprobe: number): number[] {
+    const centroidScores = new Array(index.nlist);
+    for (let c = 0; c < index.nlist; c++) {
+        let dot = 0;
+        const offset = c * dimensions;
+        for (let k = 0; k < dimensions; k++) dot += embedding[k] * index.centroids[offset + k];
+        centroidScores[c] = { c, dot };
+    }
+    centroidScores.sort((a, b) => b.dot - a.dot);
+
+    const rows: number[] = [];
+    for (let p = 0; p < Math.min(nprobe, index.nlist); p++) {
+        const c = centroidScores[p].c;
+        for (let j = index.offsets[c]; j < index.offsets[c + 1]; j++) rows.push(index.ids[j]);
+    }
+    return rows;
+}
+
+// Everything loaded from one data generation; swapped in as a whole by applyData
+interface JournalData {
+    matrix: Float32Array | null;
+    quantCodes: Int8Array | null;
+    quantScales: Float32Array | null;
+    vectorsFile: { fd: number; dtype: 'float32' | 'float16' } | null;
+    metadata: any[];
+    count: number;
+    dimensions: number;
+    embedding: EmbeddingInfo;
+    annIndex: AnnIndex | null;
+    unembeddedRows: number[];
+    lexIndex: LexIndex | null;
+    facetIndex: FacetIndex | null;
+}
+
+async function loadBinaryStore(manifest: StoreManifest): Promise<JournalData> {
+    const { rows, dim } = manifest;
+    const vectorsPath = path.join(DATA_DIR, manifest.vectors_file);
+
+    // 1. Vectors: one bulk read, no parsing (the int8 copy instead when ingestion wrote one)
+    const quant = loadQuantized(manifest);
+    const matrix = quant ? null : new Float32Array(rows * dim);
+    if (!matrix) {
+        console.log(`Using int8 vectors (${(quant!.codes.length / 1e6).toFixed(0)}MB), reranking at full precision.`);
+    } else if (manifest.dtype === 'float16') {
+        const half = new Uint16Array(rows * dim);
+        readInto(vectorsPath, new Uint8Array(half.buffer));
+        const table = getHalfTable();
+        for (let i = 0; i < half.length; i++) matrix[i] = table[half[i]];
+    } else {
+        readInto(vectorsPath, new Uint8Array(matrix.buffer));
+    }
+
+    // 2. Metadata: small lines, same row order as the matrix
+    // With a fresh lexical index the per-journal token sets are not needed at all
+    const lex = loadLexIndex(manifest);
+    const metadata = new Array(rows);
+    const unembedded: number[] = [];
+    let count = 0;
+    const fileStream = fs.createReadStream(path.join(DATA_DIR, manifest.meta_file));
+    const rl = readline.createInterface({ input: fileStream, crlfDelay: Infinity });
+    for await (const line of rl) {
+        if (!line.trim() || count >= rows) continue;
+        const j = JSON.parse(line);
+        const offset = count * dim;
+        metadata[count] = {
+            id: j.id,
+            name: j.name,
+            publisher: j.publisher,
+            coverage: j.coverage,
+            scope: j.scope || "",
+            link: j.link,
+            asjc: j.asjc,
+            tokens: lex ? null : tokenize(j.content || ""),
+            // int8 rows are unit length by construction (quantized after normalization)
+            norm: j.hasEmbedding ? (matrix ? calculateNorm(matrix.subarray(offset, offset + dim)) : 1) : 0,
+            hasEmbedding: !!j.hasEmbedding
+        };
+        if (!j.hasEmbedding) unembedded.push(count);
+        count++;
+    }
+
+    const ann = loadAnnIndex(manifest);
+    if (ann) console.log(`ANN index loaded (${ann.nlist} lists, nprobe ${ann.nprobe}).`);
+    if (lex) console.log(`Lexical index loaded (${lex.termIds.size} terms).`);
+    const facets = loadFacets(manifest);
+    if (facets) console.log(`Facet index loaded (${facets.sdgIds.length} SDGs, ${facets.areas.length} ASJC areas).`);
+    return {
+        matrix,
+        quantCodes: quant ? quant.codes : null,
+        quantScales: quant ? quant.scales : null,
+        // Rerank reads go through a descriptor opened now: a later rebuild replaces the file,
+        // and this generation keeps reading its own rows until it is swapped out
+        vectorsFile: quant ? { fd: fs.openSync(vectorsPath, 'r'), dtype: manifest.dtype } : null,
+        metadata,
+        count,
+        dimensions: dim,
+        embedding: manifest.embedding || OPENAI_EMBEDDING,
+        annIndex: ann,
+        unembeddedRows: unembedded,
+        lexIndex: lex,
+        facetIndex: facets,
+    };
+}
+
+// Legacy loader: parse every line of journals.jsonl
+async function loadJsonl(): Promise<JournalData> {
+    // Start small and double as rows arrive, so memory follows the real row count
+    let capacity = 1024;
+    let matrix = new Float32Array(capacity * DIMENSIONS);
+    let count = 0;
+    const metadata: any[] = [];
+
+    console.log("Loading journals.jsonl...");
+    const jsonlPath = path.join(DATA_DIR, 'journals.jsonl');
+
+    if (fs.existsSync(jsonlPath)) {
+        const fileStream = fs.createReadStream(jsonlPath);
+        const rl = readline.createInterface({ input: fileStream, crlfDelay: Infinity });
+
+        for await (const line of rl) {
+            if (line.trim()) {
+                try {
+                    if (count >= MAX_JOURNALS) break;
+
+                    const j = JSON.parse(line);
+
+                    if (count === capacity) {
+                        capacity = Math.min(capacity * 2, MAX_JOURNALS);
+                        const grown = new Float32Array(capacity * DIMENSIONS);
+                        grown.set(matrix);
+                        matrix = grown;
+                    }
+
+                    // 1. Store Embedding in Matrix
+                    if (j.embedding && j.embedding.length === DIMENSIONS) {
+                        const offset = count * DIMENSIONS;
+                        for (let k = 0; k < DIMENSIONS; k++) {
+                            matrix[offset + k] = j.embedding[k];
+                        }
+                    }
+
+                    // 2. Store minimal metadata (Memory Diet)
+                    metadata[count] = {
+                        id: j.id,
+                        name: j.name,
+                        publisher: j.publisher,
+                        coverage: j.coverage,
+                        scope: j.scope || "", // Keep scope for display? Or maybe drop if too huge? User needs it for UI.
+                        link: j.link,
+                        asjc: j.asjc,
+                        tokens: tokenize(j.content || ""), // Still needed for fallback? If embedding exists we prioritize it.
+                        norm: j.embedding ? calculateNorm(j.embedding) : 0,
+                        hasEmbedding: !!(j.embedding && j.embedding.length === DIMENSIONS)
+                    };
+
+                    count++;
+
+                } catch (e) { }
+            }
+        }
+    }
+
+    return {
+        matrix,
+        quantCodes: null,
+        quantScales: null,
+        vectorsFile: null,
+        metadata,
+        count,
+        dimensions: DIMENSIONS,
+        embedding: OPENAI_EMBEDDING,
+        annIndex: null,
+        unembeddedRows: [],
+        lexIndex: null,
+        facetIndex: null,
+    };
+}
+
+// Synchronous on purpose: a request sees the old generation or the new one, never a mix
+function applyData(data: JournalData) {
+    const previousFile = vectorsFile;
+    journalMatrix = data.matrix;
+    quantCodes = data.quantCodes;
+    quantScales = data.quantScales;
+    vectorsFile = data.vectorsFile;
+    journalMetadata = data.metadata;
+    journalCount = data.count;
+    dimensions = data.dimensions;
+    storeEmbedding = data.embedding;
+    annIndex = data.annIndex;
+    unembeddedRows = data.unembeddedRows;
+    lexIndex = data.lexIndex;
+    facetIndex = data.facetIndex;
+    // Rerank reads are synchronous within a request, so nothing can still be using the old descriptor
+    if (previousFile) fs.closeSync(previousFile.fd);
+}
+
+const EXCL_PATH = path.join(DATA_DIR, 'exclusions.json');
+
+function loadExclusions(): Set<string> {
+    const excludedIds = new Set<string>();
+    try {
+        if (fs.existsSync(EXCL_PATH)) {
+            const raw = fs.readFileSync(EXCL_PATH, 'utf-8');
+            const list = JSON.parse(raw);
+            list.forEach((id: string) => excludedIds.add(id));
+        }
+    } catch (e) { console.warn("Exclusions load failed"); }
+    return excludedIds;
+}
+
+// exclusions.json is re-read whenever it changes on disk (admin edits apply to the next request);
+// the version also keys the result cache
+let exclusions = { ids: new Set<string>(), version: '' };
+
+function currentExclusions() {
+    let version = 'none';
+    try {
+        const stat = fs.statSync(EXCL_PATH);
+        version = `${stat.mtimeMs}:${stat.size}`;
+    } catch { }
+    if (version !== exclusions.version) exclusions = { ids: loadExclusions(), version };
+    return exclusions;
+}
+
+function loadSdgs() {
+    try {
+        const raw = fs.readFileSync(path.join(DATA_DIR, 'sdgs.json'), 'utf-8');
+        const loaded: SDG[] = JSON.parse(raw);
+        // Precompute SDG norms
+        loaded.forEach(s => {
+            if (s.embedding) {
+                (s as any).norm = calculateNorm(s.embedding);
+            }
+        });
+        const matcher = loadSdgMatcher(DATA_DIR, loaded);
+        const regexes = matcher ? [] : loaded.map(s => s.keywords.map(kw => {
+            try {
+                const escaped = kw.replace(/[.*+?^${}()|[\]\\]/g, '\\$&');
+                return new RegExp(`\\b${escaped}\\b`, 'i');
+            } catch { return null; }
+        }));
+        return { sdgs: loaded, matcher, regexes };
+    } catch (e) {
+        console.warn("SDG data not found");
+        return null;
+    }
+}
+
+function applySdgs(loaded: NonNullable<ReturnType<typeof loadSdgs>>) {
+    sdgs = loaded.sdgs;
+    sdgMatcher = loaded.matcher;
+    sdgKeywordRegexes = loaded.regexes;
+}
+
+// Data generation (journals.generation.json, bumped by ingestion once store + indexes are written)
+interface DataGeneration {
+    generation: number;
+    rows: number;
+    vectors_sha256: string;
+    meta_sha256: string;
+}
+
+const GENERATION_PATH = path.join(DATA_DIR, 'journals.generation.json');
+const RELOAD_INTERVAL_MS = parseInt(process.env.DATA_RELOAD_INTERVAL_MS || "2000", 10); // 0: no hot reload
+
+function readGeneration(): DataGeneration | null {
+    try {
+        return JSON.parse(fs.readFileSync(GENERATION_PATH, 'utf-8'));
+    } catch {
+        return null;
+    }
+}
+
+// The generation's store is the one on disk (not a later rebuild caught half way)
+function matchesGeneration(manifest: StoreManifest, generation: DataGeneration) {
+    return manifest.vectors_sha256 === generation.vectors_sha256 && manifest.meta_sha256 === generation.meta_sha256;
+}
+
 // Data Loader
-let loadingPromise: Promise<Set<string>> | null = null;
+let loadingPromise: Promise<void> | null = null;
+let dataGeneration = 0; // Generation being served (0: unversioned data)
+let reloading: Promise<void> | null = null;
+let reloadPending = false;
+let watching = false;
+
+export function getDataGeneration() {
+    return dataGeneration;
+}
 
 async function loadDataAsync() {
     if (loadingPromise) return loadingPromise;
 
     loadingPromise = (async () => {
         console.log("Starting data load (Matrix Mode)...");
-        // Load Exclusions
-        let excludedIds = new Set<string>();
-        try {
-            const exclPath = path.join(DATA_DIR, 'exclusions.json');
-            if (fs.existsSync(exclPath)) {
-                const raw = fs.readFileSync(exclPath, 'utf-8');
-                const list = JSON.parse(raw);
-                list.forEach((id: string) => excludedIds.add(id));
-            }
-        } catch (e) { console.warn("Exclusions load failed"); }
 
         // Load SDGs
         if (sdgs.length === 0) {
-            try {
-                const raw = fs.readFileSync(path.join(DATA_DIR, 'sdgs.json'), 'utf-8');
-                sdgs = JSON.parse(raw);
-                // Precompute SDG norms
-                sdgs.forEach(s => {
-                    if (s.embedding) {
-                        (s as any).norm = calculateNorm(s.embedding);
-                    }
-                });
-            } catch (e) {
-                console.warn("SDG data not found");
-            }
+            const loaded = loadSdgs();
+            if (loaded) applySdgs(loaded);
         }
 
-        // Load Journals (Streaming JSONL + Matrix Fill)
-        if (!journalMatrix) {
-            console.log("Allocating Matrix...");
-            // Allocate 600MB buffer for vectors
-            journalMatrix = new Float32Array(MAX_JOURNALS * DIMENSIONS);
-            journalCount = 0;
-            journalMetadata = new Array(MAX_JOURNALS);
-
-            console.log("Loading journals.jsonl...");
-            const jsonlPath = path.join(DATA_DIR, 'journals.jsonl');
-
-            if (fs.existsSync(jsonlPath)) {
-                const fileStream = fs.createReadStream(jsonlPath);
-                const rl = readline.createInterface({ input: fileStream, crlfDelay: Infinity });
-
-                for await (const line of rl) {
-                    if (line.trim()) {
-                        try {
-                            if (journalCount >= MAX_JOURNALS) break;
-
-                            const j = JSON.parse(line);
-
-                            // 1. Store Embedding in Matrix
-                            if (j.embedding && j.embedding.length === DIMENSIONS) {
-                                const offset = journalCount * DIMENSIONS;
-                                for (let k = 0; k < DIMENSIONS; k++) {
-                                    journalMatrix[offset + k] = j.embedding[k];
-                                }
-                            }
-
-                            // 2. Store minimal metadata (Memory Diet)
-                            journalMetadata[journalCount] = {
-                                id: j.id,
-                                name: j.name,
-                                publisher: j.publisher,
-                                coverage: j.coverage,
-                                scope: j.scope || "", // Keep scope for display? Or maybe drop if too huge? User needs it for UI.
-                                link: j.link,
-                                asjc: j.asjc,
-                                tokens: tokenize(j.content || ""), // Still needed for fallback? If embedding exists we prioritize it.
-                                norm: j.embedding ? calculateNorm(j.embedding) : 0,
-                                hasEmbedding: !!j.embedding
-                            };
-
-                            journalCount++;
-
-                        } catch (e) { }
-                    }
-                }
+        // Load Journals (Binary store first, Streaming JSONL + Matrix Fill as fallback)
+        if (!journalMatrix && !quantCodes) {
+            const generation = readGeneration();
+            const manifest = readManifest();
+            const endLoad = metrics.start("data.load");
+            if (manifest) {
+                console.log(`Loading binary store (${manifest.rows} rows, ${manifest.dtype})...`);
+                applyData(await loadBinaryStore(manifest));
+                dataGeneration = generation && matchesGeneration(manifest, generation) ? generation.generation : 0;
+            } else {
+                applyData(await loadJsonl());
             }
-            console.log(`Loaded ${journalCount} journals into Matrix.`);
+            endLoad({ rows: journalCount, source: manifest ? 'binary' : 'jsonl' });
+            console.log(`Loaded ${journalCount} journals into Matrix (generation ${dataGeneration}).`);
         }
-
-        return excludedIds;
+        watchGeneration();
     })().catch(e => {
         console.error("Data load failed:", e);
         loadingPromise = null;
@@ -155,29 +740,138 @@ async function loadDataAsync() {
     return loadingPromise;
 }
 
-export async function analyzeAbstract(abstract: string, topK: number = 3): Promise<AnalysisResult> {
+// Hot reload: stat-poll the generation file, load a new generation next to the live one, then swap
+function watchGeneration() {
+    if (watching || RELOAD_INTERVAL_MS <= 0) return;
+    watching = true;
+    fs.watchFile(GENERATION_PATH, { interval: RELOAD_INTERVAL_MS, persistent: false }, (curr, prev) => {
+        if (curr.mtimeMs !== prev.mtimeMs) reloadData();
+    });
+}
+
+function reloadData(): Promise<void> {
+    if (reloading) {
+        // Another generation landed mid-reload: load it once this one is done
+        reloadPending = true;
+        return reloading;
+    }
+    reloading = (async () => {
+        const generation = readGeneration();
+        if (!generation || generation.generation === dataGeneration) return;
+        const manifest = readManifest();
+        if (!manifest || !matchesGeneration(manifest, generation)) {
+            console.warn(`Data generation ${generation.generation} does not match the store on disk. Keeping generation ${dataGeneration}.`);
+            return;
+        }
+        const start = Date.now();
+        const endReload = metrics.start("data.reload");
+        console.log(`Loading data generation ${generation.generation} (${manifest.rows} rows) in the background...`);
+        // The live generation keeps serving until everything below is in memory
+        const data = await loadBinaryStore(manifest);
+        const loadedSdgs = loadSdgs();
+
+        applyData(data);
+        if (loadedSdgs) applySdgs(loadedSdgs);
+        dataGeneration = generation.generation;
+        endReload({ rows: journalCount, generation: dataGeneration });
+        console.log(`Data generation ${dataGeneration} live: ${journalCount} journals (${Date.now() - start}ms).`);
+    })().catch(e => {
+        console.error("Data reload failed, still serving the previous generation:", e);
+    }).finally(() => {
+        reloading = null;
+        if (reloadPending) {
+            reloadPending = false;
+            reloadData();
+        }
+    });
+    return reloading;
+}
+
+// Query embedding with the same backend as the stored vectors: local model in-process, else the API
+function embedQuery(abstract: string, info: EmbeddingInfo, hasApiKey: boolean): Promise<number[] | null> {
+    if (info.backend === 'local') return Promise.resolve(localEmbed(abstract, info.dim));
+    if (!hasApiKey) return Promise.resolve(null);
+    return openai.embeddings.create({
+        model: info.model,
+        input: abstract.replace("\n", " ")
+    }).then(res => res.data[0].embedding).catch(e => { console.error("Embedding failed", e); return null; });
+}
+
+// Journals closest to one SDG by precomputed affinity (no abstract, no scan of the catalog)
+export async function getSdgJournals(sdgId: number, topK: number = 10, asjc: number[] = []) {
+    await loadDataAsync();
+    if (!facetIndex) return null;
+    const pos = facetIndex.sdgIds.indexOf(sdgId);
+    if (pos < 0) return [];
+    const index = facetIndex;
+    const excludedIds = currentExclusions().ids;
+    const table = getHalfTable();
+    const nSdgs = index.sdgIds.length;
+    return facetRows(index, { sdgs: [sdgId], asjc }, journalCount)
+        .filter(row => !excludedIds.has(journalMetadata[row].id))
+        .map(row => ({ row, score: table[index.affinity[row * nSdgs + pos]] }))
+        .sort((a, b) => b.score - a.score)
+        .slice(0, topK)
+        .map(({ row, score }) => {
+            const { tokens, ...meta } = journalMetadata[row];
+            return { ...meta, score };
+        });
+}
+
+export async function analyzeAbstract(abstract: string, topK: number = 3, filters: JournalFilters = {}): Promise<AnalysisResult> {
     const hasApiKey = !!process.env.OPENAI_API_KEY;
     console.time("Analysis");
     console.log(`Analyzing abstract. Length: ${abstract.length}. API Key present: ${hasApiKey}`);
+    const endTotal = metrics.start("analyze.total");
+    metrics.count("analyze.requests");
 
-    // 1. Generate Input Embedding
-    const embeddingPromise = hasApiKey
-        ? openai.embeddings.create({
-            model: "text-embedding-3-small",
-            input: abstract.replace("\n", " ")
-        }).then(res => res.data[0].embedding).catch(e => { console.error("Embedding failed", e); return null; })
-        : Promise.resolve(null);
+    // 1. Generate Input Embedding (before the first load, the manifest on disk says which backend)
+    // Resubmitted abstracts reuse their embedding instead of another remote call
+    const key = abstractKey(abstract);
+    const info = storeEmbedding || readManifest()?.embedding || OPENAI_EMBEDDING;
+    const embeddingKey = `${info.model}:${key}`;
+    const cachedEmbedding = embeddingCache.get(embeddingKey);
+    const endEmbed = metrics.start("analyze.embed");
+    const embeddingPromise = cachedEmbedding
+        ? Promise.resolve(cachedEmbedding)
+        : embedQuery(abstract, info, hasApiKey).then(emb => {
+            endEmbed({ backend: info.backend, ok: !!emb });
+            // embedQuery resolves null when the request failed
+            if (info.backend === 'openai' && hasApiKey) metrics.count(emb ? "analyze.api_calls" : "analyze.api_errors");
+            return emb;
+        });
 
     // Ensure data is loaded
+    const endWait = metrics.start("analyze.wait");
     const dataPromise = loadDataAsync();
 
-    const [embedding, excludedIds] = await Promise.all([embeddingPromise, dataPromise]);
+    const [embedding] = await Promise.all([embeddingPromise, dataPromise]);
+    endWait();
+    if (embedding && !cachedEmbedding) embeddingCache.set(embeddingKey, embedding);
     console.log(`Data loaded. Journals: ${journalCount}. Embedding generated: ${!!embedding}`);
 
+    // Same abstract, data generation, exclusions and scoring mode: the ranking cannot have changed
+    const excludedIds = currentExclusions().ids;
+    // Never rank (or cache) the whole catalog as if the filters had matched
+    const filtered = !!((filters.sdgs && filters.sdgs.length) || (filters.asjc && filters.asjc.length));
+    if (filtered && !facetIndex) {
+        endTotal({ facets_unavailable: true });
+        console.timeEnd("Analysis");
+        throw new FacetsUnavailableError();
+    }
+    const filterKey = [...(filters.sdgs || [])].sort((a, b) => a - b).join(',') + '/' + [...(filters.asjc || [])].sort((a, b) => a - b).join(',');
+    const resultKey = `${key}:${dataGeneration}:${exclusions.version}:${embedding ? info.model : 'lexical'}:${filterKey}`;
+    const cachedResult = resultCache.get(resultKey);
+    if (cachedResult && cachedResult.topK >= topK) {
+        metrics.count("analyze.result_cache_hits");
+        endTotal({ cached: true });
+        console.timeEnd("Analysis");
+        return { journals: cachedResult.result.journals.slice(0, topK), sdgs: cachedResult.result.sdgs };
+    }
+
     const inputTokens = tokenize(abstract);
 
     // 2. Score Journals (Matrix Scan)
-    const scores = new Array(journalCount);
     const matrix = journalMatrix!; // Safe assertion if loaded
     const metadata = journalMetadata;
 
@@ -192,26 +886,55 @@ export async function analyzeAbstract(abstract: string, topK: number = 3): Promi
     let validCount = 0;
 
     // Cache standard for loop vars
-    const useSemantic = !!(embedding && matrix);
+    const codes = quantCodes;
+    const useSemantic = !!(embedding && (matrix || codes) && embedding.length === dimensions);
+
+    // Lexical scores (BM25 postings) for whatever is not scored semantically: every journal without a
+    // query embedding, else only the rows without one. No index: Jaccard against the token sets.
+    const lex = lexIndex && (!useSemantic || unembeddedRows.length > 0)
+        ? lexicalScores(lexIndex, inputTokens, journalCount)
+        : null;
+
+    // Filters: exact scan of the rows the facet bitmaps leave (no ANN needed on a pruned set)
+    const filterRows = filtered && facetIndex ? facetRows(facetIndex, filters, journalCount) : null;
+
+    // ANN: only score the probed lists (+ rows without embeddings), ANN_NPROBE=0 forces the exact scan
+    // Lexical only: score the journals sharing a term with the abstract, the rest are all 0
+    const nprobe = annIndex ? parseInt(process.env.ANN_NPROBE || String(annIndex.nprobe), 10) : 0;
+    const candidateRows = filterRows || (useSemantic && annIndex && nprobe > 0
+        ? annCandidates(annIndex, embedding!, nprobe).concat(unembeddedRows)
+        : (!useSemantic && lex ? lex.rows : null));
+    const scanCount = candidateRows ? candidateRows.length : journalCount;
+    const scores = new Array(scanCount);
 
     console.time("ScoringLoop");
-    for (let i = 0; i < journalCount; i++) {
+    const endScan = metrics.start("analyze.scan");
+    for (let r = 0; r < scanCount; r++) {
+        const i = candidateRows ? candidateRows[r] : r;
         const meta = metadata[i];
         if (excludedIds.has(meta.id)) continue;
 
         let score = 0;
 
-        if (useSemantic && meta.hasEmbedding) {
+        if (useSemantic && meta.hasEmbedding && codes) {
+            // int8 rows: approximate cosine, the shortlist is reranked at full precision below
+            let dot = 0;
+            const offset = i * dimensions;
+            for (let k = 0; k < dimensions; k++) dot += embedding![k] * codes[offset + k];
+            score = dot * quantScales![i] / queryNorm;
+        } else if (useSemantic && meta.hasEmbedding) {
             // Optimized Dot Product against Flat Matrix
             let dot = 0;
-            const offset = i * DIMENSIONS;
+            const offset = i * dimensions;
 
             // Manual loop is often faster than subarray for small overhead
-            for (let k = 0; k < DIMENSIONS; k++) {
+            for (let k = 0; k < dimensions; k++) {
                 dot += embedding![k] * matrix[offset + k];
             }
 
             score = dot / (queryNorm * meta.norm);
+        } else if (lex) {
+            score = lex.scores[i];
         } else {
             // Jaccard Fallback
             score = calculateJaccard(inputTokens, meta.tokens);
@@ -221,49 +944,96 @@ export async function analyzeAbstract(abstract: string, topK: number = 3): Promi
         scores[validCount++] = { index: i, score };
     }
     console.timeEnd("ScoringLoop");
+    endScan({ rows: scanCount, mode: useSemantic ? (codes ? 'int8' : 'float') : (lex ? 'bm25' : 'jaccard') });
+    metrics.count("analyze.rows_scanned", scanCount);
+    if (filterRows) console.log(`Filters left ${scanCount} of ${journalCount} journals to score.`);
+    else if (candidateRows && useSemantic) console.log(`ANN scored ${scanCount} of ${journalCount} journals (nprobe ${nprobe}).`);
+    else if (candidateRows) console.log(`Lexical search scored ${scanCount} of ${journalCount} journals.`);
 
     // Trim
     const validScores = scores.slice(0, validCount);
 
     // Sort: High to Low
+    const endSort = metrics.start("analyze.sort");
     validScores.sort((a, b) => b.score - a.score);
+    endSort({ rows: validScores.length });
+
+    // Quantized scan: rescore the best topK * QUANT_RERANK rows with their float vectors from disk
+    if (useSemantic && codes && vectorsFile && validScores.length > 0) {
+        const endRerank = metrics.start("analyze.rerank");
+        const head = validScores.slice(0, topK * Math.max(1, QUANT_RERANK));
+        const embedded = head.filter(item => metadata[item.index].hasEmbedding);
+        const fullRows = readFullRows(embedded.map(item => item.index));
+        let unread = 0;
+        embedded.forEach((item, n) => {
+            const row = fullRows[n];
+            if (!row) {
+                unread++; // Keeps its quantized score
+                return;
+            }
+            let dot = 0;
+            for (let k = 0; k < dimensions; k++) dot += embedding![k] * row[k];
+            item.score = dot / (queryNorm * calculateNorm(row));
+        });
+        if (unread) console.warn(`Rerank: ${unread} rows could not be read from the vectors file.`);
+        head.sort((a, b) => b.score - a.score);
+        validScores.splice(0, head.length, ...head);
+        endRerank({ rows: embedded.length - unread });
+    }
+
+    // Fewer lexical matches than topK: pad with zero scores in row order, as the full scan would
+    if (!filterRows && !useSemantic && lex && validScores.length < topK) {
+        const picked = new Set(validScores.map(item => item.index));
+        for (let i = 0; i < journalCount && validScores.length < topK; i++) {
+            if (!picked.has(i) && !excludedIds.has(metadata[i].id)) validScores.push({ index: i, score: 0 });
+        }
+    }
 
     // Take Top K and map back to full objects
+    // (token sets are scoring-only and stay out of the response and the cache)
     const topJournals = validScores.slice(0, topK).map(item => {
-        const meta = metadata[item.index];
+        const { tokens, ...meta } = metadata[item.index];
         return { ...meta, score: item.score };
     });
 
     // 3. Score SDGs (SDGs are few, optimization less critical)
-    let scoredSdgs = sdgs.map(sdg => {
+    // Keywords: one automaton pass over the abstract for all SDGs
+    const endSdg = metrics.start("analyze.sdg");
+    const keywordPositions = sdgMatcher ? matchSdgKeywords(sdgMatcher, abstract) : null;
+
+    let scoredSdgs = sdgs.map((sdg, sdgIndex) => {
         // Hybrid Score
         let semanticScore = 0;
-        if (embedding && sdg.embedding) {
+        if (embedding && sdg.embedding && sdg.embedding.length === embedding.length) {
             const sdgNorm = (sdg as any).norm || calculateNorm(sdg.embedding);
             // Standard dot product for SDG (not in matrix)
             let dot = 0;
-            for (let k = 0; k < DIMENSIONS; k++) dot += embedding![k] * sdg.embedding[k];
+            for (let k = 0; k < embedding.length; k++) dot += embedding![k] * sdg.embedding[k];
             semanticScore = dot / (queryNorm * sdgNorm);
         }
 
         // Keyword Bonus
-        const keywordsFound = sdg.keywords.filter(kw => {
-            try {
-                const escaped = kw.replace(/[.*+?^${}()|[\]\\]/g, '\\$&');
-                const regex = new RegExp(`\\b${escaped}\\b`, 'i');
-                return regex.test(abstract);
-            } catch { return abstract.toLowerCase().includes(kw); }
-        });
+        const keywordsFound = keywordPositions
+            ? (keywordPositions.get(sdg.id) || []).map(pos => sdg.keywords[pos])
+            : sdg.keywords.filter((kw, k) => {
+                const regex = sdgKeywordRegexes[sdgIndex]?.[k];
+                return regex ? regex.test(abstract) : abstract.toLowerCase().includes(kw);
+            });
 
         const keywordBonus = keywordsFound.length * 0.1;
         const finalScore = (semanticScore * 0.5) + keywordBonus;
 
-        return { ...sdg, score: finalScore, keywordsFound };
+        const { embedding: _, ...fields } = sdg;
+        return { ...fields, score: finalScore, keywordsFound };
     });
 
     scoredSdgs.sort((a, b) => b.score - a.score);
     const topSdgs = scoredSdgs.slice(0, 3);
+    endSdg({ automaton: !!keywordPositions });
+
+    resultCache.set(resultKey, { topK, result: { journals: topJournals, sdgs: topSdgs } });
 
+    endTotal({ cached: false });
     console.timeEnd("Analysis");
     return {
         journals: topJournals,
@@ -0,0 +1,142 @@
+import crypto from 'crypto';
+import fs from 'fs';
+import path from 'path';
+
+// Analysis caches (used by recommender.ts)
+//   embeddings: normalized-abstract hash + model -> query embedding (skips the remote embedding call)
+//   results:    hash + data generation + exclusions version -> ranked journals and SDGs
+// Both are in-memory LRUs bounded by entry count. With ANALYSIS_CACHE_DIR set, every entry is also
+// written there (one file per key) and read back on a memory miss, so they survive restarts.
+
+const EMBEDDING_ENTRIES = parseInt(process.env.ANALYSIS_CACHE_EMBEDDINGS || "1000", 10);
+const RESULT_ENTRIES = parseInt(process.env.ANALYSIS_CACHE_RESULTS || "500", 10);
+const CACHE_DIR = process.env.ANALYSIS_CACHE_DIR || ""; // Empty: memory only
+const DISK_ENTRIES = parseInt(process.env.ANALYSIS_CACHE_DISK_ENTRIES || "20000", 10); // Per tier
+const PRUNE_EVERY = 100; // Disk writes between size checks
+
+export interface CacheStats {
+    entries: number;
+    maxEntries: number;
+    hits: number;
+    diskHits: number;
+    misses: number;
+    evictions: number;
+}
+
+// Same abstract modulo whitespace -> same key (case is kept: the embedding model sees it)
+export function abstractKey(abstract: string): string {
+    const normalized = abstract.normalize('NFC').replace(/\s+/g, ' ').trim();
+    return crypto.createHash('sha256').update(normalized).digest('hex');
+}
+
+class DiskTier<V> {
+    private writes = 0;
+
+    constructor(private dir: string) {
+        fs.mkdirSync(dir, { recursive: true });
+    }
+
+    private file(key: string) {
+        return path.join(this.dir, `${crypto.createHash('sha1').update(key).digest('hex')}.json`);
+    }
+
+    get(key: string): V | undefined {
+        try {
+            const entry = JSON.parse(fs.readFileSync(this.file(key), 'utf-8'));
+            return entry.key === key ? entry.value : undefined;
+        } catch {
+            return undefined;
+        }
+    }
+
+    set(key: string, value: V) {
+        const file = this.file(key);
+        fs.promises.writeFile(`${file}.tmp`, JSON.stringify({ key, value }))
+            .then(() => fs.promises.rename(`${file}.tmp`, file))
+            .then(() => { if (++this.writes % PRUNE_EVERY === 0) this.prune(); })
+            .catch(e => console.warn("Analysis cache write failed:", e.message));
+    }
+
+    // Oldest files go first once the tier is over its size
+    private prune() {
+        try {
+            const files = fs.readdirSync(this.dir).filter(f => f.endsWith('.json'));
+            if (files.length <= DISK_ENTRIES) return;
+            const byAge = files
+                .map(f => ({ f, mtime: fs.statSync(path.join(this.dir, f)).mtimeMs }))
+                .sort((a, b) => a.mtime - b.mtime);
+            for (const { f } of byAge.slice(0, files.length - DISK_ENTRIES)) fs.unlinkSync(path.join(this.dir, f));
+        } catch (e: any) {
+            console.warn("Analysis cache prune failed:", e.message);
+        }
+    }
+}
+
+export class LruCache<V> {
+    // Map iteration order is insertion order: re-inserting on access keeps the oldest entry first
+    private map = new Map<string, V>();
+    private disk: DiskTier<V> | null;
+    private hits = 0;
+    private diskHits = 0;
+    private misses = 0;
+    private evictions = 0;
+
+    constructor(private maxEntries: number, diskDir?: string) {
+        this.disk = diskDir ? new DiskTier<V>(diskDir) : null;
+    }
+
+    get(key: string): V | undefined {
+        const value = this.map.get(key);
+        if (value !== undefined) {
+            this.map.delete(key);
+            this.map.set(key, value);
+            this.hits++;
+            return value;
+        }
+        const stored = this.disk?.get(key);
+        if (stored !== undefined) {
+            this.remember(key, stored);
+            this.diskHits++;
+            return stored;
+        }
+        this.misses++;
+        return undefined;
+    }
+
+    set(key: string, value: V) {
+        this.remember(key, value);
+        this.disk?.set(key, value);
+    }
+
+    private remember(key: string, value: V) {
+        if (this.maxEntries <= 0) return;
+        this.map.delete(key);
+        this.map.set(key, value);
+        while (this.map.size > this.maxEntries) {
+            this.map.delete(this.map.keys().next().value!);
+            this.evictions++;
+        }
+    }
+
+    stats(): CacheStats {
+        return {
+            entries: this.map.size,
+            maxEntries: this.maxEntries,
+            hits: this.hits,
+            diskHits: this.diskHits,
+            misses: this.misses,
+            evictions: this.evictions,
+        };
+    }
+}
+
+export const embeddingCache = new LruCache<number[]>(
+    EMBEDDING_ENTRIES, CACHE_DIR ? path.join(CACHE_DIR, 'embeddings') : undefined);
+
+// topK is the largest list computed so far for the key: smaller requests are served by slicing it
+export const resultCache = new LruCache<{ topK: number; result: any }>(
+    RESULT_ENTRIES, CACHE_DIR ? path.join(CACHE_DIR, 'results') : undefined);
+
+export function analysisCacheStats() {
+    return { embeddings: embeddingCache.stats(), results: resultCache.stats() };
+}
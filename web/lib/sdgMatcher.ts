@@ -0,0 +1,92 @@
+import fs from 'fs';
+import path from 'path';
+import { SDG } from './types';
+
+// SDG keyword automaton (written by scripts/sdg_matcher.py next to sdgs.json)
+// One Aho-Corasick pass over the abstract finds every keyword occurrence. Same result as testing
+// `new RegExp('\\b' + keyword + '\\b', 'i')` per keyword: case-insensitive, ASCII word boundaries.
+export interface SdgMatcher {
+    patterns: string[];
+    targets: [number, number][][]; // pattern -> [sdgId, position in that SDG's keyword list]
+    goto: Record<string, number>[];
+    fail: number[];
+    out: number[][];
+    keywordLists: Record<string, string[]>;
+}
+
+const MATCHER_VERSION = 1;
+
+function isWordChar(ch: string | undefined): boolean {
+    if (ch === undefined) return false;
+    const c = ch.charCodeAt(0);
+    return (c >= 48 && c <= 57) || (c >= 65 && c <= 90) || (c >= 97 && c <= 122) || c === 95;
+}
+
+function foldChar(ch: string): string {
+    const lower = ch.toLowerCase();
+    return lower.length === 1 ? lower : ch;
+}
+
+function sameKeywords(a: string[] | undefined, b: string[] | undefined): boolean {
+    const x = a || [];
+    const y = b || [];
+    return x.length === y.length && x.every((kw, i) => kw === y[i]);
+}
+
+// Returns the matcher only if it was built from exactly these SDG keyword lists
+export function loadSdgMatcher(dataDir: string, sdgs: SDG[]): SdgMatcher | null {
+    const matcherPath = path.join(dataDir, 'sdg_matcher.json');
+    if (!fs.existsSync(matcherPath)) return null;
+    try {
+        const data = JSON.parse(fs.readFileSync(matcherPath, 'utf-8'));
+        if (data.version !== MATCHER_VERSION) return null;
+        const lists = data.keywordLists || {};
+        const stale = Object.keys(lists).length !== sdgs.length
+            || sdgs.some(s => !sameKeywords(lists[String(s.id)], s.keywords));
+        if (stale) {
+            console.warn("sdg_matcher.json does not match sdgs.json. Using per-keyword regex.");
+            return null;
+        }
+        return data as SdgMatcher;
+    } catch (e) {
+        console.warn("SDG matcher load failed");
+        return null;
+    }
+}
+
+// sdgId -> keyword positions (in that SDG's list) found in the text
+export function matchSdgKeywords(matcher: SdgMatcher, text: string): Map<number, number[]> {
+    const { goto, fail, out, patterns, targets } = matcher;
+    const matched = new Set<number>();
+    let node = 0;
+    for (let i = 0; i < text.length; i++) {
+        const ch = foldChar(text[i]);
+        while (node !== 0 && goto[node][ch] === undefined) node = fail[node];
+        node = goto[node][ch] ?? 0;
+        const hits = out[node];
+        if (hits.length === 0) continue;
+
+        const end = i + 1;
+        const afterWord = isWordChar(text[end]);
+        for (const pid of hits) {
+            if (matched.has(pid)) continue;
+            const pattern = patterns[pid];
+            const start = end - pattern.length;
+            const beforeWord = isWordChar(text[start - 1]);
+            // \b on both sides: word-ness flips at the start and at the end of the occurrence
+            if (beforeWord !== isWordChar(pattern[0]) && afterWord !== isWordChar(pattern[pattern.length - 1])) {
+                matched.add(pid);
+            }
+        }
+    }
+
+    const found = new Map<number, number[]>();
+    matched.forEach(pid => {
+        for (const [sdgId, pos] of targets[pid]) {
+            if (!found.has(sdgId)) found.set(sdgId, []);
+            found.get(sdgId)!.push(pos);
+        }
+    });
+    found.forEach(positions => positions.sort((a, b) => a - b));
+    return found;
+}